@@ -1,5 +1,6 @@
 from fastapi import APIRouter
 
+from app.api.routers.datacheck import router as datacheck
 from app.api.routers.datafiles import router as datafiles
 from app.api.routers.litter_annual import router as litter_annual
 from app.api.routers.litter_each import router as litter_each
@@ -14,6 +15,7 @@ from app.api.routers.tree_sp_turnover import router as tree_sp_turnover
 router = APIRouter()
 
 router.include_router(datafiles, prefix="/datafiles", tags=["datafiles"])
+router.include_router(datacheck, prefix="/datacheck", tags=["datacheck"])
 router.include_router(
     tree_com_summary, prefix="/tree_com_summary", tags=["tree_com_summary"]
 )
@@ -0,0 +1,105 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import asdict, fields
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote
+
+import orjson
+from fastapi import APIRouter, File, HTTPException, Query, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import Response
+
+import app.base as base
+import app.datacheck as datacheck
+from app import schemas
+from app.api.routers.datafiles import parse_cache
+from app.db.config import settings
+
+router = APIRouter()
+
+# 全リクエストで共有するデータチェック用のワーカー
+executor = ThreadPoolExecutor(
+    max_workers=settings.DATACHECK_WORKERS, thread_name_prefix="datacheck"
+)
+
+MEDIA_TYPES = {
+    "xlsx": "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+def run_data_check(
+    contents: bytes, throughly: bool = False, checks: Optional[List[str]] = None
+) -> Tuple[
+    base.MonitoringData, List[datacheck.ErrDat], Dict[str, float], Dict[str, str]
+]:
+    d = base.read_data(contents, max_col=500, cache=parse_cache)
+    timings: Dict[str, float] = {}
+    skipped: Dict[str, str] = {}
+    errors = datacheck.check_data(
+        d,
+        throughly=throughly,
+        checks=checks,
+        executor=executor,
+        timings=timings,
+        skipped=skipped,
+    )
+    return d, errors, timings, skipped
+
+
+@router.post(
+    "/",
+    response_model=schemas.DataCheckResult,
+    name="datacheck: check_file",
+)
+async def check_file(
+    file: UploadFile = File(...),
+    format: str = Query("json", regex="^(json|xlsx|csv)$"),
+    throughly: bool = False,
+    checks: Optional[List[str]] = Query(None),
+):
+    try:
+        contents = await file.read()
+    finally:
+        await file.close()
+
+    start = time.perf_counter()
+    try:
+        d, errors, timings, skipped = await run_in_threadpool(
+            run_data_check, contents, throughly, checks
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=406,
+            detail="Could not check {}: {}".format(file.filename, e),
+        )
+    elapsed = time.perf_counter() - start
+
+    if format in MEDIA_TYPES:
+        buf = BytesIO()
+        header = [f.name for f in fields(datacheck.ErrDat)]
+        await run_in_threadpool(datacheck.save_errors, errors, buf, header, format)
+        filename = "{}_errors.{}".format(Path(file.filename).stem, format)
+        return Response(
+            content=buf.getvalue(),
+            media_type=MEDIA_TYPES[format],
+            headers={
+                "Content-Disposition": "attachment; filename*=UTF-8''{}".format(
+                    quote(filename)
+                ),
+                "X-Check-Timings": orjson.dumps(timings).decode(),
+            },
+        )
+
+    return {
+        "plot_id": d.plot_id,
+        "dtype": d.data_type,
+        "filename": file.filename,
+        "n_errors": len(errors),
+        "errors": [asdict(e) for e in errors],
+        "timings": timings,
+        "skipped": skipped,
+        "elapsed": elapsed,
+    }
@@ -1,11 +1,10 @@
 import hashlib
 import re
-import shutil
-import sys
 from datetime import datetime
+from io import BytesIO
 from pathlib import Path
 from tempfile import NamedTemporaryFile
-from typing import Any, Dict, List, Optional
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from fastapi import APIRouter, Body, Depends, File, HTTPException, UploadFile
 from sqlalchemy import delete, update, select
@@ -16,10 +15,18 @@ from starlette.status import HTTP_201_CREATED
 import app.base as base
 import app.summarise as summarise
 from app import models, schemas
+from app.db.config import settings
 from app.db.db import get_session
 
 router = APIRouter()
 
+# アップロードされたファイルの読み込み結果のキャッシュ（md5で照合）
+parse_cache = (
+    base.ParseCache(settings.PARSE_CACHE_DIR, settings.PARSE_CACHE_MAX_SIZE)
+    if settings.PARSE_CACHE_DIR
+    else None
+)
+
 
 class DataExistsException(Exception):
     def __init__(self, id: int, data: Dict[Any, Any]):
@@ -112,36 +119,45 @@ async def delete_datafile(
 async def upload_file(
     file: UploadFile = File(...), session: AsyncSession = Depends(get_session)
 ) -> schemas.Datafile:
-    tmppath = await save_upload_file_tmp(file)
-
-    with tmppath.open("rb") as tmp:
-        contents = tmp.read()
-        md5 = hashlib.md5(contents).hexdigest()
-
-    d = base.read_data(contents, max_col=500)
-    date, name, name_jp = parse_metadata(d)
-
-    datafileIn = schemas.DatafileCreate(
-        plot_id=d.plot_id,
-        name=name,
-        name_jp=name_jp,
-        filename=file.filename,
-        md5=md5,
-        dtype=d.data_type,
-        date=date,
-        size=round(sys.getsizeof(contents) / 1024, 1),
-    )
+    contents, md5, size = await read_upload_file(file)
+    suffix = Path(file.filename).suffix
+    try:
+        # 大きなファイルは一時ファイルから直接読み込む
+        d = base.read_data(contents, max_col=500, cache=parse_cache, md5=md5)
+        date, name, name_jp = parse_metadata(d)
+
+        datafileIn = schemas.DatafileCreate(
+            plot_id=d.plot_id,
+            name=name,
+            name_jp=name_jp,
+            filename=file.filename,
+            md5=md5,
+            dtype=d.data_type,
+            date=date,
+            size=round(size / 1024, 1),
+        )
 
-    datafile_in_db = await get_datafile_by_plotid_and_dtype(
-        datafileIn.plot_id, datafileIn.dtype, session
-    )
+        datafile_in_db = await get_datafile_by_plotid_and_dtype(
+            datafileIn.plot_id, datafileIn.dtype, session
+        )
+    except Exception:
+        # 一時ファイルは上書きの確認に使う場合を除いて削除
+        if isinstance(contents, Path):
+            contents.unlink()
+        raise
 
     if datafile_in_db:
+        # 上書きの確認が必要な場合のみ一時ファイルに保存
+        if isinstance(contents, Path):
+            tmppath = contents
+        else:
+            tmppath = save_contents_tmp(contents, suffix)
         raise DataExistsException(
             id=datafile_in_db.id, data={**datafileIn.dict(), "tmppath": str(tmppath)}
         )
     else:
-        tmppath.unlink()
+        if isinstance(contents, Path):
+            contents.unlink()
         datafile = await add_datafile(datafileIn, session)
         try:
             await add_data_summary(datafile.id, datafile.dtype, d, session)
@@ -154,15 +170,53 @@ async def upload_file(
             return datafile
 
 
-async def save_upload_file_tmp(file: UploadFile) -> Path:
+async def read_upload_file(
+    file: UploadFile,
+    chunk_size: int = 2**20,
+    max_memory: int = settings.UPLOAD_MAX_MEMORY,
+) -> Tuple[Union[bytes, Path], str, int]:
+    """
+    Read an uploaded file in chunks, computing the md5 hash on the way.
+
+    Returns the contents, the md5 hash and the size in bytes. The contents are
+    kept in a single buffer, or written to a temporary file if larger than
+    `max_memory` bytes, in which case the path is returned (to be removed by the
+    caller).
+    """
+    md5 = hashlib.md5()
+    buf = BytesIO()
+    tmp = None
+    size = 0
     try:
-        suffix = Path(file.filename).suffix
-        with NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
-            shutil.copyfileobj(file.file, tmp)
-            tmppath = Path(tmp.name)
+        while True:
+            chunk = await file.read(chunk_size)
+            if not chunk:
+                break
+            md5.update(chunk)
+            size += len(chunk)
+            if tmp is None and size > max_memory:
+                suffix = Path(file.filename).suffix
+                tmp = NamedTemporaryFile(delete=False, suffix=suffix)
+                tmp.write(buf.getvalue())
+                buf = BytesIO()
+            if tmp is None:
+                buf.write(chunk)
+            else:
+                tmp.write(chunk)
     finally:
-        file.file.close()
-    return tmppath
+        await file.close()
+        if tmp is not None:
+            tmp.close()
+
+    if tmp is not None:
+        return Path(tmp.name), md5.hexdigest(), size
+    return buf.getvalue(), md5.hexdigest(), size
+
+
+def save_contents_tmp(contents: bytes, suffix: str = "") -> Path:
+    with NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        tmp.write(contents)
+    return Path(tmp.name)
 
 
 def parse_metadata(d: base.MonitoringData):
@@ -213,7 +267,7 @@ async def add_tree_data_summary(
     d: base.MonitoringData,
     session: AsyncSession,
 ) -> None:
-    ts = summarise.TreeSummary(d)
+    ts = summarise.TreeSummary(d, chunk_size=settings.TREE_SUMMARY_CHUNK_SIZE)
     query_values = [
         dict({"datafile_id": datafile_id}, **x) for x in ts.species_summary()
     ]
@@ -294,7 +348,7 @@ async def update_plot(
     await delete_data_summary(id, datafile_update.dtype, session)
     try:
         with tmppath.open("rb") as tmp:
-            d = base.read_data(tmp.read(), max_col=500)
+            d = base.read_data(tmp.read(), max_col=500, cache=parse_cache)
         await add_data_summary(id, datafile_update.dtype, d, session)
     except Exception as e:
         raise HTTPException(
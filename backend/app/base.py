@@ -1,13 +1,25 @@
 import codecs
 import csv
+import hashlib
 import os
 import re
 import unicodedata
 from datetime import datetime
-from io import BytesIO
+from functools import lru_cache
+from io import BytesIO, TextIOWrapper
+from itertools import islice
 from pathlib import Path
-from typing import Any, Dict, List, Optional, Tuple, Union
-from zipfile import BadZipFile
+from typing import (
+    IO,
+    Any,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple,
+    Union,
+)
 
 import numpy as np
 from openpyxl import load_workbook
@@ -16,6 +28,66 @@ from app.logger import get_logger
 
 logger = get_logger(__name__)
 
+# ファイル形式・文字コードの判定に読む先頭のバイト数
+SNIFF_SIZE = 2**16
+XLSX_MAGIC = b"PK\x03\x04"
+XLS_MAGIC = b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1"
+CSV_ENCODINGS = ["utf-8", "cp932"]
+
+# 読み込み結果のキャッシュの形式・読み込み方法を変えたら上げる
+PARSE_CACHE_VERSION = 1
+
+# 数値と改行の判定
+PAT_INT = re.compile(r"\s*[+-]?\d+\s*")
+PAT_FLOAT = re.compile(
+    r"\s*[+-]?(?:(?:\d+\.?\d*|\.\d+)(?:e[+-]?\d+)?|inf(?:inity)?|nan)\s*", re.I
+)
+PAT_LINE_BREAKS = re.compile("\r\n|\n|\r|\t|\x0b|\x0c")
+
+METADATA_KEYS = [
+    "DATA CREATED",
+    "DATA CREATER",
+    "DATA TITLE",
+    "SITE NAME",
+    "PLOT NAME",
+    "PLOT ID",
+    "PLOT SIZE",
+    "NO. OF TRAPS",
+    "TRAP SIZE",
+]
+
+# データの種類を判定する列名のパターン
+DATA_TYPE_COLUMNS = {
+    "treeGBH": [
+        "tag_no",
+        "indv_no",
+        "spc_japan",
+        "^gbh[0-9]{2}$",
+        "^s_date[0-9]{2}$",
+    ],
+    "litter": [
+        "^trap_id$",
+        "^s_date1$",
+        "^s_date2$",
+        "^wdry_",
+        "^w_",
+    ],
+    "seed": [
+        "^trap_id$",
+        "^s_date1$",
+        "^s_date2$",
+        "^w",
+        "^spc$",
+        "^status$",
+        "^form$",
+    ],
+}
+_DATA_TYPE_PATTERNS = [
+    ((data_type, i), re.compile(x))
+    for data_type, patterns in DATA_TYPE_COLUMNS.items()
+    for i, x in enumerate(patterns)
+]
+
 
 class MonitoringData(object):
     """
@@ -40,11 +112,16 @@ class MonitoringData(object):
         Two-dimensional numpy ndarray of comment lines (rows) of data
     metadata : dict, optional
         Metadata for the input data
+    columns : numpy ndarray, optional
+        Column names. If given, `data` is taken as the values without the header
+        line (and `header` is ignored)
 
     Attributes
     ----------
     data : numpy ndarray
-        Original Data.
+        Original Data. The values and column names are kept separately if the
+        object is a slice of other data or columns are appended (see
+        `append_columns`), and joined when this is accessed
     values : numpy ndarray
         Data values
     columns : list
@@ -70,13 +147,21 @@ class MonitoringData(object):
         data_type: Optional[str] = None,
         metadata: Dict[str, str] = {},
         comments: Optional[np.ndarray] = None,
+        columns: Optional[np.ndarray] = None,
         *args,
         **kwargs
     ):
 
-        self.data = data
+        if columns is None:
+            self.data = data
+            self.header = header
+        else:
+            # 列名と値を別々に保持（dataは参照時に結合）
+            self._data = None
+            self._columns = np.asarray(columns)
+            self._blocks = [data]
+            self.header = True
         self.plot_id = plot_id
-        self.header = header
         if data_type:
             self.data_type = data_type
         else:
@@ -86,19 +171,37 @@ class MonitoringData(object):
         if len(self.columns) > 0:
             self.__force_colname_unique()
 
+    @property
+    def data(self) -> np.ndarray:
+        if self._data is None:
+            values = self.values
+            self._data = np.vstack((self._columns, values)) if self.header else values
+            self._columns = None
+            self._blocks = []
+        return self._data
+
+    @data.setter
+    def data(self, data: np.ndarray):
+        self._data = data
+        self._columns = None
+        self._blocks = []
+
     @property
     def values(self):
-        if self.header:
-            return self.data[1:]
-        else:
-            return self.data
+        if self._data is not None:
+            return self._data[1:] if self.header else self._data
+        if len(self._blocks) > 1:
+            self._blocks = [np.hstack(self._blocks)]
+        return self._blocks[0]
 
     @property
     def columns(self):
-        if self.header:
-            return self.data[0]
-        else:
+        if not self.header:
             return np.array([])
+        elif self._data is not None:
+            return self._data[0]
+        else:
+            return self._columns
 
     @property
     def data_with_comments(self):
@@ -109,32 +212,39 @@ class MonitoringData(object):
         return "{}({})".format(self.__class__.__name__, s)
 
     def __getitem__(self, key):
+        # 行だけを選択する場合は列名を共有し、データの種類を引き継ぐ
+        data_type = None
         if isinstance(key, str):
             values_s, cn = self.select(key, return_column_names=True)
-            data_s = np.vstack((cn, values_s))
         elif isinstance(key, list) and all([isinstance(i, str) for i in key]):
             values_s, cn = self.select(key, return_column_names=True)
-            data_s = np.vstack((cn, values_s))
+        elif not self.header:
+            return self.values[key]
         elif isinstance(key, slice):
-            data_s = np.vstack((self.columns, self.values[key]))
+            values_s, cn, data_type = self.values[key], self.columns, self.data_type
         elif isinstance(key, tuple) and all([isinstance(i, slice) for i in key]):
-            data_s = np.vstack((self.columns[key[1]], self.values[key]))
+            values_s, cn = self.values[key], self.columns[key[1]]
         elif isinstance(key, tuple) and isinstance(key[1], slice):
-            data_s = np.vstack((self.columns[key[1]], self.values[key]))
+            values_s, cn = self.values[key], self.columns[key[1]]
         elif isinstance(key, tuple) and isinstance(key[0], slice):
             data_s = np.append(self.columns[key[1]], self.values[key])
+            return self.__getitem_return(
+                data_s, header=self.header, comments=self.comments
+            )
         elif isinstance(key, int):
-            data_s = np.vstack((self.columns, self.values[key]))
+            values_s, cn = self.values[key][None, :], self.columns
+            data_type = self.data_type
         elif isinstance(key, np.ndarray) and key.dtype == "bool":
             if len(key.shape) == 1:
-                data_s = np.vstack((self.columns, self.values[key]))
+                values_s, cn, data_type = self.values[key], self.columns, self.data_type
             else:
                 return self.values[key]
         else:
             return self.values[key]
         return self.__getitem_return(
-            data_s,
-            header=self.header,
+            values_s,
+            columns=cn,
+            data_type=data_type,
             comments=self.comments,
         )
 
@@ -144,68 +254,99 @@ class MonitoringData(object):
 
     def __setitem__(self, key, values):
         if any([isinstance(values, t) for t in [list, tuple, np.ndarray]]):
-            if len(values) == self.values.shape[0]:
-                self.data = np.hstack((self.data, np.append(key, values)[:, None]))
+            if len(values) == self._n_rows:
+                self.append_columns([key], np.asarray(values)[:, None])
             else:
                 msg = "Length of values ({}) does not match length of index ({})"
-                raise ValueError(msg.format(len(values), self.values.shape[0]))
+                raise ValueError(msg.format(len(values), self._n_rows))
         else:
-            values_rep = [values] * self.values.shape[0]
-            self.data = np.hstack((self.data, np.append(key, values_rep)[:, None]))
+            values_rep = [values] * self._n_rows
+            self.append_columns([key], np.array(values_rep)[:, None])
 
-    def __guess_data_type(self):
-        """Guess data type from the header line of the data."""
-        cols_t = [
-            "tag_no",
-            "indv_no",
-            "spc_japan",
-            "^gbh[0-9]{2}$",
-            "^s_date[0-9]{2}$",
-        ]
-
-        cols_l = [
-            "^trap_id$",
-            "^s_date1$",
-            "^s_date2$",
-            "^wdry_",
-            "^w_",
-        ]
-
-        cols_s = [
-            "^trap_id$",
-            "^s_date1$",
-            "^s_date2$",
-            "^w",
-            "^spc$",
-            "^status$",
-            "^form$",
-        ]
-
-        if all([any(filter(lambda x: re.match(i, x), self.columns)) for i in cols_t]):
-            data_type = "treeGBH"
-        elif all([any(filter(lambda x: re.match(i, x), self.columns)) for i in cols_l]):
-            data_type = "litter"
-        elif all([any(filter(lambda x: re.match(i, x), self.columns)) for i in cols_s]):
-            data_type = "seed"
+    @property
+    def _n_rows(self) -> int:
+        # 列のブロックを結合せずに行数を返す
+        if self._data is not None:
+            return self.values.shape[0]
+        return self._blocks[0].shape[0]
+
+    def append_columns(
+        self, columns: Union[List[str], np.ndarray], values: np.ndarray
+    ) -> None:
+        """
+        Append columns to the data.
+
+        The existing data is not copied: the values are kept as blocks of columns,
+        which are joined once when `values` or `data` is accessed.
+
+        Parameters
+        ----------
+        columns : list or numpy ndarray
+            Names of the columns
+        values : numpy ndarray
+            Two-dimensional array of the values (rows x columns). Values other than
+            str are converted to str
+
+        """
+        if not self.header:
+            raise RuntimeError("The data does not have column names")
+        values = np.asarray(values)
+        if values.dtype.kind != "U":
+            values = values.astype(str)
+        n_row = self._n_rows
+        if values.shape != (n_row, len(columns)):
+            msg = "Shape of values {} does not match {} rows x {} columns"
+            raise ValueError(msg.format(values.shape, n_row, len(columns)))
+
+        if self._data is not None:
+            self._columns = self._data[0]
+            self._blocks = [self._data[1:]]
+            self._data = None
+        self._columns = np.append(self._columns, columns)
+        self._blocks.append(values)
+
+    def as_kwargs(self) -> Dict[str, Any]:
+        """
+        Return the arguments to create an object of the data.
+
+        e.g. `CheckDataTree(**d.as_kwargs())`. The data is shared (not copied).
+
+        """
+        if self._data is not None:
+            kwargs: Dict[str, Any] = {"data": self._data, "header": self.header}
         else:
-            data_type = "other"
+            kwargs = {"data": self.values, "columns": self._columns}
+        kwargs.update(
+            plot_id=self.plot_id,
+            data_type=self.data_type,
+            metadata=self.metadata,
+            comments=self.comments,
+        )
+        return kwargs
 
-        return data_type
+    def __guess_data_type(self):
+        """Guess data type from the header line of the data."""
+        return guess_data_type(self.columns.tolist())
 
     def __force_colname_unique(self):
+        columns = self.columns
+        seen: Dict[str, int] = {}
         dup = False
-        for i in range(len(self.columns)):
-            n = 1
-            cn = self.columns[i]
-            while cn in self.columns[:i]:
+        for i, cn_orig in enumerate(columns.tolist()):
+            n = seen.get(cn_orig, 1)
+            cn = cn_orig
+            while cn in seen:
                 dup = True
-                cn_orig = cn
-                cn = "{}.{}".format(self.columns[i], n)
+                cn = "{}.{}".format(cn_orig, n)
                 n += 1
-            self.columns[i] = cn
+            if cn != cn_orig:
+                seen[cn_orig] = n
+                columns[i] = cn
+                cn = str(columns[i])
+            seen.setdefault(cn, 1)
         if dup:
             msg = "Column name duplication detected."
-            logger.warning(msg.format(cn_orig, cn))
+            logger.warning(msg)
 
     def select(
         self,
@@ -227,21 +368,18 @@ class MonitoringData(object):
             Add a header row to an output array
 
         """
-        start = 1 if (self.header and not return_column_names) else 0
-
         if not self.header:
             raise RuntimeError("The data does not have column names")
 
         if regex:
             r = re.compile(regex)
-            match = np.vectorize(lambda x: True if r.match(x) else False)(self.columns)
-            selected = self.data[start:, match]
+            match = np.array([bool(r.match(x)) for x in self.columns.tolist()], bool)
         elif col:
             if isinstance(col, str):
                 col = [col]
             isin = np.isin(col, self.columns)
             if all(isin):
-                selected = self.data[start:, np.isin(self.columns, col)]
+                match = np.isin(self.columns, col)
             else:
                 notin = ", ".join(np.array(col)[~isin])
                 s = "s" if (~isin).sum() > 1 else ""
@@ -250,8 +388,9 @@ class MonitoringData(object):
         else:
             raise RuntimeError("col or regex is needed")
 
+        selected = self.values[:, match]
         if return_column_names:
-            return selected[1:], selected[0]
+            return selected, self.columns[match]
         else:
             if selected.shape[1] == 1:
                 selected = selected.flatten()
@@ -298,89 +437,256 @@ def check_utf8_bom(filepath: str) -> bool:
     return raw.startswith(codecs.BOM_UTF8)
 
 
+def read_head(file: Union[str, Path, bytes], size: int = SNIFF_SIZE) -> bytes:
+    """Return the first bytes of a file (path-like or bytes-like object)."""
+    if any(isinstance(file, t) for t in [str, Path]):
+        with Path(str(file)).expanduser().open("rb") as f:
+            return f.read(size)
+    elif any(isinstance(file, t) for t in [bytes, bytearray, memoryview]):
+        return bytes(file[:size])
+    msg = "expected str, bytes-like or path-like object, not {}".format(type(file))
+    raise TypeError(msg)
+
+
+def detect_encoding(head: bytes) -> str:
+    """
+    Guess the encoding of a csv file from its first bytes.
+
+    Files with the BOM are read as 'utf-8-sig'. Otherwise UTF-8 is tried first and
+    then CP932 (Shift_JIS with the Windows extensions, as exported by Excel for
+    Japanese), and 'utf-8' is returned if neither can decode the bytes.
+
+    Parameters
+    ----------
+    head : bytes
+        First bytes of the file. A multibyte character may be cut at the end
+
+    """
+    if head.startswith(codecs.BOM_UTF8):
+        return "utf-8-sig"
+    for encoding in CSV_ENCODINGS:
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(head, final=False)
+        except UnicodeDecodeError:
+            continue
+        return encoding
+    return "utf-8"
+
+
+def sniff_file_type(file: Union[str, Path, bytes]) -> str:
+    """
+    Guess the type of a data file ('xlsx' or 'csv') from the magic bytes.
+
+    xlsx files are zip archives (starting with 'PK\\x03\\x04'), and anything else
+    is read as csv. The extension of a path is only checked against the contents.
+
+    Parameters
+    ----------
+    file : path-like or bytes-like object
+        Input data file
+
+    """
+    head = read_head(file, len(XLS_MAGIC))
+    if head.startswith(XLS_MAGIC):
+        raise ValueError("xls files are not supported. Save the file as xlsx or csv")
+    file_type = "xlsx" if head.startswith(XLSX_MAGIC) else "csv"
+    if any(isinstance(file, t) for t in [str, Path]):
+        suffix = Path(str(file)).suffix.lower()
+        if (suffix in [".xlsx", ".xlsm"]) != (file_type == "xlsx"):
+            msg = "The contents of {} look like {}, not {}"
+            logger.warning(msg.format(Path(str(file)).name, file_type, suffix))
+    return file_type
+
+
 def read_xlsx(
-    file: Union[str, bytes, Path], max_col: Optional[int] = None, **kwargs
+    file: Union[str, bytes, Path],
+    max_col: Optional[int] = None,
+    header: bool = False,
+    comment_chr: Optional[str] = "#",
+    skip: Optional[int] = None,
+    **kwargs
 ) -> np.ndarray:
     """
     Read a xlsx file and return a numpy ndarray object.
 
+    Blank rows at the end of the sheet are not returned. If the sheet has a header
+    line, only the columns up to the last non-empty cell of the header (or of the
+    comment lines above it) are read, so that empty cells with formatting at the
+    right of the data (which extend the sheet dimensions) are not parsed into the
+    array.
+
     Parameters
     ----------
     file : path-like or bytes-like object
         Input data file
-    max_col: int
+    max_col: int, optional
         Maximum number of columns to read
+    header: bool, default False
+        If the sheet includes a header line (the first non-blank line which is not
+        commented), which determines the number of columns to read
+    comment_chr: str, default "#"
+        Character to detect commented lines above the header
+    skip: int, optional
+        Number of lines to skip before the header
 
     """
     if any(isinstance(file, t) for t in [str, Path]):
-        filepath = Path(str(file)).expanduser()
-
+        src = Path(str(file)).expanduser()
+    elif any(isinstance(file, t) for t in [bytes, bytearray, memoryview]):
+        src = BytesIO(file)
+    else:
+        msg = "expected str, bytes-like or path-like object, not {}".format(type(file))
+        raise TypeError(msg)
 
-        wb = load_workbook(filepath, read_only=True, data_only=True)
+    wb = load_workbook(src, read_only=True, data_only=True)
+    try:
         if "Data" in wb.sheetnames:
             ws = wb["Data"]
         else:
             ws = wb[wb.sheetnames[0]]
-        if max_col and ws.max_column <= max_col:
+        if max_col and ws.max_column and ws.max_column <= max_col:
             max_col = None
-        data = np.array(
-            [[cell.value for cell in row] for row in ws.iter_rows(max_col=max_col)]
-        )
-        data = np.vectorize(lambda x: str(x) if x is not None else "")(data)
-        wb.close()
-    elif isinstance(file, bytes):
-        wb = load_workbook(BytesIO(file), read_only=True, data_only=True)
-        if "Data" in wb.sheetnames:
-            ws = wb["Data"]
+
+        rows: List[List[str]] = []
+        n_col = 0
+        n_read = 0
+        n_row = 0
+
+        def read_rows(iter_rows: Iterable[Tuple[Any, ...]]) -> Iterator[List[str]]:
+            nonlocal n_read, n_row
+            for row in iter_rows:
+                n_read += len(row)
+                values = ["" if x is None else str(x) for x in row]
+                rows.append(values)
+                if any(values):
+                    n_row = len(rows)
+                yield values
+
+        body: Iterable[Tuple[Any, ...]] = ()
+        if header:
+            # ヘッダー行（とその上のコメント行）の列数だけ残りの行を読み込む
+            for values in read_rows(ws.iter_rows(max_col=max_col, values_only=True)):
+                n_col = max(n_col, used_width(values))
+                if len(rows) <= (skip or 0) or not any(values):
+                    continue
+                # 先頭の空白列は除いて判定する（split_commentsと同様）
+                first = next(x for x in values if x)
+                if not comment_chr or not first.startswith(comment_chr):
+                    body = ws.iter_rows(
+                        min_row=len(rows) + 1, max_col=n_col, values_only=True
+                    )
+                    break
         else:
-            ws = wb[wb.sheetnames[0]]
-        if max_col and ws.max_column <= max_col:
-            max_col = None
-        data = np.array(
-            [[cell.value for cell in row] for row in ws.iter_rows(max_col=max_col)]
-        )
-        data = np.vectorize(lambda x: str(x) if x is not None else "")(data)
+            body = ws.iter_rows(max_col=max_col, values_only=True)
+        for _ in read_rows(body):
+            pass
+        del rows[n_row:]
+
+        n_col = n_col or max(map(len, rows), default=0)
+        msg = "Read {} cells of the sheet ({} x {} in dimensions), kept {} x {}"
+        logger.debug(msg.format(n_read, ws.max_row, ws.max_column, n_row, n_col))
+    finally:
         wb.close()
-    else:
-        msg = "expected str, bytes-like or path-like object, not {}".format(type(file))
-        raise TypeError(msg)
 
-    return data
+    if not rows:
+        return np.array([])
+    for values in rows:
+        values[n_col:] = []
+        values.extend([""] * (n_col - len(values)))
+    return np.array(rows, dtype=str)
+
+
+def used_width(values: List[str]) -> int:
+    """Return the number of cells up to the last non-empty one."""
+    for i in range(len(values), 0, -1):
+        if values[i - 1]:
+            return i
+    return 0
 
 
 def read_csv(
-    file: Union[str, Path, bytes], encoding: str = "utf-8", **kwargs
+    file: Union[str, Path, bytes], encoding: Optional[str] = None, **kwargs
 ) -> np.ndarray:
     """
     Read a csv file and return a numpy ndarray object.
 
+    The file is parsed in a stream (without decoding the whole file at once), and
+    rows shorter than the others are padded with empty strings.
+
     Parameters
     ----------
     file : path-like or bytes-like object
         Input data file
-    encoding : str, default 'utf-8'
-        File encoding
+    encoding : str, optional
+        File encoding. If not given, it is detected from the BOM and the first
+        bytes of the file (UTF-8 or CP932; see `detect_encoding`)
 
     """
-    if any(isinstance(file, t) for t in [str, Path]):
-        if check_utf8_bom(str(file)):
-            encoding = "utf-8-sig"
-        filepath = Path(str(file)).expanduser()
-        with filepath.open(encoding=encoding) as f:
-            reader = csv.reader(f)
-            data = np.array([i for i in reader])
-    elif isinstance(file, bytes):
-        if file[:4].startswith(codecs.BOM_UTF8):
-            encoding = "utf-8-sig"
-        lines = file.decode(encoding=encoding).splitlines()
-        reader = csv.reader(lines)
-        data = np.array([i for i in reader])
-    else:
-        msg = "expected str, bytes-like or path-like object, not {}".format(type(file))
-        raise TypeError(msg)
+    head = read_head(file)
+    detected = encoding is None
+    if detected:
+        encoding = detect_encoding(head)
+    elif encoding == "utf-8" and head.startswith(codecs.BOM_UTF8):
+        encoding = "utf-8-sig"
+
+    try:
+        data = _read_csv(file, encoding)
+    except UnicodeDecodeError:
+        # 先頭部分がASCIIのみのShift_JISのファイル
+        if not detected or encoding != "utf-8":
+            raise
+        logger.debug("Failed to decode csv as utf-8. Retry with cp932")
+        data = _read_csv(file, "cp932")
     return data
 
 
+def _read_csv(file: Union[str, Path, bytes], encoding: str) -> np.ndarray:
+    if any(isinstance(file, t) for t in [str, Path]):
+        with Path(str(file)).expanduser().open(encoding=encoding, newline="") as f:
+            return csv_to_array(f)
+    with TextIOWrapper(BytesIO(file), encoding=encoding, newline="") as f:
+        return csv_to_array(f)
+
+
+def csv_to_array(lines: Iterable[str], **fmtparams) -> np.ndarray:
+    """
+    Parse csv lines into a two-dimensional array of str.
+
+    Cells are collected in a flat list while parsing, and copied once into an
+    array of the exact string width. Short rows are padded with empty strings.
+
+    Parameters
+    ----------
+    lines : Iterable[str]
+        Lines of csv (e.g. a file object opened with newline="")
+    **fmtparams
+        Formatting parameters passed to csv.reader
+
+    """
+    cells: List[str] = []
+    n_cells: List[int] = []
+    for row in csv.reader(lines, **fmtparams):
+        cells.extend(row)
+        n_cells.append(len(row))
+    if not n_cells:
+        return np.array([])
+
+    n_col = max(n_cells)
+    if min(n_cells) < n_col:
+        # 列数の足りない行を空白で埋める
+        n_short = sum(n < n_col for n in n_cells)
+        logger.debug("Padded {} short rows of csv".format(n_short))
+        it = iter(cells)
+        cells = []
+        for n in n_cells:
+            cells.extend(islice(it, n))
+            cells.extend([""] * (n_col - n))
+
+    width = max(max(map(len, cells), default=0), 1)
+    data = np.fromiter(cells, dtype="<U{}".format(width), count=len(cells))
+    return data.reshape(len(n_cells), n_col)
+
+
 def read_table(
     file: Union[str, bytes, Path], file_type: Optional[str] = None, **kwargs
 ):
@@ -392,19 +698,18 @@ def read_table(
     file : path-like or bytes-like object
         Input data file
     file_type: str, optional
-        Type of data file. Supported formats are: csv or xlsx
+        Type of data file. Supported formats are: csv or xlsx. It will be guessed
+        from the contents if not given (see `sniff_file_type`)
 
     """
+    if file_type is None:
+        file_type = sniff_file_type(file)
     if file_type == "csv":
         return read_csv(file, **kwargs)
     elif file_type == "xlsx":
         return read_xlsx(file, **kwargs)
     else:
-        try:
-            data = read_xlsx(file, **kwargs)
-        except BadZipFile:
-            data = read_csv(file, **kwargs)
-        return data
+        raise ValueError("Unsupported file type: {}".format(file_type))
 
 
 def mat_strip(
@@ -423,51 +728,69 @@ def mat_strip(
         Remove blank rows
 
     """
-    match = np.vectorize(lambda x: True if x == strip else False)(mat)
+    match = np.asarray(mat == strip, dtype=bool)
     if not match.any():
         return mat
     elif match.all():
         return np.array([], mat.dtype)
+    return mat[strip_index(match, remove_all_empty_row)]
 
-    x = match.all(axis=0).tolist()
-    y = match.all(axis=1).tolist()
 
-    def strip_index(z: List[bool], right: bool = False):
-        z = z.copy()
-        pop_i = -1 if right else 1
-        i = 0
-        while True:
-            if not z.pop(pop_i):
-                break
-            i += 1
-        return i
+def strip_index(
+    match: np.ndarray, remove_all_empty_row: bool = True
+) -> Tuple[Union[slice, np.ndarray], slice]:
+    """
+    Return the index of rows and columns to keep by `mat_strip`.
 
-    mat = mat[:, slice(strip_index(x), len(x) - strip_index(x, True))]
+    Parameters
+    ----------
+    match : numpy ndarray
+        Two-dimentional boolean array whether the elements are to be stripped.
+        At least one element should be False
+    remove_all_empty_row : bool, default True
+        Remove blank rows (as a boolean index) instead of stripping the edges
 
-    if remove_all_empty_row:
-        mat = mat[~np.array(y), :]
-    else:
-        mat = mat[slice(strip_index(y), len(y) - strip_index(y, True)), :]
+    """
 
-    return mat
+    def edges(keep: np.ndarray) -> slice:
+        return slice(int(keep.argmax()), len(keep) - int(keep[::-1].argmax()))
+
+    keep_row = ~match.all(axis=1)
+    keep_col = ~match.all(axis=0)
+    return (keep_row if remove_all_empty_row else edges(keep_row), edges(keep_col))
 
 
 def split_comments(
-    data: np.ndarray, comment_chr: str = "#"
+    data: np.ndarray, comment_chr: Optional[str] = "#"
 ) -> Tuple[np.ndarray, np.ndarray]:
-    """Split comment rows from data array."""
+    """
+    Split comment rows from data array.
+
+    Blank rows and columns at the edges are stripped from the data and the
+    comments (see `mat_strip`) at the same time.
+
+    """
+    empty = data == ""
+    if empty.all():
+        return np.array([], data.dtype), np.array([], data.dtype)
+    elif empty.any():
+        index = strip_index(empty)
+        data, empty = data[index], empty[index]
+
     if comment_chr:
-        com_rows = np.vectorize(lambda x: str(x).startswith(comment_chr))(data[:, 0])
-        comments = data[com_rows]
-        data = data[~com_rows]
+        com_rows = np.char.startswith(data[:, 0].astype(str), comment_chr)
     else:
-        comments = np.ndarray(shape=(0, data.shape[1]), dtype=data.dtype)
+        com_rows = np.zeros(len(data), dtype=bool)
+    if not com_rows.any():
+        return data, np.ndarray(shape=(0, data.shape[1]), dtype=data.dtype)
 
-    if comments.size > 0:
-        data = mat_strip(data, strip="")
-        comments = mat_strip(comments, strip="")
+    def strip(rows: np.ndarray) -> np.ndarray:
+        # 空白行は除去済みなので、端の空白列だけを除く
+        if empty[rows].any():
+            return data[rows][strip_index(empty[rows])]
+        return data[rows]
 
-    return data, comments
+    return strip(~com_rows), strip(com_rows)
 
 
 def join_comments(data: np.ndarray, comments: np.ndarray) -> np.ndarray:
@@ -491,24 +814,39 @@ def join_comments(data: np.ndarray, comments: np.ndarray) -> np.ndarray:
 
 def get_metadata(comments: np.ndarray) -> Dict[str, str]:
     """Get metadata from comment lines."""
-    keys = [
-        "DATA CREATED",
-        "DATA CREATER",
-        "DATA TITLE",
-        "SITE NAME",
-        "PLOT NAME",
-        "PLOT ID",
-        "PLOT SIZE",
-        "NO. OF TRAPS",
-        "TRAP SIZE",
-    ]
-    metadata = {}
-    for key in keys:
-        match = list(zip(*np.where(comments == key)))
-        if match:
-            i, j = match[0]
-            metadata[key] = comments[i, j + 2]
-    return metadata
+    # 「# KEY : VALUE」の形式。キーが複数ある場合は最初のもの
+    found: Dict[str, str] = {}
+    for row in comments.tolist():
+        for j, x in enumerate(row):
+            if x in METADATA_KEYS and x not in found:
+                found[x] = row[j + 2] if j + 2 < len(row) else ""
+        if len(found) == len(METADATA_KEYS):
+            break
+    return {key: found[key] for key in METADATA_KEYS if key in found}
+
+
+def guess_data_type(columns: Iterable[str]) -> str:
+    """
+    Guess data type from the column names.
+
+    The data type is the first one of `DATA_TYPE_COLUMNS` of which all patterns
+    match (from the beginning) any of the column names, or 'other'.
+
+    Parameters
+    ----------
+    columns : Iterable[str]
+        Column names
+
+    """
+    matched = set()
+    for x in columns:
+        for key, r in _DATA_TYPE_PATTERNS:
+            if key not in matched and r.match(x):
+                matched.add(key)
+    for data_type, patterns in DATA_TYPE_COLUMNS.items():
+        if all((data_type, i) in matched for i in range(len(patterns))):
+            return data_type
+    return "other"
 
 
 def get_plotid(filepath: Union[str, Path]) -> str:
@@ -537,6 +875,8 @@ def read_data(
     plot_id: Optional[str] = None,
     data_type: Optional[str] = None,
     metadata: Optional[Dict[str, str]] = None,
+    cache: Optional["ParseCache"] = None,
+    md5: Optional[str] = None,
     **kwargs
 ) -> MonitoringData:
     """
@@ -561,16 +901,40 @@ def read_data(
         Data type. It will be guessed from header names if no given
     metadata : dict, optional
         Metadata for the input data
+    cache : ParseCache, optional
+        Cache of parsed data files. If given, the parsed data is loaded from the
+        cache if the same file has been read with the same options
+    md5 : str, optional
+        md5 hash of the file contents for the cache (computed if not given)
 
     """
-    data = read_table(file, file_type=file_type, **kwargs)
-    if skip:
-        data = data[skip:]
-    data = mat_strip(data)
-    if comment_chr:
-        data, comments = split_comments(data, comment_chr)
+    key = None
+    cached = None
+    if cache is not None:
+        options = dict(kwargs, header=header, comment_chr=comment_chr, skip=skip)
+        key = cache.key(file, md5=md5, file_type=file_type, **options)
+        cached = cache.get(key)
+
+    if cached is not None:
+        data, comments = cached
     else:
-        comments = np.array([])
+        data = read_table(
+            file,
+            file_type=file_type,
+            header=header,
+            comment_chr=comment_chr,
+            skip=skip,
+            **kwargs
+        )
+        if skip:
+            data = data[skip:]
+        if comment_chr:
+            data, comments = split_comments(data, comment_chr)
+        else:
+            data = mat_strip(data)
+            comments = np.array([])
+        if key is not None:
+            cache.set(key, data, comments)
 
     if not metadata:
         if len(comments) > 0:
@@ -594,28 +958,149 @@ def read_data(
     )
 
 
+class ParseCache(object):
+    """
+    On-disk cache of parsed data files.
+
+    The parsed data (with the header line) and the comment lines are saved as npy
+    files in a subdirectory of the cache version, keyed by the md5 hash of the file
+    contents and the parse options. The data is loaded memory-mapped in the
+    copy-on-write mode, so it is read from the disk only when used and can be
+    modified without changing the cache. The least recently used entries are
+    removed when the total size exceeds `max_size`.
+
+    Parameters
+    ----------
+    cache_dir : str or path-like
+        Cache directory
+    max_size : int, default 1 GiB
+        Maximum total size of the cache files in bytes
+
+    """
+
+    def __init__(self, cache_dir: Union[str, Path], max_size: int = 2**30):
+        self.cache_dir = Path(cache_dir).expanduser().joinpath(
+            "v{}".format(PARSE_CACHE_VERSION)
+        )
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(list(self.cache_dir.glob("*.data.npy")))
+
+    def key(
+        self, file: Union[str, Path, bytes], md5: Optional[str] = None, **options
+    ) -> str:
+        """Return the key of a file (md5 hash of the contents and options)."""
+        if md5 is None:
+            h = hashlib.md5()
+            if any(isinstance(file, t) for t in [str, Path]):
+                with Path(str(file)).expanduser().open("rb") as f:
+                    for chunk in iter(lambda: f.read(2**20), b""):
+                        h.update(chunk)
+            else:
+                h.update(file)
+            md5 = h.hexdigest()
+        h = hashlib.md5(md5.encode())
+        h.update(repr(sorted(options.items())).encode())
+        return h.hexdigest()
+
+    def _paths(self, key: str) -> Tuple[Path, Path]:
+        return (
+            self.cache_dir.joinpath(key + ".data.npy"),
+            self.cache_dir.joinpath(key + ".comments.npy"),
+        )
+
+    def get(self, key: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Return the data and the comments (None if not cached)."""
+        path_data, path_comments = self._paths(key)
+        try:
+            data = np.load(path_data, mmap_mode="c")
+            comments = np.load(path_comments)
+        except (FileNotFoundError, ValueError):
+            self.misses += 1
+            return None
+        # 最終アクセス時刻として更新時刻を使う
+        os.utime(path_data)
+        self.hits += 1
+        return data, comments
+
+    def set(self, key: str, data: np.ndarray, comments: np.ndarray):
+        """Save the data and the comments, and remove old entries if needed."""
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        for path, x in zip(self._paths(key), [data, comments]):
+            # 他のプロセスが読み込み中の不完全なファイルを見ないように置き換える
+            tmp = path.with_name("{}.{}.tmp".format(path.name, os.getpid()))
+            with tmp.open("wb") as f:
+                np.save(f, np.asarray(x))
+            os.replace(tmp, path)
+        self.evict()
+
+    def evict(self):
+        """Remove the least recently used entries exceeding the size limit."""
+        entries = []
+        total = 0
+        for path in self.cache_dir.glob("*.data.npy"):
+            key = path.name[: -len(".data.npy")]
+            try:
+                size = sum(p.stat().st_size for p in self._paths(key))
+                entries.append((path.stat().st_mtime, size, key))
+            except FileNotFoundError:
+                continue
+            total += size
+        for _, size, key in sorted(entries):
+            if total <= self.max_size:
+                break
+            for path in self._paths(key):
+                path.unlink(missing_ok=True)
+            total -= size
+
+    def clear(self):
+        """Remove all entries."""
+        for path in self.cache_dir.glob("*.npy"):
+            path.unlink(missing_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+
 def clean_data(data: np.ndarray) -> np.ndarray:
     """
     Clean up the data.
 
     Remove white spaces, line breaks, normalize unocode characters etc.).
+    Each unique value is cleaned once (see `clean_value`).
 
     Parameters
     ----------
     data: numpy ndarray
         Two dimentional array with the dtype of string('<U')
 
+    """
+    uniq, inv = np.unique(data, return_inverse=True)
+    cleaned = [clean_value(x) for x in uniq.tolist()]
+    return np.array(cleaned, dtype=str)[inv].reshape(np.shape(data))
+
+
+@lru_cache(maxsize=2**16)
+def clean_value(x: str) -> str:
+    """
+    Clean up a value (see `clean_data`).
+
+    Parameters
+    ----------
+    x : str
+        Any string
+
     """
     # remove white spaces
-    data = np.vectorize(lambda x: x.strip())(data)
+    x = x.strip()
     # unicode normalization
-    data = np.vectorize(lambda x: unicodedata.normalize("NFKC", x))(data)
+    x = unicodedata.normalize("NFKC", x)
     # floating-point rounding
-    data = np.vectorize(lambda x: clean_float(str(x)))(data)
+    x = clean_float(x)
     # remove line breaks
-    data = np.vectorize(lambda x: re.sub("\r\n|\n|\r|\t|\x0b|\x0c", "", x))(data)
-
-    return data
+    return PAT_LINE_BREAKS.sub("", x)
 
 
 def clean_float(x: str, precision: str = "single") -> str:
@@ -630,22 +1115,14 @@ def clean_float(x: str, precision: str = "single") -> str:
         Precision for floating-point: 'single' or 'double'
 
     """
-    if x == "nan":
-        return x
-    try:
-        int(x)
-    except ValueError:
-        try:
-            if precision == "single":
-                return str(np.float32(x))
-            elif precision == "double":
-                return str(np.float64(x))
-            else:
-                raise ValueError("Valid presision values are: single, double")
-        except ValueError:
-            return str(x)
-    else:
+    if precision not in ["single", "double"]:
+        raise ValueError("Valid presision values are: single, double")
+    if x == "nan" or PAT_INT.fullmatch(x) or not PAT_FLOAT.fullmatch(x):
         return str(x)
+    elif precision == "single":
+        return str(np.float32(x))
+    else:
+        return str(np.float64(x))
 
 
 def datetime_to_yyyymmdd(s: str) -> str:
@@ -667,59 +1144,71 @@ def datetime_to_yyyymmdd(s: str) -> str:
 
 def data_to_csv(
     data: np.ndarray,
-    outpath: str,
+    outpath: Union[str, Path, IO[str]],
     cleaning: bool = False,
     encoding: str = "utf-8",
     na_rep: str = "",
+    chunk_size: int = 10000,
 ):
     """
     Export a two-dementional numpy array as a csv file.
 
+    The rows are written in chunks through a buffered file, so that the file is
+    written without making a copy of the whole array.
+
     Parameters
     ----------
     data : numpy array
         Two dimentional numpy array
-    outpath : str
-        Path to the output file
+    outpath : str, path-like or file-like object
+        Path to the output file, or a text stream opened with newline="" (e.g. to
+        write the files of many plots into an archive). `encoding` is ignored for
+        a text stream
     cleaning : bool, default True
         If clean up the data
     encoding : str, default "utf-8"
         Text encoding
     na_rep : str, default ""
         Replacement characters for NaN
+    chunk_size : int, default 10000
+        Number of rows to write at once
 
     """
     if cleaning:
         data = clean_data(data)
 
-    data = np.where(data == "nan", na_rep, data)
-
-    with open(outpath, "w", newline="", encoding=encoding) as f:
-        writer = csv.writer(
-            f,
-            delimiter=",",
-            quotechar='"',
-            quoting=csv.QUOTE_MINIMAL,
-            lineterminator=os.linesep,
-        )
-        if encoding == "utf-8":
-            for row in data:
-                writer.writerow(row)
-        else:
-            r = re.compile(r"character '\\u(.*)'")
-            replaced = []
-            for row in data:
-                try:
-                    writer.writerow([i.encode(encoding).decode(encoding) for i in row])
-                except UnicodeEncodeError as e:
-                    m = r.search(str(e))
-                    if m:
-                        s = chr(int(m.group(1), 16))
-                        if s not in replaced:
-                            replaced.append(s)
-                    writer.writerow(
-                        [i.encode(encoding, "replace").decode(encoding) for i in row]
-                    )
-            if replaced:
-                msg = "Some characters can't be encoded correctly with {}: {}"
-                logger.warning(msg)
+    if isinstance(outpath, (str, Path)):
+        replaced = unencodable_chars(data, encoding)
+        if replaced:
+            msg = "Some characters can't be encoded correctly with {}: {}"
+            logger.warning(msg.format(encoding, "".join(replaced)))
+        with open(
+            outpath,
+            "w",
+            newline="",
+            encoding=encoding,
+            errors="replace",
+            buffering=2**20,
+        ) as f:
+            data_to_csv(data, f, na_rep=na_rep, chunk_size=chunk_size)
+        return
+
+    writer = csv.writer(
+        outpath,
+        delimiter=",",
+        quotechar='"',
+        quoting=csv.QUOTE_MINIMAL,
+        lineterminator=os.linesep,
+    )
+    for i in range(0, len(data), chunk_size):
+        chunk = data[i : (i + chunk_size)]
+        writer.writerows(np.where(chunk == "nan", na_rep, chunk).tolist())
+
+
+def unencodable_chars(data: np.ndarray, encoding: str) -> List[str]:
+    """Return the characters in the data which can't be encoded with an encoding."""
+    if codecs.lookup(encoding).name.startswith("utf"):
+        return []
+    # 1文字ずつなので、符号化できない場合のみ空になる
+    chars = set("".join(np.unique(data).tolist()))
+    return sorted(c for c in chars if not c.encode(encoding, "ignore"))
@@ -1,16 +1,40 @@
+import argparse
+import csv
+import glob
+import hashlib
+import io
 import json
+import os
 import re
-from dataclasses import astuple, dataclass
+import sys
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor
+from dataclasses import astuple, dataclass, fields
 from datetime import datetime
-from itertools import product
+from functools import lru_cache
 from pathlib import Path
-from typing import List, Optional, Union
+from typing import (
+    IO,
+    Any,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Pattern,
+    Set,
+    Tuple,
+    Union,
+)
 
 import numpy as np
 from openpyxl import Workbook
-from openpyxl.styles import Font, PatternFill
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, NamedStyle, PatternFill
 
-from app.base import MonitoringData, read_data, read_table
+from app import suppl
+from app.base import MonitoringData, ParseCache, read_data, read_table
+from app.groupby import GroupBy
 from app.logger import get_logger
 
 logger = get_logger(__name__)
@@ -24,6 +48,40 @@ class ErrDat:
     err_type: str
 
 
+@dataclass(frozen=True)
+class CheckSpec:
+    """
+    Declaration of a data check.
+
+    Parameters
+    ----------
+    name : str
+        Name of the check method
+    columns : Tuple[str, ...]
+        Regular expression patterns of the columns needed. The check is skipped if
+        any of them does not match the column names
+    derived : Tuple[str, ...]
+        Names of the derived arrays used (see `CheckDataCommon.derived`)
+    requires : Tuple[str, ...]
+        Prerequisite checks. The check is skipped if any of them found errors
+    throughly : bool
+        If the check is run only in the thorough mode
+    scope : {"all", "row", "cell"}
+        What the errors depend on, for incremental checking: "cell" if on the
+        cells of each row separately (the measurement columns, or those matching
+        `columns`), "row" if on the whole row (e.g. growth between censuses), and
+        "all" if also on other rows
+
+    """
+
+    name: str
+    columns: Tuple[str, ...] = ()
+    derived: Tuple[str, ...] = ()
+    requires: Tuple[str, ...] = ()
+    throughly: bool = False
+    scope: str = "all"
+
+
 class CheckDataCommon(MonitoringData):
     """
     Check errors in ecosystem monitoring data of the Monitoring Sites 1000 project.
@@ -31,10 +89,8 @@ class CheckDataCommon(MonitoringData):
     共通のチェック項目
     """
 
-    __fd = Path(__file__).resolve().parents[0]
-    __path_spdict_default = __fd.joinpath("suppl_data", "species_dict.json")
-    __path_xy_default = __fd.joinpath("suppl_data", "grid_xy.json")
-    __path_trap_default = __fd.joinpath("suppl_data", "trap_list.json")
+    # チェック項目の登録（エラーはこの順に出力される）
+    checks: List[CheckSpec] = []
 
     def __init__(
         self,
@@ -46,32 +102,30 @@ class CheckDataCommon(MonitoringData):
     ):
         super().__init__(*args, **kwargs)
         self.__prepare()
+        self.check_timings: Dict[str, float] = {}
+        self.skipped_checks: Dict[str, str] = {}
+        self.check_results: Dict[str, List[ErrDat]] = {}
+        self._derived: Dict[str, np.ndarray] = {}
 
+        # 補助データは共有のレジストリから取得（ファイル更新時に再読み込み）
         if self.data_type in ["treeGBH", "seed"]:
-            if not path_spdict:
-                path_spdict = str(self.__path_spdict_default)
-            with open(path_spdict, "rb") as f:
-                self.dict_sp = json.load(f)
+            path_spdict = suppl.registry.path("species_dict", path_spdict)
+            self.dict_sp = suppl.species_dict(path_spdict)
 
         if self.data_type == "treeGBH":
-            if not path_xy:
-                path_xy = str(self.__path_xy_default)
-            with open(path_xy, "rb") as f:
-                dict_xy = json.load(f)
-            if self.plot_id in dict_xy:
-                self.xy_combn = list(product(*dict_xy[self.plot_id].values()))
-            else:
-                self.xy_combn = []
+            path_xy = suppl.registry.path("grid_xy", path_xy)
+            self.xy_grid = suppl.xy_grid(self.plot_id, path_xy)
 
         if self.data_type in ["litter", "seed"]:
-            if not path_trap:
-                path_trap = str(self.__path_trap_default)
-            with open(path_trap, "rb") as f:
-                dict_trap = json.load(f)
-            if self.plot_id in dict_trap:
-                self.trap_list = dict_trap[self.plot_id]
-            else:
-                self.trap_list = {}
+            path_trap = suppl.registry.path("trap_list", path_trap)
+            self.trap_list = suppl.trap_list(self.plot_id, path_trap)
+
+        # 部分データのチェック（差分チェック）用
+        self._suppl_paths = {
+            "path_spdict": path_spdict,
+            "path_xy": path_xy,
+            "path_trap": path_trap,
+        }
 
     def __prepare(self):
         if self.data_type == "treeGBH":
@@ -106,6 +160,340 @@ class CheckDataCommon(MonitoringData):
     def __repr__(self):
         return object.__repr__(self)
 
+    def derived(self, name: str) -> np.ndarray:
+        """
+        Return an array derived from the data (computed once and cached).
+
+        The array is computed by the method `_derive_<name>`. Derived arrays are
+        shared by checks, and should not be modified.
+        """
+        if name not in self._derived:
+            start = time.perf_counter()
+            self._derived[name] = getattr(self, "_derive_" + name)()
+            self.check_timings["derived." + name] = time.perf_counter() - start
+        return self._derived[name]
+
+    def _derive_meas_valid(self) -> np.ndarray:
+        # 測定値が数値もしくは例外文字列かどうか
+        return map_unique(lambda x: isvalid(x, self.pat_except), self.meas, bool)
+
+    def _derive_meas_masked(self) -> np.ndarray:
+        # 測定値の無効な入力値をnp.nanに置換
+        meas = self.meas.copy()
+        meas[~self.derived("meas_valid")] = np.nan
+        return meas
+
+    def _derive_meas_num(self) -> np.ndarray:
+        # 測定値を数値に変換（数値以外はnp.nan）
+        return map_unique(lambda x: isvalid(x, return_value=True), self.meas, float)
+
+    def select_checks(
+        self, names: Optional[List[str]] = None, throughly: bool = False
+    ) -> List[CheckSpec]:
+        """
+        Select checks from the registry `checks`.
+
+        Parameters
+        ----------
+        names : List[str], optional
+            Names of the checks to be run. Their prerequisites are also selected.
+            All checks (except for those of the thorough mode if `throughly` is
+            False) are selected in default
+        throughly : bool, default False
+            If True, checks of the thorough mode are also selected
+
+        """
+        if names is None:
+            return [c for c in self.checks if throughly or not c.throughly]
+
+        registry = {c.name: c for c in self.checks}
+        unknown = [n for n in names if n not in registry]
+        if unknown:
+            msg = "Unknown checks for {} data: {}"
+            raise ValueError(msg.format(self.data_type, ", ".join(unknown)))
+
+        selected = set()
+        stack = list(names)
+        while stack:
+            name = stack.pop()
+            if name not in selected:
+                selected.add(name)
+                stack.extend(registry[name].requires)
+        return [c for c in self.checks if c.name in selected]
+
+    def row_keys(self) -> np.ndarray:
+        """Return the keys of rows: tag_no (tree), or trap_id and s_date1."""
+        if self.trap_id is None:
+            return self.rec_id
+        return np.char.add(np.char.add(self.trap_id, "\t"), self.rec_id)
+
+    def _error_key(self, e: ErrDat) -> str:
+        # エラーの対象行のキー（row_keysに対応）
+        if self.trap_id is None:
+            return e.rec_id1
+        return e.rec_id2 + "\t" + e.rec_id1
+
+    def row_hashes(self, columns: Optional[List[str]] = None) -> Dict[str, str]:
+        """
+        Return md5 hashes of rows by key (see `row_keys`).
+
+        Rows with the same key are hashed together in the order of the data.
+
+        Parameters
+        ----------
+        columns : List[str], optional
+            Columns to be hashed (all columns in default)
+
+        """
+        cols = self.columns.tolist()
+        idx = [cols.index(c) for c in (cols if columns is None else columns)]
+        hashes: Dict[str, Any] = {}
+        for key, row in zip(self.row_keys().tolist(), self.values[:, idx].tolist()):
+            h = hashes.setdefault(key, hashlib.md5())
+            h.update("\x1f".join(row).encode() + b"\x1e")
+        return {k: h.hexdigest() for k, h in hashes.items()}
+
+    def manifest(self) -> Dict[str, Any]:
+        """
+        Return the manifest of the data and the results of the last `run_checks`.
+
+        The manifest is JSON serializable, and can be given to `run_checks` as
+        `previous` to check a new version of the data incrementally.
+        """
+        return {
+            "plot_id": self.plot_id,
+            "data_type": self.data_type,
+            "columns": self.columns.tolist(),
+            "col_meas": self.col_meas.tolist(),
+            "suppl": {
+                k: Path(v).stat().st_mtime for k, v in self._suppl_paths.items() if v
+            },
+            "rows": self.row_hashes(),
+            "errors": {
+                k: [list(map(str, astuple(e))) for e in v]
+                for k, v in self.check_results.items()
+            },
+        }
+
+    def _subset(
+        self, rows: np.ndarray, columns: Optional[List[str]] = None
+    ) -> "CheckDataCommon":
+        # 一部の行・列のデータ（測定値の列は元データに合わせる）
+        cols = self.columns.tolist()
+        idx = [cols.index(c) for c in (cols if columns is None else columns)]
+        sub = type(self)(
+            data=self.values[rows][:, idx],
+            columns=self.columns[idx],
+            plot_id=self.plot_id,
+            data_type=self.data_type,
+            metadata=self.metadata,
+            **self._suppl_paths,
+        )
+        meas_cols = np.isin(self.col_meas, self.columns[idx])
+        sub.meas = self.meas[rows][:, meas_cols]
+        sub.meas_orig = self.meas_orig[rows][:, meas_cols]
+        sub.col_meas = self.col_meas[meas_cols]
+        return sub
+
+    def _incremental(self, previous: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Compare the data with the manifest of the previous version.
+
+        Returns None if the data must be checked in full: the manifest is of other
+        data or supplementary files, columns are removed, the measurement columns
+        of the previous version are changed, or new columns are added to litter or
+        seed data.
+        """
+        cols = self.columns.tolist()
+        cols_prev = previous.get("columns", [])
+        suppl = {
+            k: Path(v).stat().st_mtime for k, v in self._suppl_paths.items() if v
+        }
+        if (
+            previous.get("plot_id") != self.plot_id
+            or previous.get("data_type") != self.data_type
+            or previous.get("suppl") != suppl
+            or any(c not in cols for c in cols_prev)
+            or [c for c in self.col_meas if c in cols_prev] != previous["col_meas"]
+        ):
+            return None
+        new_cols = [c for c in cols if c not in cols_prev]
+        if new_cols and self.trap_id is not None:
+            return None
+
+        rows_prev = previous["rows"]
+        hashes = self.row_hashes(cols_prev)
+        keys_unchanged = {k for k, h in hashes.items() if rows_prev.get(k) == h}
+        unchanged = np.array([k in keys_unchanged for k in self.row_keys().tolist()])
+        errors = {
+            name: [
+                e
+                for e in (ErrDat(*x) for x in errs)
+                if self._error_key(e) in keys_unchanged
+            ]
+            for name, errs in previous["errors"].items()
+        }
+        msg = "差分チェック: {}行中{}行が変更なし, 追加列 {}"
+        logger.info(msg.format(len(unchanged), unchanged.sum(), new_cols))
+        return {
+            "errors": errors,
+            "new_columns": new_cols,
+            "changed": self._subset(~unchanged) if not unchanged.all() else None,
+            "new": (
+                self._subset(unchanged, ["tag_no"] + new_cols)
+                if new_cols and unchanged.any()
+                else None
+            ),
+        }
+
+    def _targets(
+        self, spec: CheckSpec, inc: Optional[Dict[str, Any]]
+    ) -> List["CheckDataCommon"]:
+        # チェックを実行するデータ（差分チェックでは変更された行・追加列のみ）
+        if (
+            inc is None
+            or spec.scope == "all"
+            or spec.name not in inc["errors"]
+            or (spec.scope == "row" and inc["new_columns"])
+        ):
+            return [self]
+        targets = [inc["changed"]]
+        sub = inc["new"]
+        if spec.scope == "cell" and sub is not None:
+            if spec.columns:
+                new = any(re.match(p, c) for p in spec.columns for c in sub.columns)
+            else:
+                new = len(sub.col_meas) > 0
+            targets.append(sub if new else None)
+        return [x for x in targets if x is not None]
+
+    def _timed_check(
+        self, spec: CheckSpec, inc: Optional[Dict[str, Any]] = None
+    ) -> List[ErrDat]:
+        start = time.perf_counter()
+        targets = self._targets(spec, inc)
+        if targets and targets[0] is self:
+            errors = getattr(self, spec.name)()
+        else:
+            # 変更のない行は前回のエラーを再利用
+            errors = list(inc["errors"][spec.name])
+            for x in targets:
+                errors.extend(getattr(x, spec.name)())
+        self.check_timings[spec.name] = time.perf_counter() - start
+        return errors
+
+    def run_checks(
+        self,
+        names: Optional[List[str]] = None,
+        throughly: bool = False,
+        executor: Optional[Executor] = None,
+        previous: Optional[Dict[str, Any]] = None,
+    ) -> List[ErrDat]:
+        """
+        Run checks in the registry.
+
+        Checks are run level by level: a check is run after all its prerequisites,
+        and skipped if any of them found errors or were skipped, or if any of the
+        columns needed is absent (see `skipped_checks` for the reasons). The
+        derived arrays needed at each level are computed once before the checks,
+        which do not modify the data, so that the checks of the same level can be
+        run concurrently. Elapsed times are recorded in `check_timings`, and the
+        errors of each check in `check_results`.
+
+        If the manifest of the previous version of the data is given, the errors
+        of the unchanged rows (by `row_keys`) are reused: checks of the "cell"
+        scope are run only on the changed rows and the new columns, and those of
+        the "row" scope only on the changed rows, or on all rows if new census
+        columns are added. The errors are the same as in a full check, but not
+        always in the same order within each check.
+
+        Parameters
+        ----------
+        names : List[str], optional
+            Names of the checks to be run (see `select_checks`)
+        throughly : bool, default False
+            If True, checks of the thorough mode are also run
+        executor : concurrent.futures.Executor, optional
+            If given, the checks are submitted to the executor (e.g. a
+            ThreadPoolExecutor sharing the data); otherwise run sequentially
+        previous : dict, optional
+            Manifest of the previous version of the data (see `manifest`)
+
+        Returns
+        -------
+        List of ErrDat objects in the order of the registry
+
+        """
+        specs = self.select_checks(names, throughly)
+        results: Dict[str, List[ErrDat]] = {}
+        self.skipped_checks = {}
+        inc = self._incremental(previous) if previous else None
+
+        pending = specs
+        while pending:
+            done = set(results) | set(self.skipped_checks)
+            ready = [c for c in pending if all(r in done for r in c.requires)]
+            if not ready:
+                raise RuntimeError("Circular prerequisites in the checks")
+
+            runnable = []
+            for c in ready:
+                failed = [r for r in c.requires if r not in results or results[r]]
+                missing = [
+                    p
+                    for p in c.columns
+                    if not any(re.match(p, x) for x in self.columns)
+                ]
+                if failed:
+                    self.skipped_checks[c.name] = "prerequisite failed: {}".format(
+                        ", ".join(failed)
+                    )
+                elif missing:
+                    self.skipped_checks[c.name] = "no columns matching {}".format(
+                        ", ".join(missing)
+                    )
+                else:
+                    runnable.append(c)
+
+            skipped = [c.name for c in ready if c.name in self.skipped_checks]
+            if skipped:
+                msg = "チェック項目をスキップ ({})"
+                logger.warning(msg.format("; ".join(skipped)))
+
+            for c in runnable:
+                for x in self._targets(c, inc):
+                    for name in c.derived:
+                        x.derived(name)
+
+            if executor is None:
+                errors = [self._timed_check(c, inc) for c in runnable]
+            else:
+                futures = [
+                    executor.submit(self._timed_check, c, inc) for c in runnable
+                ]
+                errors = [f.result() for f in futures]
+            results.update(zip([c.name for c in runnable], errors))
+            pending = [c for c in pending if c not in ready]
+
+        self.check_results = results
+        return [e for c in specs for e in results.get(c.name, [])]
+
+    def check_all(
+        self,
+        throughly: bool = False,
+        executor: Optional[Executor] = None,
+        checks: Optional[List[str]] = None,
+        previous: Optional[Dict[str, Any]] = None,
+    ) -> List[ErrDat]:
+        """
+        Run data checks.
+
+        すべての項目をチェック
+        """
+        return self.run_checks(
+            checks, throughly=throughly, executor=executor, previous=previous
+        )
+
     def check_invalid_date(self):
         """
         Check for invalid values on the survey dates.
@@ -113,7 +501,10 @@ class CheckDataCommon(MonitoringData):
         調査日に不正な入力値
         """
         date_cols = list(filter(lambda x: re.match("^s_date", x), self.columns))
-        date = self.select(regex="^s_date")
+        if not date_cols:
+            return []
+        # 調査日の列が1列だけでも (行, 列) の2次元で扱う
+        date = self.select(regex="^s_date").reshape(len(self.rec_id), -1)
         date_orig = date.copy()
         date = np.vectorize(lambda x: re.sub("^NA$|^na$|^nd|^$", "11111111", x))(date)
         valid = np.vectorize(lambda x: isdate(x))(date)
@@ -220,7 +611,7 @@ class CheckDataCommon(MonitoringData):
 
         測定値の無効な入力値
         """
-        valid = np.vectorize(lambda x: isvalid(x, self.pat_except))(self.meas)
+        valid = self.derived("meas_valid")
         msg = "{}が無効な入力値 ({})"
         errors = [
             ErrDat(
@@ -239,9 +630,8 @@ class CheckDataCommon(MonitoringData):
 
         測定値の無効な入力値をnp.nanに置換
         """
-        valid = np.vectorize(lambda x: isvalid(x, self.pat_except))(self.meas)
-        for i, j in zip(*np.where(~valid)):
-            self.meas[i, j] = np.nan
+        self.meas = self.derived("meas_masked")
+        self._derived.clear()
 
     def check_positive(self):
         """
@@ -249,8 +639,7 @@ class CheckDataCommon(MonitoringData):
 
         測定値が正の値かどうかのチェック
         """
-        meas_c = np.vectorize(lambda x: isvalid(x, return_value=True))(self.meas)
-        meas_c[np.isnan(meas_c)] = 0
+        meas_c = np.nan_to_num(self.derived("meas_num"), nan=0.0)
 
         msg = "{}の測定値がマイナス ({})"
 
@@ -273,9 +662,46 @@ class CheckDataTree(CheckDataCommon):
     毎木データのチェック
     """
 
+    checks = [
+        CheckSpec("check_invalid_date", columns=("^s_date",), scope="cell"),
+        CheckSpec("check_sp_not_in_list", columns=("^spc_japan$",)),
+        CheckSpec("check_synonym", columns=("^spc_japan$",)),
+        CheckSpec("check_tag_dup"),
+        CheckSpec("check_indv_null", columns=("^indv_no$",), scope="cell"),
+        CheckSpec("check_sp_mismatch", columns=("^indv_no$", "^spc_japan$")),
+        CheckSpec(
+            "check_mesh_xy", columns=("^mesh_xcord$", "^mesh_ycord$"), scope="cell"
+        ),
+        CheckSpec(
+            "check_stem_xy", columns=("^stem_xcord$", "^stem_ycord$"), scope="cell"
+        ),
+        CheckSpec("check_blank_in_data_cols", scope="cell"),
+        CheckSpec("check_invalid_values", derived=("meas_valid",), scope="cell"),
+        CheckSpec("check_missing", derived=("meas_gbh",), scope="row"),
+        CheckSpec("check_values_after_d", derived=("meas_gbh",), scope="row"),
+        CheckSpec(
+            "find_anomaly", derived=("meas_gbh", "meas_num", "years"), scope="row"
+        ),
+        CheckSpec(
+            "check_values_recruits",
+            derived=("meas_gbh", "meas_num", "years"),
+            scope="row",
+        ),
+        CheckSpec("check_values_nd", derived=("meas_gbh", "years"), scope="row"),
+        CheckSpec("check_local_name", columns=("^spc_japan$",), throughly=True),
+    ]
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
 
+    def _derive_meas_gbh(self) -> np.ndarray:
+        # 無効な入力値をマスクし、'dxx.xx'を'd'に変換した測定値
+        return replace_dxx(self.derived("meas_masked"))
+
+    def _derive_years(self) -> np.ndarray:
+        # 測定値の列名から調査年を取得
+        return np.array([retrive_year(x) for x in self.col_meas], dtype=int)
+
     def check_tag_dup(self):
         """
         Check for tag number duplication.
@@ -332,25 +758,25 @@ class CheckDataTree(CheckDataCommon):
         mesh_[xy]cordのエラー
         """
         errors = []
-        if not self.xy_combn:
+        if self.xy_grid is None:
             return errors
 
-        for i, xy in enumerate(self.select(regex="^mesh_[xy]cord$")):
-            tag = self.rec_id[i]
-            target = "mesh_xycord={}".format(str(xy))
-            try:
-                if not tuple(xy.astype(int)) in self.xy_combn:
-                    msg = "調査地に存在しないxy座標の組み合わせ"
-                    errors.append(ErrDat(self.plot_id, tag, target, msg))
-            except ValueError:
-                if any([j in ["nd", "na", "NA"] for j in xy]):
-                    pass
-                elif list(xy).count("") > 0:
-                    msg = "mesh_xycordに空白セル"
-                    errors.append(ErrDat(self.plot_id, tag, target, msg))
-                else:
-                    msg = "mesh_xycordの入力値が非数値"
-                    errors.append(ErrDat(self.plot_id, tag, target, msg))
+        xy = self.select(regex="^mesh_[xy]cord$")
+        xy_int = map_unique(lambda x: parse_number(x, int), xy, float)
+        numeric = ~np.isnan(xy_int).any(axis=1)
+        invalid = numeric.copy()
+        invalid[numeric] = ~self.xy_grid.contains(*xy_int[numeric].T)
+
+        msg = [
+            "調査地に存在しないxy座標の組み合わせ",
+            "mesh_xycordに空白セル",
+            "mesh_xycordの入力値が非数値",
+        ]
+        k = np.select([numeric, (xy == "").any(axis=1)], [0, 1], 2)
+        skip = ~numeric & np.isin(xy, ["nd", "na", "NA"]).any(axis=1)
+        for i in np.where(invalid | (~numeric & ~skip))[0]:
+            target = "mesh_xycord={}".format(str(xy[i]))
+            errors.append(ErrDat(self.plot_id, self.rec_id[i], target, msg[k[i]]))
         return errors
 
     def check_stem_xy(self):
@@ -360,23 +786,19 @@ class CheckDataTree(CheckDataCommon):
         stem_[xy]cordのエラー
         """
         errors = []
-        if not self.xy_combn:
+        if self.xy_grid is None:
             return errors
 
-        for i, xy in enumerate(self.select(regex="^stem_[xy]cord$")):
-            tag = self.rec_id[i]
-            target = "stem_xycord={}".format(str(xy))
-            try:
-                np.array(xy).astype(np.float64)
-            except ValueError:
-                if any([j in ["nd", "na", "NA"] for j in xy]):
-                    pass
-                elif list(xy).count("") > 0:
-                    msg = "stem_xycordに空白セル"
-                    errors.append(ErrDat(self.plot_id, tag, target, msg))
-                else:
-                    msg = "stem_xycordの入力値が非数値"
-                    errors.append(ErrDat(self.plot_id, tag, target, msg))
+        xy = self.select(regex="^stem_[xy]cord$")
+        numeric = map_unique(lambda x: parse_number(x) is not None, xy, bool)
+        numeric = numeric.all(axis=1)
+
+        msg = ["stem_xycordに空白セル", "stem_xycordの入力値が非数値"]
+        k = np.where((xy == "").any(axis=1), 0, 1)
+        skip = np.isin(xy, ["nd", "na", "NA"]).any(axis=1)
+        for i in np.where(~numeric & ~skip)[0]:
+            target = "stem_xycord={}".format(str(xy[i]))
+            errors.append(ErrDat(self.plot_id, self.rec_id[i], target, msg[k[i]]))
         return errors
 
     def replace_dxx_in_gbh(self):
@@ -385,14 +807,8 @@ class CheckDataTree(CheckDataCommon):
 
         枯死個体のgbhが'dxx.xx'と入力されている場合は'd'に変換
         """
-        pat_dxx = r"(?<![nd])d(?![d])\s?([0-9]+[.]?[0-9]*)"
-        match_dxx = np.vectorize(lambda x: find_pattern(x, pat_dxx))(self.meas)
-        for i, j in zip(*np.where(match_dxx)):
-            if j > 0 and match_dxx[i, j - 1]:
-                # 複数年に渡って"dxx.xx"と入力されている場合は、2つ目以降を'na'にする
-                self.meas[i, j] = "na"
-            else:
-                self.meas[i, j] = "d"
+        self.meas = replace_dxx(self.meas)
+        self._derived.clear()
 
     def check_missing(self):
         """
@@ -400,11 +816,10 @@ class CheckDataTree(CheckDataCommon):
 
         前年まで生存していた個体がnaになっている
         """
+        meas = self.derived("meas_gbh")
         pat_na = r"^na$|^NA$"
-        match_na = np.vectorize(lambda x: find_pattern(x, pat_na))(self.meas)
-        alive = np.vectorize(lambda x: isalive(x, pat_except=self.pat_except))(
-            self.meas
-        )
+        match_na = np.vectorize(lambda x: find_pattern(x, pat_na))(meas)
+        alive = np.vectorize(lambda x: isalive(x, pat_except=self.pat_except))(meas)
 
         msg = "前年まで生存。枯死？"
         errors = [
@@ -422,8 +837,9 @@ class CheckDataTree(CheckDataCommon):
         """
         pat_d = r"^d$"
         pat_dd = r"^dd$|^na$|^NA$"
-        match_d = np.vectorize(lambda x: find_pattern(x, pat_d))(self.meas)
-        match_dd = np.vectorize(lambda x: find_pattern(x, pat_dd))(self.meas)
+        meas = self.derived("meas_gbh")
+        match_d = np.vectorize(lambda x: find_pattern(x, pat_d))(meas)
+        match_dd = np.vectorize(lambda x: find_pattern(x, pat_dd))(meas)
 
         msg = "枯死の次の調査時のgbhが「na」もしくは「dd」になっていない"
         errors = [
@@ -440,43 +856,34 @@ class CheckDataTree(CheckDataCommon):
         成長量が基準より大きいあるいは小さい
         """
         errors = []
-        if self.meas.shape[1] == 1:
+        if self.meas.shape[1] <= 1:
             return errors
 
-        # NOTE: 前回の値にcd, vn, viが付く場合はスキップ
-        meas_c = np.vectorize(lambda x: isvalid(x, return_value=True))(self.meas)
+        meas_c = self.derived("meas_num")
         pat_vc = r"^vi|^vn|^cd"
-        match_vc = np.vectorize(lambda x: find_pattern(x, pat_vc))(self.meas)
-
-        for i, row in enumerate(meas_c):
-            index_notnull = np.where(~np.isnan(row))[0]
-            if len(index_notnull) == 0:
-                continue
-            gbhdiff = np.diff(row[index_notnull])
-            yrdiff = np.diff(np.vectorize(retrive_year)(self.col_meas[index_notnull]))
-
-            excess = gbhdiff > yrdiff * 2.5 + 3.8
-            minus = gbhdiff < -3.1
-            index_excess = index_notnull[1:][excess]
-            index_minus = index_notnull[1:][minus]
-
-            msg = "成長量が基準値より大きい。測定ミス？"
-            errors.extend(
-                [
-                    ErrDat(self.plot_id, self.rec_id[i], self.col_meas[j], msg)
-                    for j in index_excess
-                    if not match_vc[i, j - 1]
-                ]
-            )
+        match_vc = map_unique(
+            lambda x: find_pattern(x, pat_vc), self.derived("meas_gbh"), bool
+        )
+        gbhdiff, yrdiff = growth_from_previous(meas_c, self.derived("years"))
 
-            msg = "成長量が基準値より小さい。測定ミス？"
-            errors.extend(
-                [
-                    ErrDat(self.plot_id, self.rec_id[i], self.col_meas[j], msg)
-                    for j in index_minus
-                    if not match_vc[i, j - 1]
-                ]
-            )
+        # NOTE: 前回の値にcd, vn, viが付く場合はスキップ
+        skip = np.c_[np.zeros(len(meas_c), dtype=bool), match_vc[:, :-1]]
+        excess = (gbhdiff > yrdiff * 2.5 + 3.8) & ~skip
+        minus = (gbhdiff < -3.1) & ~skip
+
+        # 個体ごとに成長量が大きい・小さいの順に出力
+        msg = [
+            "成長量が基準値より大きい。測定ミス？",
+            "成長量が基準値より小さい。測定ミス？",
+        ]
+        (i_e, j_e), (i_m, j_m) = np.nonzero(excess), np.nonzero(minus)
+        i, j = np.r_[i_e, i_m], np.r_[j_e, j_m]
+        k = np.repeat([0, 1], [len(i_e), len(i_m)])
+        order = np.lexsort((j, k, i))
+        errors = [
+            ErrDat(self.plot_id, self.rec_id[i_], self.col_meas[j_], msg[k_])
+            for i_, j_, k_ in zip(i[order], j[order], k[order])
+        ]
         return errors
 
     def check_values_recruits(self):
@@ -489,14 +896,17 @@ class CheckDataTree(CheckDataCommon):
         if self.meas.shape[1] > 1:
             return errors
 
-        meas_c = np.vectorize(lambda x: isvalid(x, return_value=True))(self.meas)
+        meas_c = self.derived("meas_num")
         notnull = ~np.isnan(meas_c)
         pat_na = r"^na$|^NA$"
-        match_na = np.vectorize(lambda x: find_pattern(x, pat_na))(self.meas)
+        match_na = np.vectorize(lambda x: find_pattern(x, pat_na))(
+            self.derived("meas_gbh")
+        )
+        years = self.derived("years")
         msg = "新規加入個体だが、加入時のgbhが基準より大きいのため前回計測忘れの疑い"
         errors = []
         for i, j in zip(*np.where(match_na[:, :-1] & notnull[:, 1:])):
-            yrdiff = np.diff(np.vectorize(retrive_year)(self.col_meas[[j, j + 1]]))[0]
+            yrdiff = years[j + 1] - years[j]
             if meas_c[i, j + 1] >= (15 + yrdiff * 2.5 + 3.8):
                 target = "{}={}; {}={}".format(
                     self.col_meas[j],
@@ -513,61 +923,30 @@ class CheckDataTree(CheckDataCommon):
 
         ndだが前後の測定値と比較して成長量の基準に収まっている
         """
-        pat_ndxx = r"^nd\s?([0-9]+[.]?[0-9]*)"
-        match_ndxx = np.vectorize(lambda x: find_pattern(x, pat_ndxx))(self.meas)
-        meas_c = np.vectorize(lambda x: isvalid(x, "^nd", return_value=True))(self.meas)
-
         errors = []
-        for i, row in enumerate(meas_c):
-            if any(match_ndxx[i]):
-                index_notnull = np.where(~np.isnan(row))[0]
-                if len(index_notnull) == 0:
-                    continue
-                gbhdiff = np.diff(row[index_notnull])
-                yrdiff = np.diff(
-                    np.vectorize(retrive_year)(self.col_meas[index_notnull])
-                )
-                in_range = (gbhdiff <= yrdiff * 2.5 + 3.8) & (gbhdiff >= -3.1)
-                index_notnull[1:][in_range]
-                msg = "誤って「nd: 測定間違い」となっている可能性あり"
-                for jj in np.where(match_ndxx[i][index_notnull][1:])[0]:
-                    j = index_notnull[jj + 1]
-                    # 最初か最後の調査時のndはスキップ
-                    if (j < (len(self.col_meas) - 1)) and (jj < (len(in_range) - 1)):
-                        if all(in_range[jj : (jj + 2)]):
-                            errors.append(
-                                ErrDat(
-                                    self.plot_id, self.rec_id[i], self.col_meas[j], msg
-                                )
-                            )
-        return errors
-
-    def check_all(self, throughly=False):
-        """
-        Run data checks.
+        # 最初か最後の調査時のndはスキップ
+        if self.meas.shape[1] < 3:
+            return errors
 
-        すべての項目をチェック
-        """
-        errors = []
-        errors.extend(self.check_invalid_date())
-        errors.extend(self.check_sp_not_in_list())
-        errors.extend(self.check_synonym())
-        errors.extend(self.check_tag_dup())
-        errors.extend(self.check_indv_null())
-        errors.extend(self.check_sp_mismatch())
-        errors.extend(self.check_mesh_xy())
-        errors.extend(self.check_stem_xy())
-        errors.extend(self.check_blank_in_data_cols())
-        errors.extend(self.check_invalid_values())
-        self.mask_invalid_values()
-        self.replace_dxx_in_gbh()
-        errors.extend(self.check_missing())
-        errors.extend(self.check_values_after_d())
-        errors.extend(self.find_anomaly())
-        errors.extend(self.check_values_recruits())
-        errors.extend(self.check_values_nd())
-        if throughly:
-            errors.extend(self.check_local_name())
+        pat_ndxx = r"^nd\s?([0-9]+[.]?[0-9]*)"
+        meas = self.derived("meas_gbh")
+        match_ndxx = map_unique(lambda x: find_pattern(x, pat_ndxx), meas, bool)
+        meas_c = map_unique(lambda x: isvalid(x, "^nd", return_value=True), meas, float)
+        gbhdiff, yrdiff = growth_from_previous(meas_c, self.derived("years"))
+        in_range = (gbhdiff <= yrdiff * 2.5 + 3.8) & (gbhdiff >= -3.1)
+
+        # 次の測定値までの成長量
+        n_col = meas.shape[1]
+        next_j = next_notnull(~np.isnan(meas_c))
+        in_range_next = np.take_along_axis(
+            in_range, np.minimum(next_j, n_col - 1), axis=1
+        ) & (next_j < n_col)
+
+        msg = "誤って「nd: 測定間違い」となっている可能性あり"
+        errors = [
+            ErrDat(self.plot_id, self.rec_id[i], self.col_meas[j], msg)
+            for i, j in zip(*np.nonzero(match_ndxx & in_range & in_range_next))
+        ]
         return errors
 
 
@@ -578,6 +957,33 @@ class CheckDataLitter(CheckDataCommon):
     リターデータのチェック
     """
 
+    # 日付に不正な入力値がある場合は他の項目をチェックしない
+    checks = [
+        CheckSpec("check_invalid_date", columns=("^s_date",)),
+        CheckSpec("check_trap_date_combinations", requires=("check_invalid_date",)),
+        CheckSpec("check_installation_period1", requires=("check_invalid_date",)),
+        CheckSpec("check_installation_period2", requires=("check_invalid_date",)),
+        CheckSpec("check_installation_period3", requires=("check_invalid_date",)),
+        CheckSpec(
+            "check_blank_in_data_cols", requires=("check_invalid_date",), scope="cell"
+        ),
+        CheckSpec(
+            "check_invalid_values",
+            derived=("meas_valid",),
+            requires=("check_invalid_date",),
+            scope="cell",
+        ),
+        CheckSpec(
+            "check_positive",
+            derived=("meas_num",),
+            requires=("check_invalid_date",),
+            scope="cell",
+        ),
+        CheckSpec(
+            "find_anomaly", derived=("meas_masked",), requires=("check_invalid_date",)
+        ),
+    ]
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.period = np.array(
@@ -592,19 +998,35 @@ class CheckDataLitter(CheckDataCommon):
         """
         # 同じ時期でも数日に分けて回収した場合などもあり、必ずしもエラーではない
         errors = []
+        g = GroupBy(self.period)
+
+        # 設置・回収日とトラップで並べ替え、隣接する行の重複を検出
+        order = np.lexsort((self.trap_id, g.codes))
+        code_s, trap_s = g.codes[order], self.trap_id[order]
+        dup = (code_s[1:] == code_s[:-1]) & (trap_s[1:] == trap_s[:-1])
+        trap_dup: Dict[int, List[str]] = {}
+        for k, trap in zip(code_s[1:][dup], trap_s[1:][dup]):
+            traps = trap_dup.setdefault(k, [])
+            if not traps or traps[-1] != trap:
+                traps.append(trap)
+
+        # 使用中のトラップが各設置・回収日にあるかどうか
         trap_in_use = [k for k, v in self.trap_list.items() if v["use"]]
-        for period_s, n_trap in zip(*np.unique(self.period, return_counts=True)):
+        index_in_use = {trap: j for j, trap in enumerate(trap_in_use)}
+        j = np.array([index_in_use.get(x, -1) for x in self.trap_id], dtype=int)
+        present = np.zeros((len(g), len(trap_in_use)), dtype=bool)
+        present[g.codes[j >= 0], j[j >= 0]] = True
+
+        for k, (period_s, n_trap) in enumerate(zip(g.groups, g.sizes)):
             s_date1_s, s_date2_s = period_s.split("-")
-            trap_s = self.select("trap_id")[np.where(self.period == period_s)[0]]
-            trap_dup = find_duplicates(trap_s)
-            if trap_dup.size > 0:
+            if k in trap_dup:
                 msg = "同じ設置・回収日の組み合わせでトラップの重複あり"
-                msg += " ({})".format("; ".join(trap_dup))
+                msg += " ({})".format("; ".join(trap_dup[k]))
                 errors.append(ErrDat(self.plot_id, s_date1_s, "", msg))
 
             if n_trap < len(trap_in_use):
                 msg = "同じ設置・回収日の組み合わせでトラップの欠落あり"
-                trap_lack = [x for x in trap_in_use if x not in trap_s]
+                trap_lack = [trap_in_use[j] for j in np.where(~present[k])[0]]
                 msg += " ({})".format(";".join(trap_lack))
                 errors.append(ErrDat(self.plot_id, s_date1_s, "", msg))
         return errors
@@ -681,31 +1103,26 @@ class CheckDataLitter(CheckDataCommon):
 
         設置日と前回の回収日のずれ
         """
-        errors = []
-        for trap in np.unique(self.trap_id):
-            s_date1_s = self.select("s_date1")[self.trap_id == trap]
-            s_date2_s = self.select("s_date2")[self.trap_id == trap]
-            s_date1_s_dt = np.array(list(map(as_datetime, s_date1_s)))
-            s_date2_s_dt = np.array(list(map(as_datetime, s_date2_s)))
-
-            delta_days = np.vectorize(calc_delta_days)(
-                s_date2_s_dt[:-1], s_date1_s_dt[1:]
-            )
-
-            interrupted = (delta_days != 0) & (delta_days < 45)
-            within_year = np.array(
-                [i.year == j.year for i, j in zip(s_date2_s_dt[:-1], s_date1_s_dt[1:])]
-            )
-
-            msg = "前回の回収日から{}日間の中断期間"
-            errors.extend(
-                [
-                    ErrDat(
-                        self.plot_id, s_date1_s[i + 1], trap, msg.format(delta_days[i])
-                    )
-                    for i in np.where(interrupted & within_year)[0]
-                ]
-            )
+        # トラップごとに（元の行の順で）前回の回収日と設置日を比較
+        g = GroupBy(self.trap_id)
+        s_date1_s = self.select("s_date1")[g.order]
+        s_date1_dt = as_datetime64(s_date1_s)
+        s_date2_dt = as_datetime64(self.select("s_date2")[g.order])
+        same_trap = g.codes[g.order][1:] == g.codes[g.order][:-1]
+
+        # NaT（不正な日付）は中断期間としない
+        delta_days = (s_date1_dt[1:] - s_date2_dt[:-1]).astype(int)
+        interrupted = (delta_days != 0) & (delta_days < 45)
+        year1 = s_date1_dt.astype("datetime64[Y]")
+        year2 = s_date2_dt.astype("datetime64[Y]")
+        within_year = year2[:-1] == year1[1:]
+
+        trap_s = self.trap_id[g.order]
+        msg = "前回の回収日から{}日間の中断期間"
+        errors = [
+            ErrDat(self.plot_id, s_date1_s[i + 1], trap_s[i], msg.format(delta_days[i]))
+            for i in np.where(same_trap & interrupted & within_year)[0]
+        ]
         return errors
 
     def find_anomaly(self):
@@ -720,60 +1137,37 @@ class CheckDataLitter(CheckDataCommon):
         # 0が多い月はそれ以外の値が外れ値になるので、0も除外
         # 絶乾重量（wdry）のみ
         wdry_cols = [i for i, x in enumerate(self.col_meas) if re.search("wdry_", x)]
-        meas_wdry = self.meas[:, wdry_cols]
+        meas_wdry = self.derived("meas_masked")[:, wdry_cols]
         meas_wdry[meas_wdry == "0"] = np.nan
-        meas_c = np.vectorize(lambda x: isvalid(x, "^NA$|^na$|^-$", return_value=True))(
-            meas_wdry
+        meas_c = map_unique(
+            lambda x: isvalid(x, "^NA$|^na$|^-$", return_value=True), meas_wdry, float
         )
         meas_c[np.less(meas_c, 0.0, where=~np.isnan(meas_c))] = np.nan
 
-        msg = "{}は外れ値の可能性あり"
-        errors = []
-        for period_s in np.unique(self.period):
-            d1 = period_s.split("-")[0]
-            values_s = meas_c[self.period == period_s]
-            trap_id_s = self.trap_id[self.period == period_s]
-
-            for j, vals in enumerate(np.transpose(values_s)):
-                if np.sum(~np.isnan(vals)) < 5:
-                    continue
-                # outlier = smirnov_grubbs(np.log(vals), alpha=0.01)
-                outlier = find_anomaly_tukey(np.log(vals), k=3)
-                errors.extend(
-                    [
-                        ErrDat(
-                            self.plot_id,
-                            d1,
-                            trap_id_s[i],
-                            msg.format(self.col_meas[wdry_cols[j]]),
-                        )
-                        for i in np.where(outlier)[0]
-                    ]
-                )
-        return errors
-
-    def check_all(self, throughly=False):
-        """
-        Run data checks.
-
-        すべての項目をチェック
-        """
-        errors = []
-        errors.extend(self.check_invalid_date())
-        # 日付に不正な入力値がある場合はここで終了
-        if errors:
-            logger.warning("日付に不正な入力値があるためデータチェックを終了")
-            return errors
-        errors.extend(self.check_trap_date_combinations())
-        errors.extend(self.check_installation_period1())
-        errors.extend(self.check_installation_period2())
-        errors.extend(self.check_installation_period3())
-        errors.extend(self.check_blank_in_data_cols())
-        errors.extend(self.check_invalid_values())
-        self.mask_invalid_values()
-        errors.extend(self.check_positive())
-        errors.extend(self.find_anomaly())
+        # 回収日ごとに対数値の四分位数を求める
+        g = GroupBy(self.period)
+        with np.errstate(divide="ignore"):
+            log_c = np.log(meas_c)
+        q1, q3 = g.quantile(log_c, [0.25, 0.75])
+        n_valid = g.count(log_c)
+        k = 3.0
+        lower = (q1 - k * (q3 - q1))[g.codes]
+        upper = (q3 + k * (q3 - q1))[g.codes]
+        outlier = ((log_c < lower) | (log_c > upper)) & (n_valid[g.codes] >= 5)
 
+        msg = "{}は外れ値の可能性あり"
+        d1 = np.array([p.split("-")[0] for p in g.groups])
+        i, j = np.nonzero(outlier)
+        order = np.lexsort((i, j, g.codes[i]))
+        errors = [
+            ErrDat(
+                self.plot_id,
+                d1[g.codes[i_]],
+                self.trap_id[i_],
+                msg.format(self.col_meas[wdry_cols[j_]]),
+            )
+            for i_, j_ in zip(i[order], j[order])
+        ]
         return errors
 
 
@@ -784,6 +1178,17 @@ class CheckDataSeed(CheckDataCommon):
     種子データのチェック
     """
 
+    checks = [
+        CheckSpec("check_invalid_date", columns=("^s_date",)),
+        CheckSpec("check_sp_not_in_list", columns=("^spc$",)),
+        CheckSpec("check_synonym", columns=("^spc$",)),
+        CheckSpec("check_blank_in_data_cols", scope="cell"),
+        CheckSpec("check_trap", scope="cell"),
+        CheckSpec("check_invalid_values", derived=("meas_valid",), scope="cell"),
+        CheckSpec("check_positive", derived=("meas_num",), scope="cell"),
+        CheckSpec("check_local_name", columns=("^spc$",), throughly=True),
+    ]
+
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
         self.period = np.array(
@@ -799,35 +1204,14 @@ class CheckDataSeed(CheckDataCommon):
         errors = []
         if not self.trap_list:
             return errors
-        trap_uniq = np.unique(self.trap_id)
-        trap_not_in_list = [i for i in trap_uniq if i not in self.trap_list]
-        for trap in trap_not_in_list:
-            msg = "リストにないtrap_id ({})".format(trap)
-            errors.extend(
-                [
-                    ErrDat(self.plot_id, self.rec_id[i], trap, msg)
-                    for i in np.where(self.trap_id == trap)[0]
-                ]
-            )
-        return errors
-
-    def check_all(self, throughly=False):
-        """
-        Run data checks.
-
-        すべての項目をチェック
-        """
-        errors = []
-        errors.extend(self.check_invalid_date())
-        errors.extend(self.check_sp_not_in_list())
-        errors.extend(self.check_synonym())
-        errors.extend(self.check_blank_in_data_cols())
-        errors.extend(self.check_trap())
-        errors.extend(self.check_invalid_values())
-        errors.extend(self.check_positive())
-        if throughly:
-            errors.extend(self.check_local_name())
-
+        not_in_list = ~np.isin(self.trap_id, list(self.trap_list))
+        rows = np.where(not_in_list)[0]
+        rows = rows[np.argsort(self.trap_id[rows], kind="stable")]
+        msg = "リストにないtrap_id ({})"
+        errors = [
+            ErrDat(self.plot_id, self.rec_id[i], trap, msg.format(trap))
+            for i, trap in zip(rows, self.trap_id[rows])
+        ]
         return errors
 
 
@@ -852,6 +1236,33 @@ def find_pattern(s: str, pat: str):
         return False
 
 
+def replace_dxx(meas: np.ndarray) -> np.ndarray:
+    """
+    Convert GBH values of dead trees input as 'dxx.xx' to 'd'.
+
+    If 'dxx.xx' is input over multiple censuses, the second and subsequent values
+    are converted to 'na'.
+    """
+    meas = meas.copy()
+    pat_dxx = r"(?<![nd])d(?![d])\s?([0-9]+[.]?[0-9]*)"
+    match_dxx = np.vectorize(lambda x: find_pattern(x, pat_dxx))(meas)
+    for i, j in zip(*np.where(match_dxx)):
+        if j > 0 and match_dxx[i, j - 1]:
+            # 複数年に渡って"dxx.xx"と入力されている場合は、2つ目以降を'na'にする
+            meas[i, j] = "na"
+        else:
+            meas[i, j] = "d"
+    return meas
+
+
+def parse_number(s: str, type_: Callable = float):
+    """Convert a string to a number, or return None if not possible."""
+    try:
+        return type_(s)
+    except ValueError:
+        return None
+
+
 def isalive(s: str, pat_except: str = "", gbh_threthold: float = 15.0):
     """
     Check whether the GBH larger than the threthold.
@@ -895,6 +1306,84 @@ def as_datetime(s_date, format="%Y%m%d"):
         return None
 
 
+def map_unique(func: Callable, x: np.ndarray, dtype: Any = object) -> np.ndarray:
+    """
+    Apply a function element-wise, calling it only once for each unique value.
+
+    Parameters
+    ----------
+    func : callable
+        Function of a single value
+    x : numpy ndarray
+        Input array
+    dtype : data-type, default object
+        Data type of the output array
+
+    """
+    uniq, inv = np.unique(x, return_inverse=True)
+    return np.array([func(u) for u in uniq], dtype=dtype)[inv].reshape(x.shape)
+
+
+def previous_notnull(notnull: np.ndarray) -> np.ndarray:
+    """
+    Return the column index of the previous non-null value in each row.
+
+    -1 if there are no non-null values before the column.
+    """
+    n_col = notnull.shape[1]
+    last = np.maximum.accumulate(np.where(notnull, np.arange(n_col), -1), axis=1)
+    return np.c_[np.full(len(notnull), -1), last[:, :-1]].astype(int)
+
+
+def next_notnull(notnull: np.ndarray) -> np.ndarray:
+    """
+    Return the column index of the next non-null value in each row.
+
+    The number of columns if there are no non-null values after the column.
+    """
+    n_col = notnull.shape[1]
+    first = np.where(notnull, np.arange(n_col), n_col)[:, ::-1]
+    first = np.minimum.accumulate(first, axis=1)[:, ::-1]
+    return np.c_[first[:, 1:], np.full(len(notnull), n_col)].astype(int)
+
+
+def growth_from_previous(
+    x: np.ndarray, years: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Return the growth from the previous non-null value, and the interval (years).
+
+    Parameters
+    ----------
+    x : numpy ndarray
+        Two-dimensional array of measurements (rows: individuals, columns: censuses)
+        with missing values as nan
+    years : numpy ndarray
+        Census years of the columns
+
+    Returns
+    -------
+    Tuple of the two-dimensional arrays of growth and interval. Values are nan if
+    the value is nan or there is no previous non-null value in the row.
+
+    """
+    prev = previous_notnull(~np.isnan(x))
+    has_prev = prev >= 0
+    prev = np.where(has_prev, prev, 0)
+    growth = np.where(has_prev, x - np.take_along_axis(x, prev, axis=1), np.nan)
+    interval = np.where(has_prev & ~np.isnan(x), years - years[prev], np.nan)
+    return growth, interval
+
+
+def as_datetime64(s_date: np.ndarray) -> np.ndarray:
+    """Convert strings in yyyymmdd format to numpy datetime64 (NaT if invalid)."""
+
+    def to_iso(x):
+        return "{}-{}-{}".format(x[:4], x[4:6], x[6:]) if isdate(x) else "NaT"
+
+    return map_unique(to_iso, np.asarray(s_date, dtype=str), "datetime64[D]")
+
+
 def find_duplicates(array):
     """Find duplicates."""
     uniq, counts = np.unique(array, return_counts=True)
@@ -1012,15 +1501,81 @@ def find_anomaly_tukey(x, k=3.0):
 #     return np.array([True if i in i_out else False for i in range(len(x))])
 
 
-def argsort_n(x: np.ndarray) -> List[int]:
-    """Return the indices that would sort an array in a natural sort order."""
+class IgnoreList(object):
+    """
+    Index of an ignore list of errors.
 
-    def key(string):
-        return [
-            int(s) if s.isdigit() else s.lower() for s in re.split("([0-9]+)", string)
-        ]
+    Each row of the list has the four fields of ErrDat. Rows of plain values are
+    looked up in a hashed set. Fields prefixed by 'glob:' or 're:' are patterns,
+    compiled once: in a 'glob:' field '*' matches any characters, and a 're:'
+    field is a regular expression (to be matched with the whole value). Other
+    fields, including those with '*', match the value exactly.
 
-    return sorted(range(len(x)), key=lambda i: key(str(x[i])))
+    Parameters
+    ----------
+    rows : Iterable of sequences of str
+        Rows of the ignore list
+
+    """
+
+    def __init__(self, rows: Iterable):
+        self.exact: Set[Tuple[str, ...]] = set()
+        self.rules: List[Tuple[Pattern, ...]] = []
+        for row in rows:
+            row = tuple(str(x) for x in row)
+            if any(x.startswith(("glob:", "re:")) for x in row):
+                self.rules.append(tuple(map(compile_ignore_field, row)))
+            else:
+                self.exact.add(row)
+
+    def __len__(self):
+        return len(self.exact) + len(self.rules)
+
+    def __contains__(self, e: ErrDat) -> bool:
+        key = astuple(e)
+        if key in self.exact:
+            return True
+        return any(
+            all(p.fullmatch(str(x)) for p, x in zip(rule, key)) for rule in self.rules
+        )
+
+    def filter(self, errors: List[ErrDat]) -> List[ErrDat]:
+        """Return the errors not in the ignore list."""
+        return [e for e in errors if e not in self]
+
+
+def compile_ignore_field(s: str) -> Pattern:
+    """Compile a field of the ignore list ('glob:' wildcards, 're:' regex or value)."""
+    if s.startswith("re:"):
+        return re.compile(s[3:])
+    if s.startswith("glob:"):
+        return re.compile(".*".join(map(re.escape, s[5:].split("*"))))
+    return re.compile(re.escape(s))
+
+
+def load_ignore_list(path_ignore: Union[str, Path]) -> IgnoreList:
+    """
+    Load an ignore list of errors.
+
+    The index is cached while the file is not modified.
+    """
+    return _load_ignore_list(str(path_ignore), Path(path_ignore).stat().st_mtime)
+
+
+@lru_cache(maxsize=16)
+def _load_ignore_list(path_ignore: str, mtime: float) -> IgnoreList:
+    return IgnoreList(read_table(path_ignore)[:, :4].tolist())
+
+
+def natural_key(s: str) -> Tuple:
+    """Return the key of a string for the natural sort order."""
+    return tuple(int(x) if x.isdigit() else x.lower() for x in re.split("([0-9]+)", s))
+
+
+def argsort_n(x: np.ndarray) -> List[int]:
+    """Return the indices that would sort an array in a natural sort order."""
+    keys = [natural_key(str(s)) for s in x]
+    return sorted(range(len(x)), key=keys.__getitem__)
 
 
 def sort_array(x: np.ndarray, sort_col: Union[int, List[int]] = []) -> np.ndarray:
@@ -1033,6 +1588,8 @@ def sort_array(x: np.ndarray, sort_col: Union[int, List[int]] = []) -> np.ndarra
         Two dimentional array to be sorted
     sort_col : int or List[int]
         Column indices to use for sorting. All columns will be used in default.
+        The array is sorted by the last column first (as if it were sorted by each
+        column in turn)
 
     """
     if not sort_col:
@@ -1040,19 +1597,113 @@ def sort_array(x: np.ndarray, sort_col: Union[int, List[int]] = []) -> np.ndarra
     elif not isinstance(sort_col, list):
         sort_col = [sort_col]
     try:
-        for c in sort_col:
-            x = x[argsort_n(x[:, c])]
+        cols = [x[:, c] for c in sort_col[::-1]]
     except IndexError as e:
         if re.search("out of bounds", e.__str__()):
             raise
         else:
             raise TypeError("sort_col must be an int or List[int]")
     else:
-        return x
+        # 全列の自然順のキーを一度に作成してソート
+        keys = [tuple(natural_key(str(s)) for s in row) for row in zip(*cols)]
+        return x[sorted(range(len(x)), key=keys.__getitem__)]
+
+
+def sort_errors(errors: List[ErrDat]) -> List[Tuple[str, ...]]:
+    """Return the fields of errors sorted in the natural order of all fields."""
+    rows = [tuple(map(str, astuple(e))) for e in errors]
+    return sorted(rows, key=lambda row: tuple(map(natural_key, row)))
+
+
+def report_styles() -> List[NamedStyle]:
+    """Return the named styles of the error list (xlsx)."""
+    return [
+        NamedStyle(
+            name="report_header",
+            font=Font(name="Arial", bold=True),
+            fill=PatternFill("solid", fgColor="7e7e7e"),
+        ),
+        NamedStyle(name="report_body", font=Font(name="Arial")),
+    ]
+
+
+def save_errors(
+    errors: List[ErrDat],
+    dest: Union[str, Path, IO[bytes]],
+    header: Optional[List[str]] = None,
+    format: str = "xlsx",
+):
+    """
+    Save the error list in a xlsx, csv or json file.
+
+    The errors are sorted by all the fields in a natural sort order. The xlsx
+    file is written in the write-only mode, so that rows are streamed to the file
+    instead of being kept as cells.
+
+    Parameters
+    ----------
+    errors : List[ErrDat]
+        List of ErrDat objects
+    dest : str, path-like or binary file-like object
+        Destination where you want to save an error list
+    header : List[str], optional
+        Column headers (of the xlsx and csv formats)
+    format : {"xlsx", "csv", "json"}, default "xlsx"
+        Output format. The csv file is encoded in UTF-8 with BOM (for Excel)
+
+    """
+    if format not in ["xlsx", "csv", "json"]:
+        raise ValueError("Unsupported format: {}".format(format))
+
+    rows = sort_errors(errors)
+    if header and "サイトでの対応" not in header:
+        header = header + ["サイトでの対応"]
+
+    if format == "xlsx":
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("確認事項{}".format(datetime.now().strftime("%y%m%d")))
+        for style in report_styles():
+            wb.add_named_style(style)
+
+        def styled(value: str, style: str) -> WriteOnlyCell:
+            cell = WriteOnlyCell(ws, value)
+            cell.style = style
+            return cell
+
+        if header:
+            ws.append([styled(x, "report_header") for x in header])
+        for row in rows:
+            ws.append([styled(x, "report_body") for x in row])
+        wb.save(dest)
+        wb.close()
+        return
+
+    encoding = "utf-8-sig" if format == "csv" else "utf-8"
+    if isinstance(dest, (str, Path)):
+        f = open(dest, "w", encoding=encoding, newline="")
+    else:
+        f = io.TextIOWrapper(dest, encoding=encoding, newline="")
+    try:
+        if format == "csv":
+            writer = csv.writer(f)
+            if header:
+                writer.writerow(header)
+            writer.writerows(rows)
+        else:
+            keys = [x.name for x in fields(ErrDat)]
+            json.dump([dict(zip(keys, row)) for row in rows], f, ensure_ascii=False)
+    finally:
+        if isinstance(dest, (str, Path)):
+            f.close()
+        else:
+            f.flush()
+            f.detach()
 
 
 def save_errors_to_xlsx(
-    errors: List[ErrDat], dest_filepath: str, header: Optional[List[str]] = None
+    errors: List[ErrDat],
+    dest_filepath: Union[str, Path, IO[bytes]],
+    header: Optional[List[str]] = None,
 ):
     """
     Save the error list in a xlsx file.
@@ -1066,32 +1717,12 @@ def save_errors_to_xlsx(
     header : List[str], optional
         Column headers
 
-    """
-    errors_a = np.array([astuple(e) for e in errors])
-    errors_a = sort_array(errors_a)
+    See Also
+    --------
+    save_errors
 
-    wb = Workbook()
-    # ws = wb.create_sheet("確認事項{}".format(datetime.now().strftime("%y%m%d")))
-    ws = wb.active
-    ws.title = "確認事項{}".format(datetime.now().strftime("%y%m%d"))
-
-    start_row = 1
-    if header:
-        if "サイトでの対応" not in header:
-            header.append("サイトでの対応")
-        for j, value in enumerate(header):
-            ws.cell(start_row, 1 + j, value)
-            ws.cell(start_row, 1 + j).font = Font(name="Arial", bold=True)
-            ws.cell(start_row, 1 + j).fill = PatternFill("solid", fgColor="7e7e7e")
-        start_row += 1
-
-    for i, row in enumerate(errors_a):
-        for j, x in enumerate(row):
-            ws.cell(start_row + i, 1 + j, x)
-            ws.cell(start_row + i, 1 + j).font = Font(name="Arial")
-
-    wb.save(dest_filepath)
-    wb.close()
+    """
+    save_errors(errors, dest_filepath, header, format="xlsx")
 
 
 def check_data(
@@ -1102,6 +1733,12 @@ def check_data(
     path_trap: Optional[str] = None,
     path_ignore: Optional[str] = None,
     throughly: bool = False,
+    checks: Optional[List[str]] = None,
+    executor: Optional[Executor] = None,
+    timings: Optional[Dict[str, float]] = None,
+    skipped: Optional[Dict[str, str]] = None,
+    previous: Optional[Dict[str, Any]] = None,
+    manifest: Optional[Dict[str, Any]] = None,
 ):
     """
     Check errors in Moni-Sen data.
@@ -1119,9 +1756,25 @@ def check_data(
     path_trap : str
         Path to the file of a trap list
     path_ignore : str
-        Path to file of an ignore list for data checking
+        Path to file of an ignore list for data checking (see `IgnoreList`)
     throughly : bool, default False
         If True, all checking tasks are executed.
+    checks : List[str], optional
+        Names of the checks to be run (and their prerequisites). All checks are
+        run in default
+    executor : concurrent.futures.Executor, optional
+        Executor to run independent checks concurrently
+    timings : dict, optional
+        If given, elapsed time (in seconds) of each check is recorded
+    skipped : dict, optional
+        If given, the reasons of skipped checks are recorded
+    previous : dict, optional
+        Manifest of the previous version of the data. Only the changed rows and
+        new columns are checked, and the errors of the other rows are reused
+        (see `CheckDataCommon.run_checks`)
+    manifest : dict, optional
+        If given, the manifest of the data (with the errors before applying the
+        ignore list) is stored, to be used as `previous` for the next version
 
     """
     if not d and filepath:
@@ -1131,19 +1784,201 @@ def check_data(
 
     cd: Union[CheckDataTree, CheckDataLitter, CheckDataSeed]
     if d.data_type == "treeGBH":
-        cd = CheckDataTree(**vars(d), path_spdict=path_spdict, path_xy=path_xy)
+        cd = CheckDataTree(
+            **d.as_kwargs(), path_spdict=path_spdict, path_xy=path_xy
+        )
     elif d.data_type == "litter":
-        cd = CheckDataLitter(**vars(d), path_trap=path_trap)
+        cd = CheckDataLitter(**d.as_kwargs(), path_trap=path_trap)
     elif d.data_type == "seed":
-        cd = CheckDataSeed(**vars(d), path_spdict=path_spdict, path_trap=path_trap)
+        cd = CheckDataSeed(
+            **d.as_kwargs(), path_spdict=path_spdict, path_trap=path_trap
+        )
     else:
         raise TypeError("'data_type' does not defined")
 
-    errors = cd.check_all(throughly=throughly)
+    errors = cd.check_all(
+        throughly=throughly, executor=executor, checks=checks, previous=previous
+    )
+    if manifest is not None:
+        manifest.update(cd.manifest())
+    if timings is not None:
+        timings.update(cd.check_timings)
+    if skipped is not None:
+        skipped.update(cd.skipped_checks)
 
     if path_ignore and errors:
         # 無視リストにあるエラー項目を除外
-        ignore = [ErrDat(*i) for i in read_table(path_ignore)[:, :4]]
-        errors = [x for x in errors if x not in ignore]
+        errors = load_ignore_list(path_ignore).filter(errors)
 
     return errors
+
+
+def _check_file(
+    path: str,
+    dest: str,
+    format: str = "xlsx",
+    cache: Optional[ParseCache] = None,
+    **kwargs
+) -> Dict[str, Any]:
+    # バッチ処理の1ファイル分（ワーカープロセスで実行）
+    res: Dict[str, Any] = {"file": path, "report": None, "status": "failed"}
+    start = time.perf_counter()
+    try:
+        d = read_data(path, cache=cache)
+        timings: Dict[str, float] = {}
+        skipped: Dict[str, str] = {}
+        errors = check_data(d, timings=timings, skipped=skipped, **kwargs)
+        Path(dest).parent.mkdir(parents=True, exist_ok=True)
+        header = [x.name for x in fields(ErrDat)]
+        save_errors(errors, dest, header, format=format)
+    except Exception as e:
+        res["error"] = "{}: {}".format(type(e).__name__, e)
+    else:
+        res.update(
+            plot_id=d.plot_id,
+            data_type=d.data_type,
+            status="errors" if errors else "ok",
+            n_errors=len(errors),
+            report=dest,
+            timings=timings,
+            skipped=skipped,
+        )
+    res["elapsed"] = time.perf_counter() - start
+    return res
+
+
+def find_data_files(
+    paths: List[str], exclude: Optional[List[str]] = None
+) -> List[Path]:
+    """
+    Return data files (xlsx and csv) in directories or matching glob patterns.
+
+    Error reports of the batch check (`*_errors.xlsx`, `*_errors.csv`) and files
+    under the directories in `exclude` (e.g. the output directory of the reports)
+    are skipped.
+    """
+    excluded = [Path(x).resolve() for x in exclude or []]
+
+    def is_report(x: Path) -> bool:
+        parents = x.resolve().parents
+        return x.stem.endswith("_errors") or any(d in parents for d in excluded)
+
+    files: List[Path] = []
+    for p in paths:
+        if Path(p).is_dir():
+            found = [
+                x for x in Path(p).rglob("*") if x.suffix.lower() in [".xlsx", ".csv"]
+            ]
+        elif Path(p).is_file():
+            found = [Path(p)]
+        else:
+            found = [Path(x) for x in glob.glob(p, recursive=True)]
+        found = [x for x in found if not x.name.startswith("~$") and not is_report(x)]
+        files.extend(sorted(found))
+    return list(dict.fromkeys(x.resolve() for x in files))
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    """
+    Check data files in batch.
+
+    Exit status is 0 if no errors are found, 1 if errors are found in any file,
+    and 2 if any file could not be checked.
+    """
+    parser = argparse.ArgumentParser(
+        prog="python -m app.datacheck",
+        description="Check errors in Moni-Sen data files in batch.",
+        epilog="exit status: 0 no errors, 1 errors found, 2 files not checked",
+    )
+    parser.add_argument("paths", nargs="+", help="data files, directories or globs")
+    parser.add_argument(
+        "-o", "--outdir", default="datacheck_reports", help="output directory"
+    )
+    parser.add_argument(
+        "-f", "--format", default="xlsx", choices=["xlsx", "csv", "json"]
+    )
+    parser.add_argument(
+        "-j", "--jobs", type=int, default=os.cpu_count(), help="worker processes"
+    )
+    parser.add_argument("--throughly", action="store_true", help="run all checks")
+    parser.add_argument("--checks", nargs="+", help="names of the checks to run")
+    parser.add_argument("--ignore", dest="path_ignore", help="ignore list")
+    parser.add_argument("--spdict", dest="path_spdict", help="species dictionary")
+    parser.add_argument("--xy", dest="path_xy", help="xy coordinates of grids")
+    parser.add_argument("--trap", dest="path_trap", help="trap list")
+    parser.add_argument("--cache-dir", help="cache directory of parsed data files")
+    parser.add_argument(
+        "--cache-size", type=int, default=2**30, help="cache size limit in bytes"
+    )
+    args = parser.parse_args(argv)
+
+    files = find_data_files(args.paths, exclude=[args.outdir])
+    if not files:
+        parser.error("no data files found")
+    outdir = Path(args.outdir)
+    # 入力ファイルのディレクトリ構成をレポートの出力先に反映
+    root = Path(os.path.commonpath([x.parent for x in files]))
+    dests = [
+        outdir / x.parent.relative_to(root) / "{}_errors.{}".format(x.stem, args.format)
+        for x in files
+    ]
+    kwargs: Dict[str, Any] = dict(
+        throughly=args.throughly,
+        checks=args.checks,
+        path_ignore=args.path_ignore,
+        path_spdict=args.path_spdict,
+        path_xy=args.path_xy,
+        path_trap=args.path_trap,
+    )
+    if args.cache_dir:
+        kwargs["cache"] = ParseCache(args.cache_dir, args.cache_size)
+
+    start = time.perf_counter()
+    jobs = max(1, min(args.jobs or 1, len(files)))
+    if jobs == 1:
+        results = [
+            _check_file(str(x), str(y), args.format, **kwargs)
+            for x, y in zip(files, dests)
+        ]
+    else:
+        # 補助データ（種名辞書など）はワーカープロセスごとに一度だけ読み込まれる
+        with ProcessPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                pool.submit(_check_file, str(x), str(y), args.format, **kwargs)
+                for x, y in zip(files, dests)
+            ]
+            results = [f.result() for f in futures]
+    elapsed = time.perf_counter() - start
+
+    for r in results:
+        detail = r.get("error") or "{} errors".format(r["n_errors"])
+        msg = "{:7s} {:6.2f}s  {}  ({})"
+        print(msg.format(r["status"].upper(), r["elapsed"], r["file"], detail))
+
+    status = [r["status"] for r in results]
+    summary = {
+        "n_files": len(results),
+        "n_ok": status.count("ok"),
+        "n_with_errors": status.count("errors"),
+        "n_failed": status.count("failed"),
+        "n_errors": sum(r.get("n_errors", 0) for r in results),
+        "elapsed": elapsed,
+        "files": results,
+    }
+    outdir.mkdir(parents=True, exist_ok=True)
+    with open(outdir / "summary.json", "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    msg = "{n_files} files: {n_ok} ok, {n_with_errors} with errors, "
+    msg += "{n_failed} failed ({n_errors} errors, {elapsed:.1f} s)"
+    print(msg.format(**summary))
+
+    if summary["n_failed"]:
+        return 2
+    return 1 if summary["n_with_errors"] else 0
+
+
+if __name__ == "__main__":
+    # ワーカープロセスから参照できるよう、app.datacheckとして読み込んで実行
+    from app.datacheck import main as _main
+
+    sys.exit(_main())
@@ -14,6 +14,13 @@ class Settings:
     POSTGRES_PORT: str = os.getenv("POSTGRES_PORT", 5432)
     POSTGRES_DB: str = os.getenv("POSTGRES_DB")
     DATABASE_URL = f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_SERVER}:{POSTGRES_PORT}/{POSTGRES_DB}"
+    DATACHECK_WORKERS: int = int(os.getenv("DATACHECK_WORKERS", 4))
+    UPLOAD_MAX_MEMORY: int = int(os.getenv("UPLOAD_MAX_MEMORY", 64 * 2**20))
+    # 読み込み結果のキャッシュ（空の場合は使わない）
+    PARSE_CACHE_DIR: str = os.getenv("PARSE_CACHE_DIR", "")
+    PARSE_CACHE_MAX_SIZE: int = int(os.getenv("PARSE_CACHE_MAX_SIZE", 2**30))
+    # 毎木データの集計を幹のブロックごとに行う場合の行数（0の場合は一括）
+    TREE_SUMMARY_CHUNK_SIZE: int = int(os.getenv("TREE_SUMMARY_CHUNK_SIZE", 0))
 
 
 settings = Settings()
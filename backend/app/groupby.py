@@ -0,0 +1,239 @@
+from typing import List, Sequence, Tuple, Union
+
+import numpy as np
+
+
+def factorize(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Encode values as integer codes.
+
+    Returns a tuple of the integer codes (indices of the unique values) and the
+    sorted unique values.
+    """
+    uniq, codes = np.unique(np.asarray(x), return_inverse=True)
+    return codes.reshape(-1), uniq
+
+
+class GroupBy(object):
+    """
+    Grouped reductions over the rows of one- or two-dimensional arrays.
+
+    The group ids are factorized and sorted only once when the object is created,
+    so that several reductions (sum, mean, median etc.) can be applied to the same
+    grouping without repeating the work. All columns of a two-dimensional input
+    are reduced together.
+
+    Parameters
+    ----------
+    group_id : numpy ndarray
+        One-dimensional array of group ids (labels) for each row
+
+    Attributes
+    ----------
+    groups : numpy ndarray
+        Sorted unique group ids
+    codes : numpy ndarray
+        Integer group code (index of `groups`) of each row
+    sizes : numpy ndarray
+        Number of rows in each group
+    offsets : numpy ndarray
+        Start position of each group in the sorted order of rows
+
+    """
+
+    def __init__(self, group_id: np.ndarray):
+        group_id = np.asarray(group_id)
+        if group_id.ndim != 1:
+            raise ValueError("group_id should be a one-dimensional array")
+        self.codes, self.groups = factorize(group_id)
+        self.order = np.argsort(self.codes, kind="stable")
+        self.sizes = np.bincount(self.codes, minlength=len(self.groups))
+        self.offsets = np.concatenate(([0], np.cumsum(self.sizes)[:-1])).astype(int)
+
+    def __len__(self):
+        return len(self.groups)
+
+    def __repr__(self):
+        return "{}(ngroups={})".format(self.__class__.__name__, len(self))
+
+    def indices(self) -> List[np.ndarray]:
+        """Return the row indices of each group."""
+        return np.split(self.order, self.offsets[1:])
+
+    def first(self, x: np.ndarray) -> np.ndarray:
+        """Return the first value (in the original row order) of each group."""
+        return np.asarray(x)[self.order[self.offsets]]
+
+    def last(self, x: np.ndarray) -> np.ndarray:
+        """Return the last value (in the original row order) of each group."""
+        return np.asarray(x)[self.order[self.offsets + self.sizes - 1]]
+
+    def _sorted(self, x: np.ndarray) -> np.ndarray:
+        x = np.asarray(x, dtype="float64")
+        if x.shape[0] != len(self.codes):
+            raise ValueError("lengths of the x and group_id should be the same")
+        if x.ndim not in [1, 2]:
+            raise ValueError("x should be a one- or two-dimensional array")
+        return x[self.order]
+
+    def _reduceat(self, ufunc: np.ufunc, x: np.ndarray) -> np.ndarray:
+        if len(self) == 0:
+            return np.empty((0,) + x.shape[1:], dtype=x.dtype)
+        return ufunc.reduceat(x, self.offsets, axis=0)
+
+    def count(self, x: np.ndarray) -> np.ndarray:
+        """Count non-nan values in each group."""
+        xs = self._sorted(x)
+        return self._reduceat(np.add, (~np.isnan(xs)).astype(int))
+
+    def sum(self, x: np.ndarray, skipna: bool = True) -> np.ndarray:
+        """
+        Sum of values in each group.
+
+        If `skipna` is True, nan values are ignored and the sum of a group with no
+        valid values is nan.
+        """
+        xs = self._sorted(x)
+        if not skipna:
+            return self._reduceat(np.add, xs)
+        na = np.isnan(xs)
+        res = self._reduceat(np.add, np.where(na, 0.0, xs))
+        res[self._reduceat(np.add, (~na).astype(int)) == 0] = np.nan
+        return res
+
+    def mean(self, x: np.ndarray, skipna: bool = True) -> np.ndarray:
+        """Mean of values in each group."""
+        xs = self._sorted(x)
+        if not skipna:
+            n = self.sizes if xs.ndim == 1 else self.sizes[:, None]
+            return self._reduceat(np.add, xs) / n
+        na = np.isnan(xs)
+        n = self._reduceat(np.add, (~na).astype(int))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            return self._reduceat(np.add, np.where(na, 0.0, xs)) / n
+
+    def min(self, x: np.ndarray, skipna: bool = True) -> np.ndarray:
+        """Minimum value in each group."""
+        return self._reduceat(np.fmin if skipna else np.minimum, self._sorted(x))
+
+    def max(self, x: np.ndarray, skipna: bool = True) -> np.ndarray:
+        """Maximum value in each group."""
+        return self._reduceat(np.fmax if skipna else np.maximum, self._sorted(x))
+
+    def _sort_within(self, x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # sort values within each group (nan last) by two stable sorts, and count
+        # non-nan values in each group
+        x2 = self._sorted(x)
+        x2 = x2 if x2.ndim == 2 else x2[:, None]
+        by_value = np.argsort(x2, axis=0, kind="stable")
+        by_group = np.argsort(self.codes[self.order][by_value], axis=0, kind="stable")
+        x2 = np.take_along_axis(x2, np.take_along_axis(by_value, by_group, 0), 0)
+        return x2, self._reduceat(np.add, (~np.isnan(x2)).astype(int))
+
+    def median(self, x: np.ndarray, skipna: bool = True) -> np.ndarray:
+        """Median of values in each group."""
+        x = np.asarray(x, dtype="float64")
+        if len(self) == 0:
+            return np.empty((0,) + x.shape[1:])
+
+        x2, n = self._sort_within(x)
+        offsets = self.offsets[:, None]
+        lo = np.take_along_axis(x2, offsets + np.maximum(n - 1, 0) // 2, 0)
+        hi = np.take_along_axis(x2, offsets + n // 2, 0)
+        res = (lo + hi) / 2
+        res[n == 0] = np.nan
+        if not skipna:
+            res[n < self.sizes[:, None]] = np.nan
+
+        return res if x.ndim == 2 else res[:, 0]
+
+    def quantile(
+        self, x: np.ndarray, q: Union[float, Sequence[float]]
+    ) -> np.ndarray:
+        """
+        Quantile(s) of values in each group ignoring nan.
+
+        Values are linearly interpolated as in `numpy.percentile` (`q` between 0
+        and 1), and nan for groups without valid values. If `q` is a sequence, the
+        quantiles are stacked along the first axis of the result.
+        """
+        x = np.asarray(x, dtype="float64")
+        if len(self) == 0:
+            return np.empty(np.shape(q) + (0,) + x.shape[1:])
+
+        x2, n = self._sort_within(x)
+        last = np.maximum(n - 1, 0)
+        res = []
+        for q_ in np.atleast_1d(q):
+            pos = last * q_
+            lo = np.floor(pos).astype(int)
+            hi = np.minimum(lo + 1, last)
+            a = np.take_along_axis(x2, self.offsets[:, None] + lo, 0)
+            b = np.take_along_axis(x2, self.offsets[:, None] + hi, 0)
+            t = pos - lo
+            diff = b - a
+            r = np.where(t >= 0.5, b - diff * (1 - t), a + diff * t)
+            r[n == 0] = np.nan
+            res.append(r if x.ndim == 2 else r[:, 0])
+
+        return np.array(res) if np.ndim(q) else res[0]
+
+
+def group_reduce(
+    x: np.ndarray, group_id: np.ndarray, how: str = "sum", remove_nan: bool = True
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Reduce values by group.
+
+    Parameters
+    ----------
+    x : numpy ndarray
+        One- or two-dimensional array. Rows are grouped by `group_id`
+    group_id : numpy ndarray
+        One-dimensional array of group ids with the same length as `x`
+    how : str, default "sum"
+        Reduction: 'sum', 'mean', 'median', 'count', 'min' or 'max'
+    remove_nan : bool, default True
+        If ignore nan values
+
+    Returns
+    -------
+    Tuple of the reduced values and the unique group ids
+
+    """
+    x = np.asarray(x)
+    if len(x) != len(group_id):
+        raise ValueError("lengths of the x and group_id should be the same")
+    g = GroupBy(group_id)
+    if how == "count":
+        return g.count(x), g.groups
+    elif how in ["sum", "mean", "median", "min", "max"]:
+        return getattr(g, how)(x, skipna=remove_nan), g.groups
+    else:
+        msg = "Available values for how are 'sum', 'mean', 'median', 'count', "
+        msg += "'min', 'max'"
+        raise ValueError(msg)
+
+
+def group_sum(x: np.ndarray, group_id: np.ndarray, remove_nan: bool = True):
+    return group_reduce(x, group_id, "sum", remove_nan)
+
+
+def group_mean(x: np.ndarray, group_id: np.ndarray, remove_nan: bool = True):
+    return group_reduce(x, group_id, "mean", remove_nan)
+
+
+def group_median(x: np.ndarray, group_id: np.ndarray, remove_nan: bool = True):
+    return group_reduce(x, group_id, "median", remove_nan)
+
+
+def group_count(x: np.ndarray, group_id: np.ndarray):
+    return group_reduce(x, group_id, "count")
+
+
+def group_min(x: np.ndarray, group_id: np.ndarray, remove_nan: bool = True):
+    return group_reduce(x, group_id, "min", remove_nan)
+
+
+def group_max(x: np.ndarray, group_id: np.ndarray, remove_nan: bool = True):
+    return group_reduce(x, group_id, "max", remove_nan)
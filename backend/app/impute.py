@@ -0,0 +1,216 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from app.groupby import GroupBy, factorize
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+
+class ImputerCache(object):
+    """
+    LRU cache of imputed arrays.
+
+    Entries are keyed by the hash of the input data and the imputer parameters, so
+    that re-ingestion of the same data reuses the output of the imputer. Only the
+    imputed arrays are kept (not the fitted imputers with their estimators). The
+    cache is shared by threads and guarded by a lock.
+
+    Parameters
+    ----------
+    maxsize : int, default 128
+        Maximum number of cached arrays
+
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._cache: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._cache)
+
+    def get(self, key: str) -> Optional[np.ndarray]:
+        with self._lock:
+            value = self._cache.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._cache.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: np.ndarray):
+        with self._lock:
+            self._cache[key] = value
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.maxsize:
+                self._cache.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._cache.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+imputer_cache = ImputerCache()
+
+
+def data_hash(X: np.ndarray, **params) -> str:
+    """Return the md5 hash of an array and parameters."""
+    X = np.ascontiguousarray(X, dtype="float64")
+    h = hashlib.md5(X.tobytes())
+    h.update(str(X.shape).encode())
+    h.update(repr(sorted(params.items())).encode())
+    return h.hexdigest()
+
+
+def iterative_impute(
+    X: np.ndarray, max_iter: int = 10, random_state: int = 0, use_cache: bool = True
+) -> np.ndarray:
+    """
+    Impute missing values with IterativeImputer.
+
+    Parameters
+    ----------
+    X : numpy ndarray
+        Two-dimensional array with missing values as nan
+    max_iter : int, default 10
+        Maximum number of imputation rounds
+    random_state : int, default 0
+        Seed of the pseudo random number generator
+    use_cache : bool, default True
+        If reuse the imputed array of the same data
+
+    See Also
+    --------
+    sklearn.impute.IterativeImputer
+
+    """
+    key = data_hash(X, max_iter=max_iter, random_state=random_state)
+    if use_cache:
+        cached = imputer_cache.get(key)
+        if cached is not None:
+            return cached.copy()
+
+    # scikit-learn is slow to import; load it only when an imputer is needed
+    from sklearn.experimental import enable_iterative_imputer  # noqa: F401
+    from sklearn.impute import IterativeImputer
+
+    imputer = IterativeImputer(max_iter=max_iter, random_state=random_state)
+    X_impute = imputer.fit_transform(X)
+    if use_cache:
+        imputer_cache.set(key, X_impute.copy())
+    return X_impute
+
+
+def one_hot(*cols: np.ndarray) -> np.ndarray:
+    """Return dummy variables of categorical columns (sorted categories)."""
+    return np.hstack([np.eye(len(cat))[codes] for codes, cat in map(factorize, cols)])
+
+
+def impute_seed_meas(
+    number: np.ndarray,
+    wdry: np.ndarray,
+    form: np.ndarray,
+    status: np.ndarray,
+    species: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Impute missing seed numbers and dry weights.
+
+    Status and form (and species, if given) are used as dummy variables.
+    """
+    if species is None:
+        dummies = one_hot(status, form)
+    else:
+        dummies = one_hot(status, form, species)
+    X_impute = iterative_impute(np.c_[number, wdry, dummies])
+    return X_impute[:, 0], X_impute[:, 1]
+
+
+def impute_seed_by_species(
+    number: np.ndarray,
+    wdry: np.ndarray,
+    form: np.ndarray,
+    status: np.ndarray,
+    sp_list: np.ndarray,
+    mask: Optional[np.ndarray] = None,
+    batch_max_rows: int = 0,
+    timings: Optional[Dict[str, float]] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Impute missing seed numbers and dry weights for each species.
+
+    Species are imputed only if both measurements have valid values and at least
+    one record lacks both; the other species are skipped before any imputer is
+    built.
+
+    Parameters
+    ----------
+    number : numpy ndarray
+        Number of seeds
+    wdry : numpy ndarray
+        Dry weight of seeds
+    form : numpy ndarray
+        Form of seeds
+    status : numpy ndarray
+        Status of seeds
+    sp_list : numpy ndarray
+        Species names
+    mask : numpy ndarray, optional
+        Boolean array of the records to be used
+    batch_max_rows : int, default 0
+        Species with fewer records than this are imputed together in one design
+        matrix with species dummy variables. Pooling assumes the same relationship
+        between number and weight across species, so it is disabled by default
+    timings : dict, optional
+        If given, elapsed time (in seconds) of imputation is recorded by species
+
+    """
+    number = number.copy()
+    wdry = wdry.copy()
+    rows = np.arange(len(sp_list)) if mask is None else np.where(mask)[0]
+    if len(rows) == 0:
+        return number, wdry
+
+    g = GroupBy(sp_list[rows])
+    n_valid, w_valid = g.count(np.c_[number[rows], wdry[rows]]).T
+    both_na = g.sum(np.isnan(number[rows]) & np.isnan(wdry[rows]))
+    target = (n_valid > 0) & (w_valid > 0) & (both_na > 0)
+    pooled = target & (g.sizes < batch_max_rows)
+    indices = g.indices()
+
+    for k in np.where(target & ~pooled)[0]:
+        r = rows[indices[k]]
+        start = time.perf_counter()
+        number[r], wdry[r] = impute_seed_meas(number[r], wdry[r], form[r], status[r])
+        elapsed = time.perf_counter() - start
+        msg = "Imputed {} ({} records): {:.3f} s"
+        logger.debug(msg.format(g.groups[k], len(r), elapsed))
+        if timings is not None:
+            timings[str(g.groups[k])] = elapsed
+
+    if pooled.any():
+        r = rows[np.concatenate([indices[k] for k in np.where(pooled)[0]])]
+        start = time.perf_counter()
+        number[r], wdry[r] = impute_seed_meas(
+            number[r], wdry[r], form[r], status[r], sp_list[r]
+        )
+        elapsed = time.perf_counter() - start
+        msg = "Imputed {} species together ({} records): {:.3f} s"
+        logger.debug(msg.format(pooled.sum(), len(r), elapsed))
+        if timings is not None:
+            for sp in g.groups[pooled]:
+                timings[str(sp)] = elapsed
+
+    return number, wdry
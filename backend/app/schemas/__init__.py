@@ -1,3 +1,4 @@
+from app.schemas.datacheck import *
 from app.schemas.datafiles import *
 from app.schemas.tree_com_summary import *
 from app.schemas.tree_com_turnover import *
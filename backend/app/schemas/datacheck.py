@@ -0,0 +1,21 @@
+from typing import Dict, List
+
+from pydantic import BaseModel
+
+
+class ErrDat(BaseModel):
+    plot_id: str
+    rec_id1: str
+    rec_id2: str
+    err_type: str
+
+
+class DataCheckResult(BaseModel):
+    plot_id: str
+    dtype: str
+    filename: str
+    n_errors: int
+    errors: List[ErrDat]
+    timings: Dict[str, float]
+    skipped: Dict[str, str]
+    elapsed: float
@@ -1,27 +1,21 @@
-import json
 import re
-from datetime import datetime
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta
 from operator import is_
-from pathlib import Path
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, Iterator, List, Optional, Tuple, Union
 
 import numpy as np
-from scipy import interpolate, optimize, special
-from sklearn.experimental import enable_iterative_imputer
-from sklearn.impute import IterativeImputer
-from sklearn.preprocessing import OneHotEncoder
 
+from app import suppl
 from app.allometry import biomass
 from app.base import MonitoringData, read_data
-from app.datacheck import (as_datetime, find_pattern, isvalid, retrive_year,
-                           return_growth_year)
+from app.datacheck import (as_datetime, find_pattern, isvalid, map_unique,
+                           retrive_year, return_growth_year)
+from app.groupby import GroupBy, factorize, group_mean
+from app.impute import impute_seed_by_species, impute_seed_meas, iterative_impute
 from app.utils import add_extra_columns_tree
 
-fd = Path(__file__).resolve().parents[0]
-path_spdict = fd.joinpath("suppl_data", "species_dict.json")
-with open(path_spdict, "rb") as f:
-    dict_sp = json.load(f)
-
 
 def mask_invalid(arr: np.ndarray, pat_except: str = "^NA$|^na$|^nd|^-$"):
     """Mask invalid values."""
@@ -48,6 +42,8 @@ def fill_na_date_with_mean(x: np.ndarray, na_val: Any = None):
 
 def binomln(n, k):
     """Calculate the natural logarithm of a binomial coefficient."""
+    from scipy import special
+
     return -special.betaln(1 + n - k, 1 + k) - np.log(n + 1)
 
 
@@ -59,6 +55,48 @@ def period_mean(x1: float, x2: float):
         return (x2 - x1) / np.log(x2 / x1)
 
 
+def split_by_year(
+    t1: np.ndarray, t2: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Split collection periods at calendar year boundaries.
+
+    A collection period from `t1` to `t2` is divided into pieces that fall within
+    a single calendar year, so that values can be apportioned to each year by the
+    number of days in the piece. The pieces are returned in the order of the input
+    periods.
+
+    Parameters
+    ----------
+    t1 : numpy ndarray
+        1d array of installation dates (numpy.datetime64)
+    t2 : numpy ndarray
+        1d array of collection dates (numpy.datetime64)
+
+    Returns
+    -------
+    Tuple of the row index of the original period, year, start and end dates of
+    the pieces. The number of days in a piece is (end - start).
+
+    """
+    t1 = np.asarray(t1).astype("datetime64[D]")
+    t2 = np.asarray(t2).astype("datetime64[D]")
+
+    y1 = t1.astype("datetime64[Y]").astype(int)
+    y2 = t2.astype("datetime64[Y]").astype(int)
+    n = np.maximum(y2 - y1 + 1, 1)
+    row = np.repeat(np.arange(len(t1)), n)
+    year = y1[row] + np.arange(len(row)) - np.repeat(np.cumsum(n) - n, n)
+
+    # 年をまたぐ場合は前年/当年の12月31日で区切る
+    last_day_prev = year.astype("datetime64[Y]").astype("datetime64[D]") - 1
+    last_day = (year + 1).astype("datetime64[Y]").astype("datetime64[D]") - 1
+    start = np.maximum(t1[row], last_day_prev)
+    end = np.minimum(t2[row], last_day)
+
+    return row, year + 1970, start, end
+
+
 def interpolate_gbh(
     gbh: np.ndarray, date: np.ndarray, err: np.ndarray, **kwargs
 ) -> np.ndarray:
@@ -78,6 +116,8 @@ def interpolate_gbh(
     scipy.interpolate.interp1d Interpolate a 1-D function.
 
     """
+    from scipy import interpolate
+
     gbh_interp = gbh.copy().astype("float64")
     if sum(err > 0) == 0:
         return gbh_interp
@@ -102,9 +142,25 @@ def interpolate_gbh(
     return gbh_interp
 
 
-def get_gbh(d, interpolate=True, spring_census=False):
+def get_gbh(d, interpolate=True, spring_census=False, census=None):
+    """
+    Return the GBH and survey date matrices of a tree data.
+
+    Parameters
+    ----------
+    d : MonitoringData
+        Tree data
+    interpolate : bool, default True
+        If interpolate missing or errornous GBH values (see `interpolate_gbh`)
+    spring_census : bool, default False
+        If the censuses are conducted in spring
+    census : TreeCensus, optional
+        Census statistics over all stems, given when `d` is a block of rows of a
+        larger data (see `TreeCensus`). Computed from `d` if not given
+
+    """
     if d.select(regex="^error[0-9]{2}$").shape[1] == 0:
-        d = add_extra_columns_tree(d)
+        d = add_extra_columns_tree(d, None if census is None else census.gbh_na_col)
 
     gbh_mat, gbh_cn = d.select(regex="^gbh[0-9]{2}$", return_column_names=True)
     # gbh_mat = gbh_mat.astype("float64")
@@ -113,7 +169,10 @@ def get_gbh(d, interpolate=True, spring_census=False):
     gbh_mat = gbh_mat[:, yrs_order]
     gbh_cn = gbh_cn[yrs_order]
     gbh_mat = np.vectorize(lambda x: isvalid(x, return_value=True))(gbh_mat)
-    na_col = np.isnan(gbh_mat).all(axis=0)
+    if census is None:
+        na_col = np.isnan(gbh_mat).all(axis=0)
+    else:
+        na_col = census.na_col
     gbh_mat = gbh_mat[:, ~na_col]
     gbh_cn = gbh_cn[~na_col]
     # err_mat = d.select(regex="^error[0-9]{2}$").astype("int")
@@ -136,54 +195,70 @@ def get_gbh(d, interpolate=True, spring_census=False):
         date_mat = date_mat[:, None]
 
     null_date = np.where(np.vectorize(is_)(date_mat, None), True, False)
+    if census is None:
+        null_date_col = np.all(null_date, axis=0)
+    else:
+        null_date_col = census.null_date_col
 
-    if np.all(null_date, axis=0).sum() > 0:
+    if null_date_col.sum() > 0:
         # 調査日が全て不明の列がある場合は、その年の10月1日に調査したことにする
         # 春調査のサイトで調査日が欠損している場合は5月1日にする
-        null_date_col = np.all(null_date, axis=0)
-        years = [retrive_year(i) for i in gbh_cn]
-        if spring_census:
-            date_arr = [datetime.strptime("{}0501".format(i), "%Y%m%d") for i in years]
-        else:
-            date_arr = [datetime.strptime("{}1001".format(i), "%Y%m%d") for i in years]
+        date_arr = default_dates(gbh_cn, spring_census)
         for j in np.where(null_date_col)[0]:
             date_mat[:, j] = date_arr[j]
 
     # GBHデータの欠損/エラー値の内挿・外挿
     if gbh_mat.shape[1] > 1 and interpolate:
         # 調査日の空白は同じ列の平均にする
-        date_mat_ = np.apply_along_axis(
-            lambda x: fill_na_date_with_mean(x, None), 0, date_mat
-        )
+        if census is None:
+            date_mat_ = np.apply_along_axis(
+                lambda x: fill_na_date_with_mean(x, None), 0, date_mat
+            )
+        else:
+            null_date = np.where(np.vectorize(is_)(date_mat, None), True, False)
+            date_mat_ = np.where(null_date, census.date_mean, date_mat)
         for i, (gbh, date, err) in enumerate(zip(gbh_mat, date_mat_, err_mat)):
             gbh_mat[i] = interpolate_gbh(gbh, date, err)
 
     return gbh_mat, date_mat
 
 
-def est_agb(dbh_mat, sp_list):
+def default_dates(gbh_cn: np.ndarray, spring_census: bool = False) -> List[datetime]:
+    """Return the survey dates used for censuses without any survey date."""
+    years = [retrive_year(i) for i in gbh_cn]
+    if spring_census:
+        return [datetime.strptime("{}0501".format(i), "%Y%m%d") for i in years]
+    else:
+        return [datetime.strptime("{}1001".format(i), "%Y%m%d") for i in years]
+
+
+def functional_types(sp_list: np.ndarray) -> List[str]:
+    """Return the functional types (生活形) of species ("NA" if unknown)."""
+    ft_categ = {1: "EG", 4: "DA", 5: "EA"}
+    ft_code = suppl.species_dict().lookup("ft_code", sp_list)
+    return [ft_categ.get(i, "NA") for i in ft_code.tolist()]
+
+
+def est_agb(dbh_mat, sp_list, ft_na=None):
     """
     Estimate above ground biomass using the allometric equation in Ishihara et al. 2015.
+
+    The functional type of unknown species is `ft_na`, or the most frequent one in
+    `sp_list` if not given.
     """
-    # wood density
-    wd_list = [
-        dict_sp[sp]["wood_density"]
-        if sp in dict_sp and dict_sp[sp]["wood_density"]
-        else None
-        for sp in sp_list
-    ]
+    spd = suppl.species_dict()
+    codes = spd.codes(sp_list)
+
+    # wood density (nan if unknown)
+    wd_list = spd.wood_density[codes]
 
     # functional type (生活形)
     # NOTE: 樹種不明の場合は最も頻度の高い生活形にする
-    ft_categ = {1: "EG", 4: "DA", 5: "EA"}
-    ft_list = [
-        ft_categ[dict_sp[sp]["categ2"]]
-        if sp in dict_sp and dict_sp[sp]["categ2"]
-        else "NA"
-        for sp in sp_list
-    ]
-    ft_u, ft_c = np.unique([i for i in ft_list], return_counts=True)
-    ft_list = [ft_u[np.argmax(ft_c)] if i == "NA" else i for i in ft_list]
+    ft_list = functional_types(sp_list)
+    if ft_na is None:
+        ft_u, ft_c = np.unique([i for i in ft_list], return_counts=True)
+        ft_na = ft_u[np.argmax(ft_c)]
+    ft_list = [ft_na if i == "NA" else i for i in ft_list]
 
     w_mat = np.array(
         [
@@ -222,9 +297,7 @@ def sp_sum(
     sp_b = np.apply_along_axis(lambda x: np.bincount(sp_labs, weights=x), 0, w_mat)
 
     if remove_sp_unknown:
-        sp_unknown = np.array(
-            [False if i in dict_sp and dict_sp[i]["species"] else True for i in sp_list]
-        )
+        sp_unknown = suppl.species_dict().lookup("species", sp_list) == ""
         sp_n = sp_n[np.unique(sp_labs[~sp_unknown]), :]
         sp_ba = sp_ba[np.unique(sp_labs[~sp_unknown]), :]
         sp_b = sp_b[np.unique(sp_labs[~sp_unknown]), :]
@@ -266,139 +339,382 @@ def rarefaction(n, sample):
     return np.apply_along_axis(f, 0, n_, sample=sample)
 
 
-def turnover_rates(
+def turnover_rate(
+    y: np.ndarray, z: np.ndarray, t: Union[np.ndarray, float], equal: bool = False
+) -> float:
+    """
+    Solve sum(y * exp(-x * t)) = sum(z) for the turnover rate x.
+
+    0 if `equal` (y and z are the same for all stems).
+    """
+    from scipy import optimize
+
+    if equal:
+        return 0.0
+
+    def f(x):
+        return np.sum(y * np.exp(-x * t) - z)
+
+    def fprime(x):
+        return np.sum(-t * y * np.exp(-x * t))
+
+    sol = optimize.root_scalar(f, x0=0.01, fprime=fprime, method="newton")
+    return sol.root
+
+
+def turnover_terms(
     dbh1: np.ndarray,
     dbh2: np.ndarray,
     w1: np.ndarray,
     w2: np.ndarray,
-    t: Union[np.ndarray, float],
-    plot_area: Optional[float] = None,
     dbh_min: float = 5.0,
-):
-    dbh1[np.isnan(dbh1)] = 0.0
-    dbh2[np.isnan(dbh2)] = 0.0
-    w1[np.isnan(w1)] = 0.0
-    w2[np.isnan(w2)] = 0.0
-
-    def _turnover(y: np.ndarray, z: np.ndarray, t: Union[np.ndarray, float]):
-        if np.array_equal(y, z):
-            return 0.0
-
-        def f(x):
-            return np.sum(y * np.exp(-x * t) - z)
-
-        def fprime(x):
-            return np.sum(-t * y * np.exp(-x * t))
+) -> np.ndarray:
+    """
+    Return the terms of the turnover rates of each stem.
 
-        sol = optimize.root_scalar(f, x0=0.01, fprime=fprime, method="newton")
-        return sol.root
+    The columns are the indicators of survivors, dead and recruits (si, di, ri),
+    si * w1, si * w2, di * w1, ri * w2, w1, w2, and the indicators of w2 != si * w1
+    and w1 != si * w1. The sums of the terms over stems with the same census
+    interval are enough to calculate the turnover rates (see
+    `turnover_rates_from_sums`), so that they can be summed up by blocks of stems.
+    """
+    dbh1 = np.where(np.isnan(dbh1), 0.0, dbh1)
+    dbh2 = np.where(np.isnan(dbh2), 0.0, dbh2)
+    w1 = np.where(np.isnan(w1), 0.0, w1)
+    w2 = np.where(np.isnan(w2), 0.0, w2)
 
     si = np.logical_and(dbh1 >= dbh_min, dbh2 >= dbh_min).astype("float64")
     di = np.logical_and(dbh1 >= dbh_min, dbh2 < dbh_min).astype("float64")
     ri = np.logical_and(dbh1 < dbh_min, dbh2 >= dbh_min).astype("float64")
+    return np.column_stack(
+        (si, di, ri, si * w1, si * w2, di * w1, ri * w2, w1, w2)
+        + ((w2 != si * w1).astype("float64"), (w1 != si * w1).astype("float64"))
+    )
+
+
+def turnover_rates_from_sums(
+    terms: np.ndarray, t: np.ndarray, plot_area: Optional[float] = None
+):
+    """
+    Calculate turnover rates from the sums of `turnover_terms`.
 
-    n_s0 = np.nansum(si)
-    n_0 = n_s0 + np.nansum(di)
-    n_t = n_s0 + np.nansum(ri)
-    bs_0 = np.nansum(si * w1)
-    bs_t = np.nansum(si * w2)
-    b_0 = bs_0 + np.nansum(di * w1)
-    b_t = bs_t + np.nansum(ri * w2)
+    Parameters
+    ----------
+    terms : numpy ndarray
+        Sums of the terms of stems for each census interval (rows)
+    t : numpy ndarray
+        Census intervals
+    plot_area : float, optional
+        Plot area in ha
+
+    """
+    si, di, ri, si_w1, si_w2, di_w1, ri_w2, w1, w2, ne_p, ne_l = terms.T
+
+    n_s0 = np.sum(si)
+    n_0 = n_s0 + np.sum(di)
+    n_t = n_s0 + np.sum(ri)
+    bs_0 = np.sum(si_w1)
+    bs_t = np.sum(si_w2)
+    b_0 = bs_0 + np.sum(di_w1)
+    b_t = bs_t + np.sum(ri_w2)
     n_m = period_mean(n_0, n_t)
     b_m = period_mean(b_0, b_t)
     if plot_area:
         n_m = n_m / plot_area
         b_m = b_m / plot_area
 
-    r_rel = _turnover(si + ri, si, t)
-    m_rel = _turnover(si + di, si, t)
-    p_rel = _turnover(w2, si * w1, t)
-    l_rel = _turnover(w1, si * w1, t)
+    r_rel = turnover_rate(si + ri, si, t, equal=np.sum(ri) == 0)
+    m_rel = turnover_rate(si + di, si, t, equal=np.sum(di) == 0)
+    p_rel = turnover_rate(w2, si_w1, t, equal=np.sum(ne_p) == 0)
+    l_rel = turnover_rate(w1, si_w1, t, equal=np.sum(ne_l) == 0)
 
     return n_m, b_m, r_rel, m_rel, p_rel, l_rel
 
 
-def group_median(x: np.ndarray, group_id: np.ndarray):
-    unq = np.unique(group_id)
+def _sum_by(codes: np.ndarray, n: int, x: np.ndarray) -> np.ndarray:
+    # 2次元配列の各列をグループごとに合計
+    return np.stack(
+        [np.bincount(codes, weights=i, minlength=n) for i in x.T], axis=1
+    ).reshape(n, x.shape[1])
 
-    if x.shape[0] != len(group_id):
-        raise ValueError("lengths of the x and group_id should be the same")
 
-    def f(x_):
-        return np.array([np.nanmdeian(x_[group_id == i]) for i in unq])
+def sum_by_interval(terms: np.ndarray, t: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Sum the terms of stems by census intervals (see `turnover_terms`)."""
+    t_codes, t_uniq = factorize(t)
+    return _sum_by(t_codes, len(t_uniq), terms), t_uniq
 
-    if len(x.shape) == 1:
-        return f(x), unq
-    elif len(x.shape) == 2:
-        return np.apply_along_axis(f, 0, x), unq
-    else:
-        raise ValueError("x should be a one- or two-dimensional array")
+
+def turnover_rates(
+    dbh1: np.ndarray,
+    dbh2: np.ndarray,
+    w1: np.ndarray,
+    w2: np.ndarray,
+    t: Union[np.ndarray, float],
+    plot_area: Optional[float] = None,
+    dbh_min: float = 5.0,
+):
+    terms = turnover_terms(dbh1, dbh2, w1, w2, dbh_min)
+    t = np.broadcast_to(np.asarray(t, dtype="float64"), terms.shape[:1])
+    return turnover_rates_from_sums(*sum_by_interval(terms, t), plot_area=plot_area)
 
 
-def group_sum(x: np.ndarray, group_id: np.ndarray, remove_nan: bool = True):
-    x = np.array(x)
-    if len(x) != len(group_id):
-        raise ValueError("lengths of the x and group_id should be the same")
-    unq, idx, cnt = np.unique(group_id, return_inverse=True, return_counts=True)
+@dataclass
+class TreeCensus(object):
+    """
+    Statistics of the censuses (columns) of a tree data over all stems.
+
+    Some steps of the preprocessing of tree data depend on all stems, such as the
+    removal of censuses without valid GBH and the mean survey dates used for
+    missing ones. These are computed once over all stems, so that the stems can be
+    processed block by block in the same way as the whole data (see `get_gbh` and
+    `TreeSummary`).
+
+    Attributes
+    ----------
+    gbh_na_col : numpy ndarray or None
+        Boolean array of the gbh columns (in the order of years) without valid
+        values, removed by `add_extra_columns_tree` (None if the data already has
+        the error columns)
+    na_col : numpy ndarray
+        Boolean array of the gbh columns without valid values in `get_gbh`
+    null_date_col : numpy ndarray
+        Boolean array of the censuses without any survey date
+    date_mean : numpy ndarray
+        Mean survey date (datetime) of each census
+    gyear_mean : numpy ndarray
+        Mean growth year of each census, used for stems without survey date
+    empty_col : numpy ndarray
+        Boolean array of the censuses without GBH after interpolation
+    ft_na : str
+        Functional type of unknown species (see `est_agb`)
 
-    def f(x):
-        if remove_nan:
-            na = np.isnan(x)
-            idx_unq = np.unique(idx)
-            idx_unq_, idx_ = np.unique(idx[~na], return_inverse=True)
-            res = np.repeat(np.nan, len(idx_unq))
-            z = np.bincount(idx_, weights=x[~na])
-            for i, j in zip(idx_unq_, z):
-                res[i] = j
-            return res
-        else:
-            return np.bincount(idx, weights=x)
+    """
 
-    if len(x.shape) == 1:
-        return f(x), unq
-    elif len(x.shape) == 2:
-        return np.apply_along_axis(f, 0, x), unq
-    else:
-        raise ValueError("x should be a one- or two-dimensional array")
+    gbh_na_col: Optional[np.ndarray]
+    na_col: np.ndarray
+    null_date_col: np.ndarray
+    date_mean: np.ndarray
+    gyear_mean: np.ndarray
+    empty_col: np.ndarray
+    ft_na: str
 
 
-def group_mean(x: np.ndarray, group_id: np.ndarray, remove_nan: bool = True):
-    x = np.array(x)
-    if len(x) != len(group_id):
-        raise ValueError("lengths of the x and group_id should be the same")
-    unq, idx, cnt = np.unique(group_id, return_inverse=True, return_counts=True)
+def _reindex(x: np.ndarray, keys: np.ndarray, new_keys: np.ndarray) -> np.ndarray:
+    res = np.zeros((len(new_keys),) + x.shape[1:])
+    res[np.searchsorted(new_keys, keys)] = x
+    return res
 
-    def f(x):
-        if remove_nan:
-            na = np.isnan(x)
-            idx_unq = np.unique(idx)
-            idx_unq_, idx_ = np.unique(idx[~na], return_inverse=True)
-            res = np.repeat(np.nan, len(idx_unq))
-            z = np.bincount(idx_, weights=x[~na]) / np.bincount(idx_)
-            for i, j in zip(idx_unq_, z):
-                res[i] = j
-            return res
-        else:
-            return np.bincount(idx, weights=x) / np.bincount(idx)
 
-    if len(x.shape) == 1:
-        return f(x), unq
-    elif len(x.shape) == 2:
-        return np.apply_along_axis(f, 0, x), unq
-    else:
-        raise ValueError("x should be a one- or two-dimensional array")
+def sum_by_species_interval(
+    species: np.ndarray, t: np.ndarray, terms: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Sum the terms of stems by species and census intervals."""
+    sp_codes, sp_uniq = factorize(species)
+    t_codes, t_uniq = factorize(t)
+    codes, keys = factorize(sp_codes * len(t_uniq) + t_codes)
+    sums = _sum_by(codes, len(keys), terms)
+    return sp_uniq[keys // len(t_uniq)], t_uniq[keys % len(t_uniq)], sums
+
+
+class TreeSums(object):
+    """
+    Sums of a block of stems for the tree summaries.
+
+    The sums of blocks of stems of the same data can be merged (see `merge`), so
+    that the summaries of a large data can be computed block by block, without
+    holding the matrices of all stems (see `TreeSummary`).
+
+    Parameters
+    ----------
+    sp_list : numpy ndarray
+        Species names of stems
+    dbh_mat : numpy ndarray
+        DBH of stems (rows) in each census (columns)
+    w_mat : numpy ndarray
+        Above ground biomass of stems
+    gyear_mat : numpy ndarray
+        Growth years of stems
+    date_mat : numpy ndarray
+        Survey dates of stems in dtype of datetime64
+    dbh_min : float, default 5.0
+        Minimum DBH of stems to be counted
+
+    Attributes
+    ----------
+    species : numpy ndarray
+        Sorted species names
+    n, ba, b : numpy ndarray
+        Number of stems, basal area (m^2) and biomass of stems with DBH >= dbh_min
+        for each species (rows) and census (columns)
+    w_last, n_w_last : numpy ndarray
+        Sum and number of valid biomass values of each species in the last census
+    ba_all : numpy ndarray
+        Basal area (cm^2) of all stems in each census
+    b_all : numpy ndarray
+        Biomass of stems with DBH >= dbh_min in each census
+    n_stems : int
+        Number of stems
+    gyear : numpy ndarray
+        Sum of growth years in each census
+    date_min, date_days, n_date : numpy ndarray
+        Minimum, sum and number of valid survey dates (days since 1970-01-01) in
+        each census
+    turnover : list
+        Species, census intervals and sums of `turnover_terms` for each pair of
+        successive censuses
+
+    """
+
+    def __init__(
+        self,
+        sp_list: np.ndarray,
+        dbh_mat: np.ndarray,
+        w_mat: np.ndarray,
+        gyear_mat: np.ndarray,
+        date_mat: np.ndarray,
+        dbh_min: float = 5.0,
+    ):
+        sp_codes, self.species = factorize(sp_list)
+        n_sp = len(self.species)
+
+        dbh_mat_ = np.where(np.isnan(dbh_mat), 0.0, dbh_mat)
+        dbh_above = dbh_mat_ >= dbh_min
+        self.n = _sum_by(sp_codes, n_sp, dbh_above.astype("float64"))
+        self.ba = _sum_by(
+            sp_codes, n_sp, np.pi * (np.where(dbh_above, dbh_mat_, 0.0) / 100 / 2) ** 2
+        )
+        self.b = _sum_by(sp_codes, n_sp, np.where(dbh_above, w_mat, 0.0))
+
+        w_last = w_mat[:, -1:]
+        self.w_last = _sum_by(sp_codes, n_sp, np.where(np.isnan(w_last), 0.0, w_last))
+        self.n_w_last = _sum_by(sp_codes, n_sp, np.isfinite(w_last).astype("float64"))
+
+        self.ba_all = np.nansum((np.pi * (dbh_mat / 2) ** 2), 0)
+        self.b_all = np.nansum(w_mat * dbh_above, 0)
+        self.n_stems = dbh_mat.shape[0]
+        self.gyear = gyear_mat.sum(axis=0)
+
+        # 調査日は1970年1月1日からの日数で集計
+        days = date_mat.astype("datetime64[D]").astype("int64")
+        valid = ~np.isnat(date_mat)
+        self.date_min = np.where(valid, days, np.iinfo("int64").max).min(axis=0)
+        self.date_days = np.where(valid, days, 0).sum(axis=0)
+        self.n_date = valid.sum(axis=0)
+
+        self.turnover = []
+        for i in range(dbh_mat.shape[1] - 1):
+            terms = turnover_terms(
+                dbh_mat[:, i], dbh_mat[:, i + 1], w_mat[:, i], w_mat[:, i + 1]
+            )
+            t = (gyear_mat[:, i + 1] - gyear_mat[:, i]).astype("float64")
+            self.turnover.append(sum_by_species_interval(sp_list, t, terms))
+
+    @property
+    def n_census(self) -> int:
+        return self.n.shape[1]
+
+    def merge(self, other: "TreeSums") -> "TreeSums":
+        """Add the sums of another block of stems (in place)."""
+        species = np.union1d(self.species, other.species)
+        for name in ["n", "ba", "b", "w_last", "n_w_last"]:
+            x = _reindex(getattr(self, name), self.species, species)
+            y = _reindex(getattr(other, name), other.species, species)
+            setattr(self, name, x + y)
+        self.species = species
+
+        for name in ["ba_all", "b_all", "n_stems", "gyear", "date_days", "n_date"]:
+            setattr(self, name, getattr(self, name) + getattr(other, name))
+        self.date_min = np.minimum(self.date_min, other.date_min)
+
+        self.turnover = [
+            sum_by_species_interval(*[np.concatenate(i) for i in zip(x, y)])
+            for x, y in zip(self.turnover, other.turnover)
+        ]
+        return self
+
+    def species_sums(
+        self, remove_sp_unknown: bool = True
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        """Return the number of stems, basal area and biomass of species (`sp_sum`)."""
+        if remove_sp_unknown:
+            known = suppl.species_dict().lookup("species", self.species) != ""
+            return self.n[known], self.ba[known], self.b[known], self.species[known]
+        return self.n, self.ba, self.b, self.species
+
+    def gyear_mean(self) -> np.ndarray:
+        """Return the mean growth year of each census."""
+        return self.gyear / self.n_stems
+
+    def mean_date(self) -> np.ndarray:
+        """Return the mean survey date of each census (see `mean_date`)."""
+        res = []
+        for x_min, days, n in zip(self.date_min, self.date_days, self.n_date):
+            x = np.timedelta64(int(days - n * x_min), "D")
+            res.append(np.datetime64(int(x_min), "D") + x.dtype.type(x / n))
+        return np.array(res, dtype="datetime64[D]")
+
+    def last_biomass(self) -> np.ndarray:
+        """Return the biomass of each species in the last census (nan if unknown)."""
+        return np.where(self.n_w_last > 0, self.w_last, np.nan)[:, 0]
+
+    def survivors(self) -> np.ndarray:
+        """Return the number of survivors of species (rows) in each census interval."""
+        res = np.zeros((len(self.species), len(self.turnover)))
+        for i, (sp, _, terms) in enumerate(self.turnover):
+            res[:, i] = np.bincount(
+                np.searchsorted(self.species, sp),
+                weights=terms[:, 0],
+                minlength=len(self.species),
+            )
+        return res
+
+    def turnover_rates(
+        self, i: int, species: np.ndarray, plot_area: Optional[float] = None
+    ):
+        """
+        Calculate turnover rates of species in the i-th census interval.
+
+        See `turnover_rates` for the returned values.
+        """
+        sp, t, terms = self.turnover[i]
+        rows = np.isin(sp, species)
+        sums, t = sum_by_interval(terms[rows], t[rows])
+        return turnover_rates_from_sums(sums, t, plot_area=plot_area)
 
 
 class TreeSummary(object):
+    """
+    Summaries of tree census data.
+
+    Parameters
+    ----------
+    d : MonitoringData
+        Tree GBH data
+    dbh_min : float, default 5.0
+        Minimum DBH of stems to be counted
+    plot_area : float, optional
+        Plot area in ha (read from the metadata if not given)
+    chunk_size : int, default 0
+        If positive and the data has more stems than this, the stems are processed
+        in blocks of this size and the sums of the blocks are merged (see
+        `TreeSums`), so that the memory use is bounded by the block size. The
+        matrices of stems (`gbh_mat`, `dbh_mat` etc.) are not kept in this case
+
+    """
 
     _list_species_turnover: List[Dict[str, Union[str, float]]] = []
 
     def __init__(
-        self, d: MonitoringData, dbh_min: float = 5.0, plot_area: Optional[float] = None
+        self,
+        d: MonitoringData,
+        dbh_min: float = 5.0,
+        plot_area: Optional[float] = None,
+        chunk_size: int = 0,
     ):
         self.d = d
         self.dbh_min = dbh_min
         self.plot_area = plot_area
+        self.chunk_size = chunk_size
         self.preprocessing()
 
     def preprocessing(self):
@@ -410,54 +726,202 @@ class TreeSummary(object):
                 self.plot_area = 1.0
                 # raise ValueError("Plot area needed")
 
-        self.sp_list = np.array(
-            [
-                dict_sp[i]["name_jp_std"] if i in dict_sp else ""
-                for i in self.d.select(regex="^spc_japan$")
-            ]
+        if self.chunk_size > 0 and len(self.d.values) > self.chunk_size:
+            self.sums = self._chunked_sums()
+            return
+
+        (
+            self.sp_list,
+            self.gbh_mat,
+            self.date_mat,
+            self.gyear_mat,
+            self.dbh_mat,
+            self.w_mat,
+        ) = self._stems(self.d)
+
+        # above dbh threshold
+        dbh_mat_ = self.dbh_mat.copy()
+        dbh_mat_[np.isnan(dbh_mat_)] = 0.0
+        self.dbh_above = np.where(dbh_mat_ >= self.dbh_min, True, False)
+
+        self.sums = TreeSums(
+            self.sp_list,
+            self.dbh_mat,
+            self.w_mat,
+            self.gyear_mat,
+            self.date_mat,
+            self.dbh_min,
         )
 
-        if self.d.plot_id in ["OG-DB1", "UR-BC1"]:
-            self.gbh_mat, self.date_mat = get_gbh(self.d, spring_census=True)
-        else:
-            self.gbh_mat, self.date_mat = get_gbh(self.d)
+    @property
+    def spring_census(self) -> bool:
+        return self.d.plot_id in ["OG-DB1", "UR-BC1"]
 
+    @property
+    def drop_first_census(self) -> bool:
         # 初回調査で計測漏れが多い場合は除外
-        if self.d.plot_id in ["GR-DB1", "TM-DB2"]:
-            self.gbh_mat = self.gbh_mat[:, 1:]
-            self.date_mat = self.date_mat[:, 1:]
+        return self.d.plot_id in ["GR-DB1", "TM-DB2"]
+
+    def _stems(self, d: MonitoringData, census: Optional[TreeCensus] = None):
+        # 幹ごとの行列（census: 全体の統計量。ブロックごとに処理する場合に与える）
+        sp_list = suppl.species_dict().lookup(
+            "name_jp_std", d.select(regex="^spc_japan$")
+        )
 
-        self.date_mat = self.date_mat.astype("datetime64[D]")
+        gbh_mat, date_mat = get_gbh(d, spring_census=self.spring_census, census=census)
+
+        if self.drop_first_census:
+            gbh_mat = gbh_mat[:, 1:]
+            date_mat = date_mat[:, 1:]
+
+        date_mat = date_mat.astype("datetime64[D]")
         # 樹木の成長年
         # 調査日が7月1日以前の場合、前年の成長分とする
-        self.gyear_mat = np.vectorize(return_growth_year)(self.date_mat)
+        gyear_mat = np.vectorize(return_growth_year)(date_mat)
         # 成長年の空白は同じ列の平均で埋める
-        self.gyear_mat = np.apply_along_axis(
-            lambda x: fill_na_date_with_mean(x, na_val=-1), 0, self.gyear_mat
-        )
+        if census is None:
+            gyear_mat = np.apply_along_axis(
+                lambda x: fill_na_date_with_mean(x, na_val=-1), 0, gyear_mat
+            )
+        else:
+            gyear_mat = np.where(gyear_mat == -1, census.gyear_mean, gyear_mat)
 
         # remove empty column
-        empty_col = np.where(np.isfinite(self.gbh_mat).sum(axis=0) == 0, True, False)
-        self.gbh_mat = self.gbh_mat[:, ~empty_col]
-        self.date_mat = self.date_mat[:, ~empty_col]
-        self.gyear_mat = self.gyear_mat[:, ~empty_col]
+        if census is None:
+            empty_col = np.isfinite(gbh_mat).sum(axis=0) == 0
+        else:
+            empty_col = census.empty_col
+        gbh_mat = gbh_mat[:, ~empty_col]
+        date_mat = date_mat[:, ~empty_col]
+        gyear_mat = gyear_mat[:, ~empty_col]
 
         # GBH to DBH
-        self.dbh_mat = self.gbh_mat / np.pi
+        dbh_mat = gbh_mat / np.pi
 
         # biomass
-        self.w_mat = est_agb(self.dbh_mat, self.sp_list)
+        w_mat = est_agb(dbh_mat, sp_list, None if census is None else census.ft_na)
+
+        return sp_list, gbh_mat, date_mat, gyear_mat, dbh_mat, w_mat
+
+    def _blocks(self) -> Iterator[MonitoringData]:
+        # 行（幹）のブロック。値は元のデータと共有する
+        for start in range(0, len(self.d.values), self.chunk_size):
+            yield self.d[start : (start + self.chunk_size)]
+
+    def census(self) -> TreeCensus:
+        """Return the statistics of the censuses over all stems (see `TreeCensus`)."""
+        has_error = self.d.select(regex="^error[0-9]{2}$").shape[1] > 0
+        gbh_cn = self.d.select(regex="^gbh[0-9]{2}$", return_column_names=True)[1]
+        gbh_cn = gbh_cn[np.argsort(np.vectorize(retrive_year)(gbh_cn))]
+        date_cn = np.array([re.sub("gbh", "s_date", i) for i in gbh_cn])
+        has_date = np.isin(date_cn, self.d.columns)
+        pat_except = "" if has_error else "^nd|^cd|^vi|^vn"
+
+        k = len(gbh_cn)
+        valid = np.zeros(k, dtype=bool)
+        date_min = np.full(k, np.iinfo("int64").max)
+        date_days, n_date = np.zeros(k, dtype="int64"), np.zeros(k, dtype="int64")
+        gyear_min = np.full(k, np.iinfo("int64").max)
+        gyear = np.zeros(k, dtype="int64")
+        ft_counts: Dict[str, int] = {}
+        for block in self._blocks():
+            gbh_mat = map_unique(
+                lambda x: isvalid(x, pat_except, return_value=True),
+                block.select(list(gbh_cn)).reshape(-1, k),
+                "float64",
+            )
+            valid |= ~np.isnan(gbh_mat).all(axis=0)
+
+            date_mat = np.full(gbh_mat.shape, "NaT", dtype="datetime64[D]")
+            if has_date.any():
+                date_s = block.select(list(date_cn[has_date]))
+                date_mat[:, has_date] = map_unique(
+                    as_datetime, date_s.reshape(-1, has_date.sum())
+                ).astype("datetime64[D]")
+            notnull = ~np.isnat(date_mat)
+            days = date_mat.astype("int64")
+            date_min = np.minimum(
+                date_min, np.where(notnull, days, date_min).min(axis=0)
+            )
+            date_days += np.where(notnull, days, 0).sum(axis=0)
+            n_date += notnull.sum(axis=0)
+
+            # 成長年（8月以前に調査した場合は前年）
+            months = date_mat.astype("datetime64[M]").astype("int64")
+            gyear_ = months // 12 + 1970 - (months % 12 < 7)
+            gyear_min = np.minimum(
+                gyear_min, np.where(notnull, gyear_, gyear_min).min(axis=0)
+            )
+            gyear += np.where(notnull, gyear_, 0).sum(axis=0)
 
-        # above dbh threshold
-        dbh_mat_ = self.dbh_mat.copy()
-        dbh_mat_[np.isnan(dbh_mat_)] = 0.0
-        self.dbh_above = np.where(dbh_mat_ >= self.dbh_min, True, False)
+            sp_list = suppl.species_dict().lookup(
+                "name_jp_std", block.select(regex="^spc_japan$")
+            )
+            for ft, n in zip(*np.unique(functional_types(sp_list), return_counts=True)):
+                ft_counts[str(ft)] = ft_counts.get(str(ft), 0) + int(n)
 
-    def species_summary(self):
-        sp_n, sp_ba, sp_b, sp_uniq = sp_sum(
-            self.dbh_mat, self.sp_list, self.dbh_min, self.w_mat
+        if has_error:
+            gbh_na_col, na_col = None, ~valid
+        else:
+            gbh_na_col, na_col = ~valid, np.zeros(valid.sum(), dtype=bool)
+
+        # 調査日の列が欠けている場合は、全ての調査日が不明
+        if has_date[valid].all():
+            null_date_col = n_date[valid] == 0
+        else:
+            null_date_col = np.ones(valid.sum(), dtype=bool)
+        default = default_dates(gbh_cn[valid], self.spring_census)
+        date_mean, gyear_mean = [], []
+        for j, null, x in zip(np.where(valid)[0], null_date_col, default):
+            if null:
+                date_mean.append(x)
+                gyear_mean.append(return_growth_year(x))
+                continue
+            # mean_date, fill_na_date_with_meanと同じ計算
+            x_min, n = int(date_min[j]), int(n_date[j])
+            x = timedelta(days=int(date_days[j]) - n * x_min) / n
+            date_mean.append(datetime(1970, 1, 1) + timedelta(days=x_min) + x)
+            x_min = int(gyear_min[j])
+            gyear_mean.append(int(x_min + (int(gyear[j]) - n * x_min) / n))
+        if self.drop_first_census:
+            gyear_mean = gyear_mean[1:]
+
+        ft_u = sorted(ft_counts)
+        ft_na = ft_u[int(np.argmax([ft_counts[i] for i in ft_u]))]
+
+        return TreeCensus(
+            gbh_na_col=gbh_na_col,
+            na_col=na_col,
+            null_date_col=null_date_col,
+            date_mean=np.array(date_mean, dtype=object),
+            gyear_mean=np.array(gyear_mean, dtype="int64"),
+            empty_col=np.zeros(len(gyear_mean), dtype=bool),
+            ft_na=ft_na,
         )
-        t = self.gyear_mat.mean(axis=0)
+
+    def _chunked_sums(self) -> TreeSums:
+        census = self.census()
+        while True:
+            sums: Optional[TreeSums] = None
+            finite = np.zeros(len(census.empty_col), dtype=bool)
+            for block in self._blocks():
+                sp_list, gbh_mat, date_mat, gyear_mat, dbh_mat, w_mat = self._stems(
+                    block, census
+                )
+                finite |= np.isfinite(gbh_mat).any(axis=0)
+                block_sums = TreeSums(
+                    sp_list, dbh_mat, w_mat, gyear_mat, date_mat, self.dbh_min
+                )
+                sums = block_sums if sums is None else sums.merge(block_sums)
+            if census.empty_col.any() or finite.all():
+                return sums
+            # 内挿後もGBHが全くない調査回がある場合は、その列を除いて集計し直す
+            census.empty_col = ~finite
+
+    def species_summary(self):
+        dict_sp = suppl.species_dict()
+        sp_n, sp_ba, sp_b, sp_uniq = self.sums.species_sums()
+        t = self.sums.gyear_mean()
 
         # remove species with no individuals with DBH >= 5 cm
         no_ind = np.where(sp_n.sum(axis=1) == 0, True, False)
@@ -503,24 +967,20 @@ class TreeSummary(object):
                 }
 
     def _species_turnover(self):
-        if self.dbh_mat.shape[1] == 1:
+        dict_sp = suppl.species_dict()
+        if self.sums.n_census == 1:
             return
 
-        sp_uniq = np.unique(self.sp_list)
-        si = np.logical_and(self.dbh_above[:, :-1], self.dbh_above[:, 1:]).astype(
-            "float64"
-        )
-        t = self.gyear_mat.mean(axis=0)
+        t = self.sums.gyear_mean()
 
         # 生存個体が5個体未満の種をOthersとしてまとめる
-        rare_sp = np.array(
-            [si[self.sp_list == i].sum(axis=0).min() < 5 for i in sp_uniq]
-        )
-        sp_list_ = self.sp_list.copy()
-        sp_list_[np.array([i in sp_uniq[rare_sp] for i in sp_list_])] = "Others"
+        rare_sp = self.sums.survivors().min(axis=1) < 5
+        sp_list_ = np.where(rare_sp, "Others", self.sums.species)
 
         # sort by biomass
-        sp_b, sp_uniq = group_sum(self.w_mat[:, -1], sp_list_)
+        g = GroupBy(sp_list_)
+        sp_b, sp_uniq = g.sum(self.sums.last_biomass()), g.groups
+        sp_rows = dict(zip(g.groups, g.indices()))
         if "Others" in sp_uniq:
             sp_order = np.argsort(sp_b[np.where(sp_uniq != "Others")])[::-1]
             sp_uniq = np.append(
@@ -530,17 +990,11 @@ class TreeSummary(object):
             sp_uniq = sp_uniq[np.argsort(sp_b)]
 
         # compute turnover rates for each species
-        k = self.dbh_mat.shape[1]
+        k = self.sums.n_census
         for sp in sp_uniq:
+            species = self.sums.species[sp_rows[sp]]
             for i, j in zip(range(k - 1), range(1, k)):
-                res = turnover_rates(
-                    self.dbh_mat[sp_list_ == sp, i],
-                    self.dbh_mat[sp_list_ == sp, j],
-                    self.w_mat[sp_list_ == sp, i],
-                    self.w_mat[sp_list_ == sp, j],
-                    np.diff(self.gyear_mat[sp_list_ == sp, i : (j + 1)]).flatten(),
-                    plot_area=self.plot_area,
-                )
+                res = self.sums.turnover_rates(i, species, plot_area=self.plot_area)
 
                 yield {
                     "t1": t[i],
@@ -568,17 +1022,13 @@ class TreeSummary(object):
             yield from self._species_turnover()
 
     def community_summary(self):
-        sp_n, sp_ba, sp_b, sp_uniq = sp_sum(
-            self.dbh_mat, self.sp_list, self.dbh_min, self.w_mat
-        )
+        sp_n, sp_ba, sp_b, sp_uniq = self.sums.species_sums()
 
         # survey date
-        mdate = np.apply_along_axis(lambda x: mean_date(x), 0, self.date_mat).astype(
-            str
-        )
+        mdate = self.sums.mean_date().astype(str)
 
         # year
-        t = np.nanmean(self.gyear_mat, axis=0)
+        t = self.sums.gyear_mean()
 
         # number of stems
         nstem = sp_n.sum(axis=0) / self.plot_area
@@ -587,10 +1037,10 @@ class TreeSummary(object):
         nsp = np.apply_along_axis(lambda x: sum(x > 0), 0, sp_n)
 
         # basal area
-        ba = np.nansum((np.pi * (self.dbh_mat / 2) ** 2), 0) / 10000 / self.plot_area
+        ba = self.sums.ba_all / 10000 / self.plot_area
 
         # biomass
-        b = np.nansum(self.w_mat * self.dbh_above, 0) / self.plot_area
+        b = self.sums.b_all / self.plot_area
 
         # species richness
         richness = rarefaction(sp_n, sample=100)
@@ -604,7 +1054,7 @@ class TreeSummary(object):
 
     def community_turnover(self):
         # 種の幹数・現存量を重みとした、加重平均をプロット全体の変化速度とする
-        if self.dbh_mat.shape[1] == 1:
+        if self.sums.n_census == 1:
             return
 
         if not self._list_species_turnover:
@@ -731,12 +1181,14 @@ class LitterSummary(object):
 
     def impute(self):
         # impute missing data
+        self.impute_timings: Dict[str, float] = {}
         if self.d.plot_id == "OG-DB1":
             # 小川のデータで一部風乾重から絶乾重への変換がされていない箇所を補完
             X_rep = np.c_[self.wdry[:, 2], self.w[:, 2]]
             cond = np.where(np.isnan(X_rep).sum(axis=1) != 2, True, False)
-            imputer = IterativeImputer(max_iter=10, random_state=0)
-            X_rep_impute = imputer.fit_transform(X_rep[cond, :])
+            start = time.perf_counter()
+            X_rep_impute = iterative_impute(X_rep[cond, :])
+            self.impute_timings["rep"] = time.perf_counter() - start
             self.wdry[cond, 2] = X_rep_impute[:, 0]
             self.w[cond, 2] = X_rep_impute[:, 1]
 
@@ -781,33 +1233,26 @@ class LitterSummary(object):
         # 1/1-12/31で集計
         # 年をまたぐ場合は日割りで計算
         t = x[:, 1:3].astype("datetime64[D]")
-        t_year = t.astype("datetime64[Y]").astype(str).astype(int)
         inst_period_raw = x[:, 3].astype(int)
-        year = np.unique(t_year)
         wdry_raw = x[:, 4:8].astype("float64")
         wdry_daily = (wdry_raw.T / inst_period_raw).T
 
         exclude_low_sampling_density = True
 
-        wdry_cum = np.empty(shape=(0, wdry_raw.shape[1]))
-        n_collect = np.array([])
-        inst_period = np.array([])
-        t1 = np.array([])
-        t2 = np.array([])
-
-        for yr in year:
-            m = np.any(t_year == yr, axis=1)
-            t_s = t[m]
-            yr_diff = t_year[m] - yr
-            t_s[np.where(yr_diff == -1)] = "{}-12-31".format(yr - 1)
-            t_s[np.where(yr_diff == 1)] = "{}-12-31".format(yr)
-            wdry_daily_s = wdry_daily[m]
-            wdry_cum_s = np.nansum(wdry_daily_s * np.diff(t_s).astype(int), axis=0)
-            wdry_cum = np.vstack((wdry_cum, wdry_cum_s))
-            n_collect = np.append(n_collect, np.sum(np.all(yr_diff != 1, axis=1)))
-            inst_period = np.append(inst_period, np.diff(t_s).astype(int).sum())
-            t1 = np.append(t1, t_s[0, 0].astype(str))
-            t2 = np.append(t2, t_s[-1, 1].astype(str))
+        row, year_p, t1_p, t2_p = split_by_year(t[:, 0], t[:, 1])
+        days = (t2_p - t1_p).astype(int)
+        # その年に回収された
+        collected = year_p == t[row, 1].astype("datetime64[Y]").astype(int) + 1970
+
+        g = GroupBy(year_p)
+        res = g.sum(np.c_[wdry_daily[row] * days[:, None], days, collected])
+        res = np.nan_to_num(res)
+        year = g.groups
+        wdry_cum = res[:, :4]
+        inst_period = res[:, 4]
+        n_collect = res[:, 5]
+        t1 = g.first(t1_p).astype(str)
+        t2 = g.last(t2_p).astype(str)
 
         # 設置期間およびリター回収回数が例年の75%に満たない年は除外
         if exclude_low_sampling_density:
@@ -879,23 +1324,13 @@ def fix_seed_data_AM(d: MonitoringData):
     return d
 
 
-def impute_seed_meas(
-    number: np.ndarray, wdry: np.ndarray, form: np.ndarray, status: np.ndarray
-):
-    enc = OneHotEncoder()
-    dummies = enc.fit_transform(np.c_[status, form]).toarray()
-    X = np.c_[number, wdry, dummies]
-    imputer = IterativeImputer(max_iter=10, random_state=0)
-    X_impute = imputer.fit_transform(X)
-    return X_impute[:, 0], X_impute[:, 1]
-
-
 class SeedSummary(object):
 
     _list_each_sampling: List[Dict[str, Union[float, str]]] = []
 
-    def __init__(self, d: MonitoringData):
+    def __init__(self, d: MonitoringData, batch_max_rows: int = 0):
         self.d = d
+        self.batch_max_rows = batch_max_rows
         self.preprocessing()
         self.impute()
 
@@ -909,11 +1344,8 @@ class SeedSummary(object):
         trap_area = self.d.select("trap_area").astype("float64")
         t1 = self.d.select("s_date1")
         t2 = self.d.select("s_date2")
-        sp_list = np.array(
-            [
-                dict_sp[i]["name_jp_std"] if i in dict_sp else ""
-                for i in self.d.select(regex="^spc$")
-            ]
+        sp_list = suppl.species_dict().lookup(
+            "name_jp_std", self.d.select(regex="^spc$")
         )
 
         # get measurements
@@ -1033,99 +1465,78 @@ class SeedSummary(object):
 
     def impute(self):
         # impute missing data
+        self.impute_timings: Dict[str, float] = {}
+        X = (self.number, self.wdry, self.form, self.status)
+
         if self.d.plot_id not in ["OG-DB1", "AM-EB1"]:
-            for s in np.unique(self.sp_list):
-                cond = np.where(self.sp_list == s, True, False)
-                if np.all(np.isnan(self.number[cond])) | np.all(
-                    np.isnan(self.wdry[cond])
-                ):
-                    continue
-
-                if np.any(np.isnan(self.number[cond]) & np.isnan(self.wdry[cond])):
-                    number_imp, wdry_imp = impute_seed_meas(
-                        self.number[cond],
-                        self.wdry[cond],
-                        self.form[cond],
-                        self.status[cond],
-                    )
-                    self.number[cond] = number_imp
-                    self.wdry[cond] = wdry_imp
+            self.number, self.wdry = impute_seed_by_species(
+                *X,
+                self.sp_list,
+                batch_max_rows=self.batch_max_rows,
+                timings=self.impute_timings,
+            )
 
         elif self.d.plot_id == "OG-DB1":
             # 小川では2008年以降は重量がstatus別になっておらず、まとめて計量されている
             # それ以前のデータについて補完する
             t2 = np.array([as_datetime(i) for i in self.t2]).astype("datetime64[D]")
             t_ = np.where(t2 <= np.datetime64("2007-11-18"), True, False)
-
-            for s in np.unique(self.sp_list[t_]):
-                cond = np.where((self.sp_list == s) & t_, True, False)
-                if np.all(np.isnan(self.number[cond])) | np.all(
-                    np.isnan(self.wdry[cond])
-                ):
-                    continue
-
-                if np.any(np.isnan(self.number[cond]) & np.isnan(self.wdry[cond])):
-                    number_imp, wdry_imp = impute_seed_meas(
-                        self.number[cond],
-                        self.wdry[cond],
-                        self.form[cond],
-                        self.status[cond],
-                    )
-                    self.number[cond] = number_imp
-                    self.wdry[cond] = wdry_imp
+            self.number, self.wdry = impute_seed_by_species(
+                *X,
+                self.sp_list,
+                mask=t_,
+                batch_max_rows=self.batch_max_rows,
+                timings=self.impute_timings,
+            )
 
         elif self.d.plot_id == "AM-EB1":
             # 奄美はスダジイのみ補完
             # それ以外の種は回収時毎にまとめて計量されている
             cond = np.where(self.sp_list == "スダジイ", True, False)
+            start = time.perf_counter()
             number_imp, wdry_imp = impute_seed_meas(
                 self.number[cond],
                 self.wdry[cond],
                 self.form[cond],
                 self.status[cond],
             )
+            self.impute_timings["スダジイ"] = time.perf_counter() - start
             self.number[cond] = number_imp
             self.wdry[cond] = wdry_imp
 
     def _each_sampling(self):
         # calculate mean by species and sampling
+        dict_sp = suppl.species_dict()
         t1 = np.array([as_datetime(i) for i in self.t1]).astype("datetime64[D]")
         t2 = np.array([as_datetime(i) for i in self.t2]).astype("datetime64[D]")
+        nat = np.isnat(t1) | np.isnat(t2)
+        if nat.any():
+            # 回収日が不正な記録は年に計上できない
+            bad = np.unique(np.r_[self.t1[np.isnat(t1)], self.t2[np.isnat(t2)]])
+            msg = "invalid sampling dates: {}".format(", ".join(bad))
+            raise ValueError(msg)
         tm = t1 + (t2 - t1) / 2
-        tm_uniq = np.unique(tm)
-        t = np.c_[t1, t2]
-        t_uniq = np.unique(t, axis=0)
-
-        sp_uniq, cnt = np.unique(self.sp_list, return_counts=True)
-        sp_uniq = sp_uniq[cnt > 9]
-        sp_tm_combn = np.array([i + ":" + str(j) for i, j in zip(self.sp_list, tm)])
-        sp_tm_combn_all = np.array(
-            [[i + ":" + str(j) for j in tm_uniq] for i in sp_uniq]
-        ).flatten()
-
-        sp_list, tm_arr = np.array([i.split(":") for i in sp_tm_combn_all]).T
-        tm_arr = tm_arr.astype("datetime64[D]")
-        year = tm_arr.astype("datetime64[Y]").astype(str).astype(int)
-
-        X = np.c_[self.number, self.wdry]
-        X_sum, sp_tm_combn_uniq = group_sum(X, sp_tm_combn)
-
-        number_sum = np.array(
-            [
-                X_sum[sp_tm_combn_uniq == i, 0][0] if i in sp_tm_combn_uniq else 0
-                for i in sp_tm_combn_all
-            ]
-        )
-        wdry_sum = np.array(
-            [
-                X_sum[sp_tm_combn_uniq == i, 1][0] if i in sp_tm_combn_uniq else 0
-                for i in sp_tm_combn_all
-            ]
-        )
+        tm_code, tm_uniq = factorize(tm)
+        # 中間日ごとの設置日・回収日（中間日の同じ回収が複数あれば最初の記録）
+        first = np.unique(tm_code, return_index=True)[1]
+        t1_uniq, t2_uniq = t1[first], t2[first]
+        year_uniq = tm_uniq.astype("datetime64[Y]").astype(int) + 1970
+
+        # species x sampling cube (species with less than 10 records are excluded)
+        sp_code, sp_uniq = factorize(self.sp_list)
+        shape = (len(sp_uniq), len(tm_uniq))
+        sp_tm_code = np.ravel_multi_index((sp_code, tm_code), shape)
+        sp_keep = np.bincount(sp_code, minlength=shape[0]) > 9
+
+        g = GroupBy(sp_tm_code)
+        X_sum = np.zeros((shape[0] * shape[1], 2))
+        X_sum[g.groups] = g.sum(np.c_[self.number, self.wdry])
+        X_sum = X_sum.reshape(shape + (2,))[sp_keep]
+        number_sum, wdry_sum = X_sum[:, :, 0], X_sum[:, :, 1]
 
         if self.d.plot_id == "KM-DB1":
             # カヌマ沢のトラップ数は2004, 2005年が60で、それ以降は25
-            n_trap = np.where(year < 2006, 60, 25)
+            n_trap = np.where(year_uniq < 2006, 60, 25)
         else:
             n_trap = int(re.sub(r"^([0-9]+).*", r"\1", self.d.metadata["NO. OF TRAPS"]))
 
@@ -1133,61 +1544,47 @@ class SeedSummary(object):
         wdry_m = wdry_sum / n_trap
 
         # calculate the proprtion of healthy seeds
-        enc = OneHotEncoder()
-        enc.fit(self.status[:, None])
-        cat = enc.categories_[0]
+        status_code, cat = factorize(self.status)
+        prop_viable = np.full(shape[0] * shape[1], np.nan)
         if "good" in cat:
-            dummies = (
-                enc.fit_transform(self.status[:, None]).toarray() * self.number[:, None]
-            )
-            status_sum, _ = group_sum(dummies, sp_tm_combn)
-            prop_status = np.array(
-                [
-                    i / i.sum() if i.sum() > 0 else np.repeat(np.nan, len(cat))
-                    for i in status_sum
-                ]
-            )
-            prop_viable = prop_status[:, cat == "good"].flatten()
+            dummies = np.eye(len(cat))[status_code] * self.number[:, None]
+            status_sum = g.sum(dummies)
+            status_tot = status_sum.sum(axis=1)[:, None]
+            with np.errstate(invalid="ignore", divide="ignore"):
+                prop_status = np.where(status_tot > 0, status_sum / status_tot, np.nan)
+            prop_viable_ = prop_status[:, cat == "good"].flatten()
             if "na" in cat:
-                prop_viable[prop_status[:, cat == "na"].flatten() == 1] = np.nan
-
-            prop_viable = np.array(
-                [
-                    prop_viable[np.where(sp_tm_combn_uniq == i)[0][0]]
-                    if i in sp_tm_combn_uniq
-                    else np.nan
-                    for i in sp_tm_combn_all
-                ]
-            )
-        else:
-            prop_viable = np.repeat(np.nan, len(number_m))
+                prop_viable_[prop_status[:, cat == "na"].flatten() == 1] = np.nan
+            prop_viable[g.groups] = prop_viable_
+        prop_viable = prop_viable.reshape(shape)[sp_keep]
 
         # sort by dry mass
-        sp_wdry_sum = {k: v for v, k in zip(*group_sum(wdry_m, sp_list))}
-        order = np.lexsort((-np.array([sp_wdry_sum[i] for i in sp_list]), year))
-        wdry_m = wdry_m[order]
-        number_m = number_m[order]
-        prop_viable = prop_viable[order]
-        sp_list = sp_list[order]
-        year = year[order]
-        tm_arr = tm_arr[order]
+        sp_uniq = sp_uniq[sp_keep]
+        sp_wdry_sum = np.where(
+            np.isnan(wdry_m).all(axis=1), np.nan, np.nansum(wdry_m, axis=1)
+        )
+        sp_idx, tm_idx = np.indices(wdry_m.shape).reshape(2, -1)
+        order = np.lexsort((-sp_wdry_sum[sp_idx], year_uniq[tm_idx]))
+        sp_idx = sp_idx[order]
+        tm_idx = tm_idx[order]
 
         # rounding
-        wdry_m = np.round(wdry_m, 8)
-        number_m = np.round(number_m, 8)
-        prop_viable = np.round(prop_viable, 8)
+        wdry_m = np.round(wdry_m.flatten()[order], 8)
+        number_m = np.round(number_m.flatten()[order], 8)
+        prop_viable = np.round(prop_viable.flatten()[order], 8)
 
+        inst_period = (t2_uniq - t1_uniq).astype(int)
         for i in range(len(number_m)):
-            j = np.where(tm_uniq == tm_arr[i])[0][0]
+            sp, j = sp_uniq[sp_idx[i]], tm_idx[i]
             yield {
-                "year": year[i],
-                "t1": t_uniq[j, 0].astype(str),
-                "t2": t_uniq[j, 1].astype(str),
-                "inst_period": np.diff(t_uniq[j]).astype(int)[0],
-                "species_jp": sp_list[i],
-                "species": dict_sp[sp_list[i]]["species"],
-                "family": dict_sp[sp_list[i]]["family"],
-                "order": dict_sp[sp_list[i]]["order"],
+                "year": year_uniq[j],
+                "t1": t1_uniq[j].astype(str),
+                "t2": t2_uniq[j].astype(str),
+                "inst_period": inst_period[j],
+                "species_jp": sp,
+                "species": dict_sp[sp]["species"],
+                "family": dict_sp[sp]["family"],
+                "order": dict_sp[sp]["order"],
                 "number": number_m[i],
                 "wdry": wdry_m[i],
                 "prop_viable": prop_viable[i],
@@ -1200,64 +1597,65 @@ class SeedSummary(object):
             yield from self._each_sampling()
 
     def annual(self, exclude_short_inst_period: bool = False):
+        dict_sp = suppl.species_dict()
         if not self._list_each_sampling:
             self._list_each_sampling = list(self._each_sampling())
 
         x = np.array([list(i.values()) for i in self._list_each_sampling])
 
+        # 種子は回収期間の中間日の年に計上（日割りにしない）
         year = x[:, 0].astype(int)
+        t1_p = x[:, 1].astype("datetime64[D]")
+        t2_p = x[:, 2].astype("datetime64[D]")
         inst_period = x[:, 3].astype(int)
         sp = x[:, 4]
         number = x[:, 8].astype("float64")
         wdry = x[:, 9].astype("float64")
         prop_viable = x[:, 10].astype("float64")
 
-        sp_year = np.array([i + ":" + str(j) for i, j in zip(sp, year)])
-        inst_period_sum, sp_year_uniq = group_sum(inst_period, sp_year)
-        number_sum, _ = group_sum(number, sp_year)
-        wdry_sum, _ = group_sum(wdry, sp_year)
-        sp_list, year_list = np.array([i.split(":") for i in sp_year_uniq]).T
-        year_list = year_list.astype(int)
-
-        prop_viable_sum = np.array([])
-        for i in sp_year_uniq:
-            wdry[sp_year == i]
-            n = number[sp_year == i]
-            p = prop_viable[sp_year == i]
-            if any(np.isfinite(n)) and np.any(np.isfinite(p)):
-                p_ = np.nansum(n * p) / np.nansum(n)
-            else:
-                p_ = np.nan
-            prop_viable_sum = np.append(prop_viable_sum, p_)
+        sp_code, sp_uniq = factorize(sp)
+        year_code, year_uniq = factorize(year)
+        shape = (len(sp_uniq), len(year_uniq))
+        g = GroupBy(np.ravel_multi_index((sp_code, year_code), shape))
+        sp_idx, year_idx = np.unravel_index(g.groups, shape)
+        inst_period_sum, number_sum, wdry_sum = g.sum(
+            np.c_[inst_period, number, wdry]
+        ).T
+
+        # number-weighted mean of the proportion of viable seeds
+        n_valid, p_valid = g.count(np.c_[number, prop_viable]).T
+        np_sum, n_sum = np.nan_to_num(g.sum(np.c_[number * prop_viable, number])).T
+        with np.errstate(invalid="ignore", divide="ignore"):
+            prop_viable_sum = np.where(
+                (n_valid > 0) & (p_valid > 0), np_sum / n_sum, np.nan
+            )
 
         if exclude_short_inst_period:
             short = np.where(
                 inst_period_sum < (np.median(inst_period_sum) * 0.8), True, False
             )
             inst_period_sum = inst_period_sum[~short]
-            year_list = year_list[~short]
-            sp_list = sp_list[~short]
+            year_idx = year_idx[~short]
+            sp_idx = sp_idx[~short]
             wdry_sum = wdry_sum[~short]
             number_sum = number_sum[~short]
             prop_viable_sum = prop_viable_sum[~short]
 
-        t1 = np.array(
-            [x[year == i, 1].astype("datetime64[D]").min() for i in year_list]
-        ).astype("str")
-
-        t2 = np.array(
-            [x[year == i, 2].astype("datetime64[D]").max() for i in year_list]
-        ).astype("str")
+        gy = GroupBy(year_code)
+        t1 = gy.min(t1_p.astype(int)).astype(int).astype("datetime64[D]")
+        t2 = gy.max(t2_p.astype(int)).astype(int).astype("datetime64[D]")
+        t1 = t1.astype(str)[year_idx]
+        t2 = t2.astype(str)[year_idx]
 
         # sort by dry mass
-        sp_wdry_sum = {k: v for v, k in zip(*group_sum(wdry_sum, sp_list))}
-        order = np.lexsort((-np.array([sp_wdry_sum[i] for i in sp_list]), year_list))
+        gs = GroupBy(sp_idx)
+        order = np.lexsort((-gs.sum(wdry_sum)[gs.codes], year_uniq[year_idx]))
 
         wdry_sum = wdry_sum[order]
         number_sum = number_sum[order]
         prop_viable_sum = prop_viable_sum[order]
-        sp_list = sp_list[order]
-        year_list = year_list[order]
+        sp_list = sp_uniq[sp_idx[order]]
+        year_list = year_uniq[year_idx[order]]
         inst_period_sum = inst_period_sum[order]
         t1 = t1[order]
         t2 = t2[order]
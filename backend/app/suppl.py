@@ -0,0 +1,242 @@
+import json
+import threading
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+
+from app.groupby import factorize
+from app.logger import get_logger
+
+logger = get_logger(__name__)
+
+SUPPL_DIR = Path(__file__).resolve().parents[0].joinpath("suppl_data")
+
+SUPPL_FILES = {
+    "species_dict": "species_dict.json",
+    "grid_xy": "grid_xy.json",
+    "trap_list": "trap_list.json",
+}
+
+
+class SpeciesDict(object):
+    """
+    Japanese species name dictionary with lookup tables.
+
+    The dictionary can be used as a (read-only) mapping of Japanese names to the
+    records. The names are also coded as integers in the order of the dictionary
+    (see `codes`), and the fields are available as arrays indexed by the codes.
+    The arrays have an extra last element for the names not in the dictionary,
+    so that they can be indexed by the code -1 directly.
+
+    Parameters
+    ----------
+    data : dict
+        Contents of species_dict.json
+
+    Attributes
+    ----------
+    names : numpy ndarray
+        Japanese names
+    name_jp_std, species, family, order : numpy ndarray
+        Standard Japanese name, scientific name, family and order ("" if unknown)
+    wood_density : numpy ndarray
+        Wood density in g/cm^3 (nan if unknown)
+    ft_code : numpy ndarray
+        Functional type (categ2): 1, conifer; 4, deciduous broadleaf; 5,
+        evergreen broadleaf; 0, unknown
+    family_code, order_code : numpy ndarray
+        Integer codes of the family and order (indices of `families` and
+        `orders`; -1 if unknown)
+    families, orders : numpy ndarray
+        Sorted names of families and orders
+
+    """
+
+    def __init__(self, data: Dict[str, Dict[str, Any]]):
+        self.data = data
+        self.index = {name: i for i, name in enumerate(data)}
+        self.names = np.array(list(data), dtype=str)
+
+        self.name_jp_std = self._field("name_jp_std")
+        self.species = self._field("species")
+        self.family = self._field("family")
+        self.order = self._field("order")
+        self.wood_density = self._field("wood_density", float, np.nan)
+        self.ft_code = self._field("categ2", int, 0)
+        self.family_code, self.families = self._factorize(self.family)
+        self.order_code, self.orders = self._factorize(self.order)
+
+    def _field(self, key: str, dtype: Any = str, na: Any = "") -> np.ndarray:
+        values = [na if v.get(key, "") == "" else v[key] for v in self.data.values()]
+        return np.array(values + [na], dtype=dtype)
+
+    @staticmethod
+    def _factorize(x: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        known = x != ""
+        codes = np.full(len(x), -1, dtype=int)
+        codes[known], uniq = factorize(x[known])
+        return codes, uniq
+
+    def __len__(self):
+        return len(self.data)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.data)
+
+    def __contains__(self, name: Any) -> bool:
+        return name in self.data
+
+    def __getitem__(self, name: str) -> Dict[str, Any]:
+        return self.data[name]
+
+    def get(self, name: str, default: Any = None) -> Any:
+        return self.data.get(name, default)
+
+    def codes(self, names: Union[np.ndarray, List[str]]) -> np.ndarray:
+        """Return the integer codes of Japanese names (-1 if not in the dictionary)."""
+        names = np.asarray(names, dtype=str)
+        uniq, inv = np.unique(names, return_inverse=True)
+        codes = np.array([self.index.get(x, -1) for x in uniq.tolist()], dtype=int)
+        return codes[inv.reshape(names.shape)]
+
+    def lookup(self, field: str, names: Union[np.ndarray, List[str]]) -> np.ndarray:
+        """Return the values of a field (a lookup array) for Japanese names."""
+        return getattr(self, field)[self.codes(names)]
+
+
+class XYGrid(object):
+    """
+    Lookup table of xy coordinates of 10 x 10 m grids in a plot.
+
+    Parameters
+    ----------
+    x : List[int]
+        x coordinates of grids
+    y : List[int]
+        y coordinates of grids
+
+    """
+
+    def __init__(self, x: List[int], y: List[int]):
+        x, y = np.asarray(x, dtype=int), np.asarray(y, dtype=int)
+        self.x0, self.y0 = x.min(), y.min()
+        self.table = np.zeros((x.max() - self.x0 + 1, y.max() - self.y0 + 1), bool)
+        self.table[np.ix_(x - self.x0, y - self.y0)] = True
+
+    def __len__(self):
+        return int(self.table.sum())
+
+    def contains(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Return a boolean array whether the xy coordinates are in the grids."""
+        i = np.asarray(x, dtype=float) - self.x0
+        j = np.asarray(y, dtype=float) - self.y0
+        nx, ny = self.table.shape
+        inside = (i >= 0) & (i < nx) & (j >= 0) & (j < ny)
+        res = np.zeros(i.shape, dtype=bool)
+        res[inside] = self.table[i[inside].astype(int), j[inside].astype(int)]
+        return res
+
+
+class SupplRegistry(object):
+    """
+    Registry of supplementary data.
+
+    Each file is loaded once, and reloaded when it is modified (by mtime). Lookup
+    tables derived from the data are cached with it. The cached objects are
+    shared (e.g. by summaries, data checks and API requests), and should not be
+    modified.
+
+    Parameters
+    ----------
+    suppl_dir : str or path-like, optional
+        Directory of the default supplementary data files
+
+    """
+
+    def __init__(self, suppl_dir: Union[str, Path] = SUPPL_DIR):
+        self.suppl_dir = Path(suppl_dir)
+        self._cache: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+        self._lock = threading.Lock()
+
+    def path(self, name: str, path: Optional[Union[str, Path]] = None) -> str:
+        """Return the path to a supplementary data file (the default if not given)."""
+        if path:
+            return str(path)
+        return str(self.suppl_dir.joinpath(SUPPL_FILES[name]))
+
+    def _get(self, kind: str, path: str, build: Callable[[str], Any]) -> Any:
+        mtime = Path(path).stat().st_mtime
+        with self._lock:
+            cached = self._cache.get((kind, path))
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+        if cached is not None:
+            logger.info("Reload {} ({})".format(kind, path))
+        value = build(path)
+        with self._lock:
+            self._cache[(kind, path)] = (mtime, value)
+        return value
+
+    def clear(self):
+        """Clear the cache."""
+        with self._lock:
+            self._cache.clear()
+
+    def load_json(self, path: Union[str, Path]) -> Any:
+        """Load a json file."""
+        return self._get("json", str(path), _read_json)
+
+    def species_dict(self, path: Optional[Union[str, Path]] = None) -> SpeciesDict:
+        """Return the species dictionary."""
+        return self._get(
+            "species_dict",
+            self.path("species_dict", path),
+            lambda x: SpeciesDict(self.load_json(x)),
+        )
+
+    def xy_grid(
+        self, plot_id: str, path: Optional[Union[str, Path]] = None
+    ) -> Optional[XYGrid]:
+        """Return the grid xy coordinates of the plot (None if not in the file)."""
+
+        def build(x: str) -> Optional[XYGrid]:
+            dict_xy = self.load_json(x)
+            if plot_id in dict_xy and all(dict_xy[plot_id].values()):
+                return XYGrid(dict_xy[plot_id]["x"], dict_xy[plot_id]["y"])
+            return None
+
+        return self._get("grid_xy:" + str(plot_id), self.path("grid_xy", path), build)
+
+    def trap_list(
+        self, plot_id: str, path: Optional[Union[str, Path]] = None
+    ) -> Dict[str, Dict[str, Any]]:
+        """Return the trap list of the plot (empty if not in the file)."""
+        return self.load_json(self.path("trap_list", path)).get(plot_id, {})
+
+
+def _read_json(path: str) -> Any:
+    with open(path, "rb") as f:
+        return json.load(f)
+
+
+registry = SupplRegistry()
+
+
+def species_dict(path: Optional[Union[str, Path]] = None) -> SpeciesDict:
+    """Return the species dictionary (see `SupplRegistry`)."""
+    return registry.species_dict(path)
+
+
+def xy_grid(
+    plot_id: str, path: Optional[Union[str, Path]] = None
+) -> Optional[XYGrid]:
+    """Return the grid xy coordinates of the plot (see `SupplRegistry`)."""
+    return registry.xy_grid(plot_id, path)
+
+
+def trap_list(
+    plot_id: str, path: Optional[Union[str, Path]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """Return the trap list of the plot (see `SupplRegistry`)."""
+    return registry.trap_list(plot_id, path)
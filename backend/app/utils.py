@@ -1,11 +1,9 @@
-import copy
-import json
 import re
-from pathlib import Path
-from typing import Any
+from typing import Any, Optional
 
 import numpy as np
 
+from app import suppl
 from app.base import MonitoringData
 from app.datacheck import find_pattern, isvalid, retrive_year
 from app.logger import get_logger
@@ -13,12 +11,6 @@ from app.logger import get_logger
 logger = get_logger(__name__)
 
 
-fd = Path(__file__).resolve().parents[0]
-path_spdict = fd.joinpath("suppl_data", "species_dict.json")
-with open(path_spdict, "rb") as f:
-    dict_sp = json.load(f)
-
-
 def fill_after(x: np.ndarray, val: Any = 1, fill: Any = 2) -> np.ndarray:
     """
     Fill the elements after a specific value with a single value.
@@ -40,7 +32,9 @@ def fill_after(x: np.ndarray, val: Any = 1, fill: Any = 2) -> np.ndarray:
     return x
 
 
-def add_extra_columns_tree(d: MonitoringData) -> MonitoringData:
+def add_extra_columns_tree(
+    d: MonitoringData, na_col: Optional[np.ndarray] = None
+) -> MonitoringData:
     """
     Add error/death/recruitment columns to a tree gbh data.
 
@@ -51,9 +45,12 @@ def add_extra_columns_tree(d: MonitoringData) -> MonitoringData:
     ----------
     d : MonitoringData
         MonitoringData object of tree gbh data
+    na_col : numpy ndarray, optional
+        Boolean array of the gbh columns (in the order of years) to be removed as
+        they have no valid values. Computed from `d` if not given; given when `d`
+        is a block of rows of a larger data
 
     """
-    d = copy.deepcopy(d)
     gbh_mat, gbh_cn = d.select(regex="^gbh[0-9]{2}$", return_column_names=True)
 
     yrs = np.vectorize(retrive_year)(gbh_cn)
@@ -66,7 +63,8 @@ def add_extra_columns_tree(d: MonitoringData) -> MonitoringData:
         lambda x: isvalid(x, "^nd|^cd|^vi|^vn", return_value=True)
     )(gbh_mat.copy())
 
-    na_col = np.isnan(gbh_mat_c).all(axis=0)
+    if na_col is None:
+        na_col = np.isnan(gbh_mat_c).all(axis=0)
     gbh_mat = gbh_mat[:, ~na_col]
     gbh_mat_c = gbh_mat_c[:, ~na_col]
     gbh_cn = gbh_cn[~na_col]
@@ -132,18 +130,25 @@ def add_extra_columns_tree(d: MonitoringData) -> MonitoringData:
 
     # 元の計測値を全て、nd等の記号を取り除いた数値のみのデータに置換
     # NOTE: np.nanが文字列の'nan'になるので注意
-    d.data[0] = [re.sub("^(gbh[0-9]{2})$", r"\1_orig", i) for i in d.columns]
+    # 元データの値は共有し（コピーしない）、列名と追加する列だけを新しく作る
+    columns = [re.sub("^(gbh[0-9]{2})$", r"\1_orig", i) for i in d.columns]
+    d = MonitoringData(
+        d.values,
+        columns=np.array(columns),
+        plot_id=d.plot_id,
+        data_type=d.data_type,
+        metadata=d.metadata,
+        comments=d.comments,
+    )
 
     # Add error, dead, recruit columns to data
     error_cn = [i.replace("gbh", "error") for i in gbh_cn]
     dead_cn = [i.replace("gbh", "dl") for i in gbh_cn]
     recr_cn = [i.replace("gbh", "rec") for i in gbh_cn]
-    error = np.vstack((error_cn, error))
-    dead = np.vstack((dead_cn, dead))
-    recr = np.vstack((recr_cn, recr))
-    gbh = np.vstack((gbh_cn, gbh_mat_c))
-
-    d.data = np.hstack((d.data, gbh, error, dead, recr))
+    d.append_columns(
+        np.concatenate((gbh_cn, error_cn, dead_cn, recr_cn)),
+        np.hstack([x.astype(str) for x in (gbh_mat_c, error, dead, recr)]),
+    )
     return d
 
 
@@ -168,7 +173,7 @@ def add_taxon_info(
         logger.warning("Input data is not tree data or seed data")
         return d
 
-    global dict_sp
+    dict_sp = suppl.species_dict()
 
     class_cols = ["genus", "family", "order", "family_jp", "order_jp"]
     if scientific_name and classification:
@@ -196,5 +201,5 @@ def add_taxon_info(
             msg = "{} not found in the species dictionary".format(i)
             logger.warning(msg)
 
-    d.data = np.hstack((d.data, np.vstack((cols, add_cols))))
+    d.append_columns(cols, np.array(add_cols, dtype=str).reshape(-1, len(cols)))
     return d
@@ -0,0 +1,112 @@
+"""
+Benchmark of cleaning and exporting data as csv.
+
+Compares the former `clean_data` (four np.vectorize passes over the whole array,
+with exception-driven float detection) and `data_to_csv` with the current ones,
+which clean each unique value once and write the rows in chunks, on a synthetic
+tree file. The csv files written by both are compared byte by byte.
+
+    cd backend && python -m benchmarks.clean_data [-n 20000] [--encoding cp932]
+"""
+import argparse
+import csv
+import filecmp
+import os
+import re
+import tempfile
+import time
+import unicodedata
+
+import numpy as np
+
+from app.base import clean_data, clean_value, data_to_csv
+from benchmarks import synthetic
+
+
+def clean_float_before(x: str) -> str:
+    """`clean_float` before the numeric strings were detected with regex."""
+    if x == "nan":
+        return x
+    try:
+        int(x)
+    except ValueError:
+        try:
+            return str(np.float32(x))
+        except ValueError:
+            return str(x)
+    else:
+        return str(x)
+
+
+def clean_data_before(data: np.ndarray) -> np.ndarray:
+    """`clean_data` before cleaning the unique values only."""
+    data = np.vectorize(lambda x: x.strip())(data)
+    data = np.vectorize(lambda x: unicodedata.normalize("NFKC", x))(data)
+    data = np.vectorize(lambda x: clean_float_before(str(x)))(data)
+    data = np.vectorize(lambda x: re.sub("\r\n|\n|\r|\t|\x0b|\x0c", "", x))(data)
+    return data
+
+
+def data_to_csv_before(data: np.ndarray, outpath: str, encoding: str = "utf-8"):
+    """`data_to_csv(cleaning=True)` before writing the rows in chunks."""
+    data = clean_data_before(data)
+    data = np.where(data == "nan", "", data)
+    with open(outpath, "w", newline="", encoding=encoding) as f:
+        writer = csv.writer(f, lineterminator=os.linesep)
+        if encoding == "utf-8":
+            for row in data:
+                writer.writerow(row)
+        else:
+            for row in data:
+                try:
+                    writer.writerow([i.encode(encoding).decode(encoding) for i in row])
+                except UnicodeEncodeError:
+                    writer.writerow(
+                        [i.encode(encoding, "replace").decode(encoding) for i in row]
+                    )
+
+
+def timeit(f, *args, repeat: int = 3):
+    best = np.inf
+    for _ in range(repeat):
+        clean_value.cache_clear()
+        start = time.perf_counter()
+        res = f(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=20000, help="number of stems")
+    parser.add_argument("--encoding", default="utf-8", help="encoding of csv files")
+    args = parser.parse_args()
+
+    d = synthetic.tree(n_stem=args.n, years=list(range(2004, 2020, 2)))
+    # 全角文字・空白・改行・表記の異なる数値・cp932にない文字を混入
+    data = d.data.astype("<U32")
+    data[1::7, 2] = np.char.add(data[1::7, 2], " \n")
+    data[1::5, 7] = np.char.add(data[1::5, 7], "0")
+    data[1::11, 5] = "１２．５"
+    data[1::13, 6] = "nan"
+    data[1::17, 3] = "ブナ\U0001f332"
+    print("data: {} x {}".format(*data.shape))
+
+    t_before, res_before = timeit(clean_data_before, data, repeat=1)
+    t_after, res_after = timeit(clean_data, data)
+    assert np.array_equal(res_before, res_after)
+    print("clean_data  : {:8.2f} s -> {:8.2f} s".format(t_before, t_after))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path_before = os.path.join(tmpdir, "before.csv")
+        path_after = os.path.join(tmpdir, "after.csv")
+        t_before, _ = timeit(data_to_csv_before, data, path_before, args.encoding)
+        t_after, _ = timeit(
+            lambda: data_to_csv(data, path_after, cleaning=True, encoding=args.encoding)
+        )
+        assert filecmp.cmp(path_before, path_after, shallow=False)
+    print("data_to_csv : {:8.2f} s -> {:8.2f} s".format(t_before, t_after))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""
+Benchmark of the cold-start import time of the API process.
+
+Runs `python -X importtime -c "import app.api.main"` in fresh interpreters and
+compares it with an eager start-up that also imports the scientific stack
+(scipy/scikit-learn) up front, as app.summarise did before these were loaded
+lazily.
+
+    cd backend && python -m benchmarks.import_time [-n 5]
+"""
+import argparse
+import re
+import statistics
+import subprocess
+import sys
+
+HEAVY_MODULES = ["numpy", "openpyxl", "scipy", "sklearn"]
+
+EAGER_IMPORTS = [
+    "import scipy.interpolate, scipy.optimize, scipy.special",
+    "import sklearn.experimental.enable_iterative_imputer, sklearn.impute",
+]
+
+
+def cold_start(code: str):
+    """Return the cumulative import time (s) and the loaded heavy modules."""
+    check = "import sys; print([m for m in {!r} if m in sys.modules])"
+    code = code + "\n" + check.format(HEAVY_MODULES)
+    res = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    r = re.compile(r"^import time:\s+\d+ \|\s+(\d+) \| (\S+)$")
+    total = 0
+    for line in res.stderr.splitlines():
+        m = r.match(line)
+        # top-level imports are not indented
+        if m:
+            total += int(m.group(1))
+    return total / 10**6, res.stdout.strip()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=5, help="number of runs")
+    args = parser.parse_args()
+
+    scenarios = {
+        "lazy (current)": "import app.api.main",
+        "eager (before)": "\n".join(EAGER_IMPORTS + ["import app.api.main"]),
+    }
+    for name, code in scenarios.items():
+        times = []
+        for _ in range(args.n):
+            t, loaded = cold_start(code)
+            times.append(t)
+        msg = "{:15s}: median {:.3f} s, min {:.3f} s; loaded {}"
+        print(msg.format(name, statistics.median(times), min(times), loaded))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+"""
+Benchmark of the annual apportioning of litter collections.
+
+Compares the former per-year loop with `split_by_year` + one grouped reduction
+on 20 years x 50 traps x monthly collections, and times the whole
+`LitterSummary` pipeline.
+
+    cd backend && python -m benchmarks.litter_annual
+"""
+import time
+
+import numpy as np
+
+from app.groupby import GroupBy
+from app.summarise import LitterSummary, split_by_year
+from benchmarks import synthetic
+
+
+def annual_loop(t: np.ndarray, wdry_daily: np.ndarray):
+    """Per-year loop used by LitterSummary.annual before vectorization."""
+    t_year = t.astype("datetime64[Y]").astype(str).astype(int)
+    wdry_cum = np.empty(shape=(0, wdry_daily.shape[1]))
+    inst_period = np.array([])
+    for yr in np.unique(t_year):
+        m = np.any(t_year == yr, axis=1)
+        t_s = t[m]
+        yr_diff = t_year[m] - yr
+        t_s[np.where(yr_diff == -1)] = "{}-12-31".format(yr - 1)
+        t_s[np.where(yr_diff == 1)] = "{}-12-31".format(yr)
+        wdry_cum_s = np.nansum(wdry_daily[m] * np.diff(t_s).astype(int), axis=0)
+        wdry_cum = np.vstack((wdry_cum, wdry_cum_s))
+        inst_period = np.append(inst_period, np.diff(t_s).astype(int).sum())
+    return wdry_cum, inst_period
+
+
+def annual_vectorized(t: np.ndarray, wdry_daily: np.ndarray):
+    row, year, t1, t2 = split_by_year(t[:, 0], t[:, 1])
+    days = (t2 - t1).astype(int)
+    res = np.nan_to_num(
+        GroupBy(year).sum(np.c_[wdry_daily[row] * days[:, None], days])
+    )
+    return res[:, :-1], res[:, -1]
+
+
+def timeit(f, *args, repeat: int = 5):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = f(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+def main():
+    d = synthetic.litter(n_year=20, n_trap=50)
+    t = d.select(["s_date1", "s_date2"])
+    t = np.array(
+        [["{}-{}-{}".format(i[:4], i[4:6], i[6:]) for i in r] for r in t]
+    ).astype("datetime64[D]")
+    wdry = np.random.default_rng(0).lognormal(size=(len(t), 3))
+    wdry_daily = (wdry.T / np.diff(t).astype(int)[:, 0]).T
+    print("collections (trap x period): {}".format(len(t)))
+
+    t_loop, res_loop = timeit(annual_loop, t, wdry_daily)
+    t_vec, res_vec = timeit(annual_vectorized, t, wdry_daily)
+    assert all(np.allclose(a, b) for a, b in zip(res_loop, res_vec))
+    print("per-year loop : {:8.2f} ms".format(t_loop * 1000))
+    print("vectorized    : {:8.2f} ms".format(t_vec * 1000))
+
+    start = time.perf_counter()
+    ls = LitterSummary(d)
+    n_each = len(list(ls.each_sampling()))
+    n_annual = len(list(ls.annual()))
+    elapsed = time.perf_counter() - start
+    msg = "LitterSummary : {:8.2f} ms ({} samplings, {} years)"
+    print(msg.format(elapsed * 1000, n_each, n_annual))
+
+
+if __name__ == "__main__":
+    main()
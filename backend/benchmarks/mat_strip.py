@@ -0,0 +1,106 @@
+"""
+Benchmark of stripping blank cells and comment rows from a sheet.
+
+Compares the former `mat_strip` and `split_comments` (per-cell np.vectorize and
+list popping, and three strips in `read_data`) with the single-pass version on
+a tree sheet padded with trailing empty columns and rows, like those returned by
+openpyxl for sheets with formatted but empty cells.
+
+    cd backend && python -m benchmarks.mat_strip [-n 5000] [--pad-cols 2000]
+"""
+import argparse
+import time
+from typing import Any, List
+
+import numpy as np
+
+from app.base import split_comments
+from benchmarks import synthetic
+
+
+def mat_strip_before(
+    mat: np.ndarray, strip: Any = "", remove_all_empty_row: bool = True
+) -> np.ndarray:
+    """`mat_strip` before vectorization."""
+    match = np.vectorize(lambda x: True if x == strip else False)(mat)
+    if not match.any():
+        return mat
+    elif match.all():
+        return np.array([], mat.dtype)
+
+    x = match.all(axis=0).tolist()
+    y = match.all(axis=1).tolist()
+
+    def strip_index(z: List[bool], right: bool = False):
+        z = z.copy()
+        pop_i = -1 if right else 1
+        i = 0
+        while True:
+            if not z.pop(pop_i):
+                break
+            i += 1
+        return i
+
+    mat = mat[:, slice(strip_index(x), len(x) - strip_index(x, True))]
+
+    if remove_all_empty_row:
+        mat = mat[~np.array(y), :]
+    else:
+        mat = mat[slice(strip_index(y), len(y) - strip_index(y, True)), :]
+
+    return mat
+
+
+def split_comments_before(data: np.ndarray, comment_chr: str = "#"):
+    """`mat_strip` and `split_comments` as called by `read_data` before."""
+    data = mat_strip_before(data)
+    com_rows = np.vectorize(lambda x: str(x).startswith(comment_chr))(data[:, 0])
+    comments = data[com_rows]
+    data = data[~com_rows]
+    if comments.size > 0:
+        data = mat_strip_before(data, strip="")
+        comments = mat_strip_before(comments, strip="")
+    return data, comments
+
+
+def sheet(n_stem: int, pad_cols: int, pad_rows: int) -> np.ndarray:
+    d = synthetic.tree(n_stem=n_stem, years=list(range(2004, 2020, 2)))
+    n_col = d.data.shape[1]
+    comments = np.full((len(d.metadata), n_col), "", dtype=d.data.dtype)
+    comments[:, 0] = "#"
+    comments[:, 1] = list(d.metadata)
+    comments[:, 3] = list(d.metadata.values())
+    mat = np.vstack((comments, d.data))
+    mat = np.hstack((mat, np.full((len(mat), pad_cols), "", dtype=mat.dtype)))
+    return np.vstack((mat, np.full((pad_rows, mat.shape[1]), "", dtype=mat.dtype)))
+
+
+def timeit(f, *args, repeat: int = 3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = f(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=5000, help="number of stems")
+    parser.add_argument("--pad-cols", type=int, default=2000, help="empty columns")
+    parser.add_argument("--pad-rows", type=int, default=1000, help="empty rows")
+    args = parser.parse_args()
+
+    mat = sheet(args.n, args.pad_cols, args.pad_rows)
+    print("sheet: {} x {}".format(*mat.shape))
+
+    t_before, res_before = timeit(split_comments_before, mat, repeat=1)
+    t_after, res_after = timeit(split_comments, mat)
+    for x, y in zip(res_before, res_after):
+        assert np.array_equal(x, y)
+    print("before     : {:8.1f} ms".format(t_before * 1000))
+    print("single pass: {:8.1f} ms".format(t_after * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Benchmark of the fixed per-file overhead of reading small data files.
+
+Compares the former `get_metadata` (an equality scan of the comment block per
+key) and data type guessing (re.match of every pattern over all column names)
+with the single-pass versions on small litter and seed files, as in a bulk
+re-ingestion of many plots.
+
+    cd backend && python -m benchmarks.metadata [-n 300]
+"""
+import argparse
+import re
+import time
+
+import numpy as np
+
+from app.base import (
+    DATA_TYPE_COLUMNS,
+    METADATA_KEYS,
+    get_metadata,
+    guess_data_type,
+    read_table,
+    split_comments,
+)
+from benchmarks import synthetic
+
+
+def get_metadata_before(comments: np.ndarray):
+    """`get_metadata` before the single-pass scan."""
+    metadata = {}
+    for key in METADATA_KEYS:
+        match = list(zip(*np.where(comments == key)))
+        if match:
+            i, j = match[0]
+            metadata[key] = comments[i, j + 2]
+    return metadata
+
+
+def guess_data_type_before(columns: np.ndarray):
+    """`MonitoringData.__guess_data_type` before the patterns were compiled."""
+    for data_type, cols in DATA_TYPE_COLUMNS.items():
+        if all([any(filter(lambda x: re.match(i, x), columns)) for i in cols]):
+            return data_type
+    return "other"
+
+
+def timeit(f, args_list, repeat: int = 5):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = [f(*args) for args in args_list]
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=300, help="number of files")
+    args = parser.parse_args()
+
+    files = []
+    for i in range(args.n):
+        if i % 2:
+            d = synthetic.litter(n_year=1, n_trap=25, seed=i)
+        else:
+            d = synthetic.seed(n_year=1, n_trap=25, seed=i)
+        files.append(split_comments(read_table(synthetic.to_csv(d))))
+    print("{} files".format(args.n))
+
+    comments = [(c,) for _, c in files]
+    columns = [(d[0],) for d, _ in files]
+    for name, before, after, args_list in [
+        ("get_metadata", get_metadata_before, get_metadata, comments),
+        ("data type", guess_data_type_before, guess_data_type, columns),
+    ]:
+        t_before, res_before = timeit(before, args_list)
+        t_after, res_after = timeit(after, args_list)
+        assert res_before == res_after
+        msg = "{:12s}: {:8.1f} ms -> {:6.1f} ms"
+        print(msg.format(name, t_before * 1000, t_after * 1000))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Benchmark of slicing MonitoringData and appending columns.
+
+Compares the former ways of slicing rows (np.vstack of the header and the rows
+into a new object, guessing the data type again) and of appending columns
+(np.hstack of the whole data per column, and copy.deepcopy of the data in
+`add_extra_columns_tree`) with the views and column blocks of MonitoringData.
+
+    cd backend && python -m benchmarks.monitoring_data [-n 50000]
+"""
+import argparse
+import copy
+import time
+
+import numpy as np
+
+from app.base import MonitoringData
+from app.utils import add_extra_columns_tree
+from benchmarks import synthetic
+
+
+def slice_before(d: MonitoringData, key) -> MonitoringData:
+    """`MonitoringData.__getitem__` for rows before sharing the data."""
+    return MonitoringData(np.vstack((d.columns, d.values[key])), comments=d.comments)
+
+
+def append_before(d: MonitoringData, columns, values) -> np.ndarray:
+    """Appending columns one by one with `__setitem__` before column blocks."""
+    data = d.data
+    for j, key in enumerate(columns):
+        data = np.hstack((data, np.append(key, values[:, j])[:, None]))
+    return data
+
+
+def append_after(d: MonitoringData, columns, values) -> np.ndarray:
+    d = MonitoringData(**d.as_kwargs())
+    for j, key in enumerate(columns):
+        d.append_columns([key], values[:, j : (j + 1)])
+    return d.data
+
+
+def timeit(f, *args, repeat: int = 3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = f(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=50000, help="number of stems")
+    args = parser.parse_args()
+
+    d = synthetic.tree(n_stem=args.n, years=list(range(2004, 2020, 2)))
+    print("data: {} x {}".format(*d.data.shape))
+    msg = "{:24s}: {:8.1f} ms -> {:8.1f} ms"
+
+    keys = [slice(i, i + 1000) for i in range(0, args.n, 1000)]
+    t_before, res_before = timeit(lambda: [slice_before(d, k) for k in keys])
+    t_after, res_after = timeit(lambda: [d[k] for k in keys])
+    for x, y in zip(res_before, res_after):
+        assert np.array_equal(x.data, y.data)
+    name = "slice 1000 rows x {}".format(len(keys))
+    print(msg.format(name, 1000 * t_before, 1000 * t_after))
+
+    columns = ["x{:02d}".format(j) for j in range(32)]
+    values = np.random.default_rng(0).random((args.n, len(columns))).round(1)
+    values = values.astype(str)
+    t_before, res_before = timeit(append_before, d, columns, values)
+    t_after, res_after = timeit(append_after, d, columns, values)
+    assert np.array_equal(res_before, res_after)
+    print(msg.format("append 32 columns", 1000 * t_before, 1000 * t_after))
+
+    t_copy, _ = timeit(copy.deepcopy, d)
+    t_extra, _ = timeit(add_extra_columns_tree, d, repeat=1)
+    msg = "add_extra_columns_tree  : {:8.1f} ms (deepcopy dropped: {:.1f} ms)"
+    print(msg.format(1000 * t_extra, 1000 * t_copy))
+
+
+if __name__ == "__main__":
+    main()
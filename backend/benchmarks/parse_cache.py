@@ -0,0 +1,71 @@
+"""
+Benchmark of the on-disk cache of parsed data files.
+
+Writes a synthetic tree sheet to xlsx and compares `read_data` without a cache
+(parsing the whole sheet each time, as before) with a warm `ParseCache`, which
+memory-maps the parsed matrix saved at the first read.
+
+    cd backend && python -m benchmarks.parse_cache [-n 20000]
+"""
+import argparse
+import tempfile
+import time
+from io import BytesIO
+
+import numpy as np
+from openpyxl import Workbook
+
+from app.base import ParseCache, read_data
+from benchmarks import synthetic
+
+
+def to_xlsx(n_stem: int) -> bytes:
+    d = synthetic.tree(n_stem=n_stem, years=list(range(2004, 2020, 2)))
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    for k, v in d.metadata.items():
+        ws.append(["#", k, ":", v])
+    for row in d.data.tolist():
+        ws.append(row)
+    f = BytesIO()
+    wb.save(f)
+    return f.getvalue()
+
+
+def timeit(f, *args, repeat: int = 3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = f(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=20000, help="number of stems")
+    args = parser.parse_args()
+
+    raw = to_xlsx(args.n)
+    print("xlsx: {:.1f} MB, {} stems".format(len(raw) / 2**20, args.n))
+
+    with tempfile.TemporaryDirectory() as tmpdir:
+        cache = ParseCache(tmpdir)
+        res = {}
+        elapsed, res["no cache"] = timeit(read_data, raw, repeat=1)
+        print("{:10s}: {:8.3f} s".format("no cache", elapsed))
+        elapsed, _ = timeit(lambda x: read_data(x, cache=cache), raw, repeat=1)
+        print("{:10s}: {:8.3f} s".format("cold", elapsed))
+        elapsed, res["warm"] = timeit(lambda x: read_data(x, cache=cache), raw)
+        print("{:10s}: {:8.3f} s".format("warm", elapsed))
+        print("hits {}, misses {}".format(cache.hits, cache.misses))
+
+        x, y = res["no cache"], res["warm"]
+        assert np.array_equal(x.data, y.data)
+        assert np.array_equal(x.comments, y.comments)
+        assert (x.plot_id, x.data_type) == (y.plot_id, y.data_type)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+"""
+Benchmark of reading csv files.
+
+Compares the former `read_csv` (decode, splitlines and np.array of the nested
+rows) with the streaming parser on a synthetic tree GBH file, and reports the
+peak traced memory of each.
+
+    cd backend && python -m benchmarks.read_csv [--mb 25]
+"""
+import argparse
+import csv
+import time
+import tracemalloc
+
+import numpy as np
+
+from app.base import read_csv
+from benchmarks import synthetic
+
+# 1万本・8回調査のcsvの大きさ（MB）
+MB_PER_10K_STEMS = 1.45
+
+
+def read_csv_before(file: bytes, encoding: str = "utf-8") -> np.ndarray:
+    """`read_csv` for bytes before the streaming parser."""
+    lines = file.decode(encoding=encoding).splitlines()
+    reader = csv.reader(lines)
+    return np.array([i for i in reader])
+
+
+def measure(f, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    res = f(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--mb", type=float, default=25, help="file size in MB")
+    args = parser.parse_args()
+
+    n_stem = int(args.mb / MB_PER_10K_STEMS * 10000)
+    d = synthetic.tree(n_stem=n_stem, years=list(range(2004, 2020, 2)))
+    raw = synthetic.to_csv(d)
+    del d
+    print("tree csv: {:.1f} MB, {} stems".format(len(raw) / 2**20, n_stem))
+
+    res = {}
+    for name, f in [("before", read_csv_before), ("streaming", read_csv)]:
+        elapsed, peak, res[name] = measure(f, raw)
+        msg = "{:10s}: {:7.2f} s, peak {:7.1f} MB"
+        print(msg.format(name, elapsed, peak / 2**20))
+    assert np.array_equal(res["before"], res["streaming"])
+
+
+if __name__ == "__main__":
+    main()
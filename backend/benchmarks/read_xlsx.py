@@ -0,0 +1,83 @@
+"""
+Benchmark of reading xlsx sheets with formatted empty cells.
+
+Writes a synthetic tree sheet whose rows end with a formatted empty cell far to
+the right, followed by formatted empty rows, so that the sheet dimensions are
+much larger than the data. Compares the former `read_xlsx` (the whole dimensions
+into an object array and np.vectorize(str)) with the current one, which reads
+only the columns of the header, through `split_comments` as in `read_data`.
+
+    cd backend && python -m benchmarks.read_xlsx [-n 5000] [--pad-cols 1000]
+"""
+import argparse
+import time
+from io import BytesIO
+
+import numpy as np
+from openpyxl import Workbook, load_workbook
+from openpyxl.styles import PatternFill
+
+from app.base import read_xlsx, split_comments
+from benchmarks import synthetic
+
+
+def read_xlsx_before(file: bytes) -> np.ndarray:
+    """`read_xlsx` for bytes before reading the used range only."""
+    wb = load_workbook(BytesIO(file), read_only=True, data_only=True)
+    ws = wb[wb.sheetnames[0]]
+    data = np.array([[cell.value for cell in row] for row in ws.iter_rows()])
+    data = np.vectorize(lambda x: str(x) if x is not None else "")(data)
+    wb.close()
+    return data
+
+
+def to_xlsx(n_stem: int, pad_cols: int, pad_rows: int) -> bytes:
+    d = synthetic.tree(n_stem=n_stem, years=list(range(2004, 2020, 2)))
+    wb = Workbook()
+    ws = wb.active
+    ws.title = "Data"
+    fill = PatternFill("solid", fgColor="FFFF00")
+    for k, v in d.metadata.items():
+        ws.append(["#", k, ":", v])
+    for row in d.data.tolist():
+        ws.append(row)
+    for i in range(1, ws.max_row + pad_rows + 1):
+        ws.cell(row=i, column=pad_cols).fill = fill
+    f = BytesIO()
+    wb.save(f)
+    return f.getvalue()
+
+
+def timeit(f, *args, repeat: int = 3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = f(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=5000, help="number of stems")
+    parser.add_argument("--pad-cols", type=int, default=1000, help="sheet width")
+    parser.add_argument("--pad-rows", type=int, default=1000, help="empty rows")
+    args = parser.parse_args()
+
+    raw = to_xlsx(args.n, args.pad_cols, args.pad_rows)
+    print("xlsx: {:.1f} MB, {} stems".format(len(raw) / 2**20, args.n))
+
+    scenarios = {
+        "before": lambda x: split_comments(read_xlsx_before(x)),
+        "used range": lambda x: split_comments(read_xlsx(x, header=True)),
+    }
+    res = {}
+    for name, f in scenarios.items():
+        elapsed, res[name] = timeit(f, raw, repeat=1 if name == "before" else 3)
+        print("{:10s}: {:8.2f} s".format(name, elapsed))
+    for x, y in zip(res["before"], res["used range"]):
+        assert np.array_equal(x, y)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""Synthetic Moni-Sen datasets for benchmarks."""
+import csv
+import io
+from datetime import date, timedelta
+from typing import List, Optional
+
+import numpy as np
+
+from app.base import MonitoringData
+
+SPECIES = [
+    "ブナ",
+    "ミズナラ",
+    "イタヤカエデ",
+    "ハウチワカエデ",
+    "コハウチワカエデ",
+    "ホオノキ",
+    "ウワミズザクラ",
+    "アオダモ",
+    "コシアブラ",
+    "リョウブ",
+    "ヤマモミジ",
+    "ナナカマド",
+    "オオカメノキ",
+    "タムシバ",
+    "ハリギリ",
+    "シナノキ",
+    "サワグルミ",
+    "トチノキ",
+    "カツラ",
+    "スギ",
+]
+
+
+def _metadata(plot_id: str, n_trap: int):
+    return {
+        "DATA CREATED": "20200101",
+        "DATA TITLE": "Synthetic data at Benchmark ({})".format(plot_id),
+        "SITE NAME": "ベンチマーク",
+        "PLOT NAME": "-",
+        "PLOT ID": plot_id,
+        "PLOT SIZE": "1 ha",
+        "NO. OF TRAPS": str(n_trap),
+    }
+
+
+def collection_dates(year: int, rng: np.random.Generator) -> List[date]:
+    """Roughly monthly collection dates; the last collection is in the next year."""
+    d = date(year, 1, 1) + timedelta(days=int(rng.integers(5, 15)))
+    dates = [d]
+    while d.year == year:
+        d = d + timedelta(days=int(rng.integers(25, 35)))
+        dates.append(d)
+    return dates
+
+
+def litter(
+    n_year: int = 20,
+    n_trap: int = 50,
+    plot_id: str = "AI-BC1",
+    seed: Optional[int] = 0,
+) -> MonitoringData:
+    """Litter data of `n_year` years x `n_trap` traps x monthly collections."""
+    rng = np.random.default_rng(seed)
+    header = ["trap_id", "s_date1", "s_date2", "trap_area"]
+    header += ["wdry_leaf", "wdry_branch", "wdry_rep", "w_leaf", "w_branch", "w_rep"]
+    header += ["note"]
+    rows = []
+    for year in range(2004, 2004 + n_year):
+        dates = collection_dates(year, rng)
+        for d1, d2 in zip(dates[:-1], dates[1:]):
+            s_date1, s_date2 = d1.strftime("%Y%m%d"), d2.strftime("%Y%m%d")
+            meas = rng.lognormal(1.0, 1.0, size=(n_trap, 6)).round(3).astype(str)
+            meas[rng.random(meas.shape) < 0.02] = "NA"
+            meas[rng.random(meas.shape) < 0.02] = "-"
+            for i in range(n_trap):
+                row = [str(i + 1), s_date1, s_date2, "0.5"] + list(meas[i])
+                rows.append(row + [""])
+    return MonitoringData(
+        np.array([header] + rows),
+        plot_id=plot_id,
+        metadata=_metadata(plot_id, n_trap),
+    )
+
+
+def seed(
+    n_year: int = 20,
+    n_trap: int = 50,
+    n_sp: int = 20,
+    plot_id: str = "AI-BC1",
+    seed: Optional[int] = 0,
+) -> MonitoringData:
+    """Seed data with up to three species per trap and collection."""
+    rng = np.random.default_rng(seed)
+    species = SPECIES[:n_sp]
+    header = ["trap_id", "s_date1", "s_date2", "trap_area", "spc", "status", "form"]
+    header += ["number", "wdry", "note"]
+    status = ["健全", "虫害", "未熟", "区別なし"]
+    form = ["種子", "果実", "区別なし"]
+    rows = []
+    for year in range(2004, 2004 + n_year):
+        dates = collection_dates(year, rng)
+        for d1, d2 in zip(dates[:-1], dates[1:]):
+            s_date1, s_date2 = d1.strftime("%Y%m%d"), d2.strftime("%Y%m%d")
+            for i in range(n_trap):
+                for sp in rng.choice(species, int(rng.integers(0, 4)), replace=False):
+                    n = int(rng.integers(1, 50))
+                    w = "{:.4f}".format(n * rng.lognormal(-2.0, 0.3))
+                    r = rng.random()
+                    number = "NA" if r < 0.05 or r > 0.98 else str(n)
+                    wdry = "NA" if 0.05 <= r < 0.1 or r > 0.98 else w
+                    rows.append(
+                        [str(i + 1), s_date1, s_date2, "0.5", sp]
+                        + [rng.choice(status), rng.choice(form), number, wdry, ""]
+                    )
+    return MonitoringData(
+        np.array([header] + rows),
+        plot_id=plot_id,
+        metadata=_metadata(plot_id, n_trap),
+    )
+
+
+def tree(
+    n_stem: int = 50000,
+    years: List[int] = [2004, 2009, 2014, 2019],
+    n_sp: int = 20,
+    plot_id: str = "AI-BC1",
+    seed: Optional[int] = 0,
+) -> MonitoringData:
+    """Tree GBH data of `n_stem` stems censused in `years`."""
+    rng = np.random.default_rng(seed)
+    species = np.array(SPECIES[:n_sp])
+    yy = ["{:02d}".format(y % 100) for y in years]
+    header = ["mesh_xcord", "mesh_ycord", "tag_no", "indv_no", "spc_japan"]
+    header += ["stem_xcord", "stem_ycord"]
+    header += ["gbh" + y for y in yy] + ["s_date" + y for y in yy] + ["note"]
+
+    k = len(years)
+    gbh = rng.lognormal(3.5, 0.6, size=(n_stem, 1)) + np.cumsum(
+        rng.normal(2.0, 1.5, size=(n_stem, k)), axis=1
+    )
+    gbh = np.maximum(gbh, 5.0).round(1).astype(str).astype("<U16")
+    first = rng.integers(0, k, size=n_stem)
+    dead = rng.integers(1, k + 3, size=n_stem) + first
+    col = np.arange(k)
+    gbh[col < first[:, None]] = "na"
+    gbh[col > dead[:, None]] = "na"
+    gbh[col == dead[:, None]] = "d"
+    r = rng.random(gbh.shape)
+    gbh[r < 0.01] = np.char.add("nd", gbh[r < 0.01])
+    gbh[(r >= 0.01) & (r < 0.012)] = "xx"
+
+    dates = np.array(
+        [
+            [
+                "{}{:02d}{:02d}".format(y, m, d)
+                for y, m, d in zip(
+                    [year] * n_stem,
+                    rng.integers(8, 11, size=n_stem),
+                    rng.integers(1, 29, size=n_stem),
+                )
+            ]
+            for year in years
+        ]
+    ).T
+
+    tag = (np.arange(n_stem) + 1).astype(str)
+    values = np.c_[
+        (rng.integers(0, 10, size=n_stem) * 10).astype(str),
+        (rng.integers(0, 10, size=n_stem) * 10).astype(str),
+        tag,
+        tag,
+        rng.choice(species, n_stem),
+        (rng.random(n_stem) * 10).round(1).astype(str),
+        (rng.random(n_stem) * 10).round(1).astype(str),
+        gbh,
+        dates,
+        np.full(n_stem, ""),
+    ]
+    return MonitoringData(
+        np.vstack((header, values)),
+        plot_id=plot_id,
+        metadata=_metadata(plot_id, 0),
+    )
+
+
+def to_csv(d: MonitoringData) -> bytes:
+    """Return the data as the contents of a csv file with metadata comment lines."""
+    f = io.StringIO()
+    writer = csv.writer(f, lineterminator="\n")
+    pad = [""] * (d.data.shape[1] - 4)
+    for k, v in d.metadata.items():
+        writer.writerow(["#", k, ":", v] + pad)
+    writer.writerows(d.data)
+    return f.getvalue().encode("utf-8")
@@ -0,0 +1,131 @@
+"""
+Benchmark of the GBH growth checks of tree data.
+
+Compares the former row-by-row loops of `CheckDataTree.find_anomaly` and
+`CheckDataTree.check_values_nd` with the whole-matrix versions on a 50k-stem
+file, and times the whole `check_data`.
+
+    cd backend && python -m benchmarks.tree_anomaly [-n 50000]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from app.datacheck import (
+    CheckDataTree,
+    ErrDat,
+    check_data,
+    find_pattern,
+    isvalid,
+    retrive_year,
+)
+from benchmarks import synthetic
+
+
+def find_anomaly_loop(cd: CheckDataTree):
+    """Row-by-row loop used by CheckDataTree.find_anomaly before vectorization."""
+    errors = []
+    meas = cd.derived("meas_gbh")
+    meas_c = np.vectorize(lambda x: isvalid(x, return_value=True))(meas)
+    pat_vc = r"^vi|^vn|^cd"
+    match_vc = np.vectorize(lambda x: find_pattern(x, pat_vc))(meas)
+    for i, row in enumerate(meas_c):
+        index_notnull = np.where(~np.isnan(row))[0]
+        if len(index_notnull) == 0:
+            continue
+        gbhdiff = np.diff(row[index_notnull])
+        yrdiff = np.diff(np.vectorize(retrive_year)(cd.col_meas[index_notnull]))
+        excess = gbhdiff > yrdiff * 2.5 + 3.8
+        minus = gbhdiff < -3.1
+        for index, msg in [
+            (index_notnull[1:][excess], "成長量が基準値より大きい。測定ミス？"),
+            (index_notnull[1:][minus], "成長量が基準値より小さい。測定ミス？"),
+        ]:
+            errors.extend(
+                [
+                    ErrDat(cd.plot_id, cd.rec_id[i], cd.col_meas[j], msg)
+                    for j in index
+                    if not match_vc[i, j - 1]
+                ]
+            )
+    return errors
+
+
+def check_values_nd_loop(cd: CheckDataTree):
+    """Row-by-row loop used by CheckDataTree.check_values_nd before vectorization."""
+    pat_ndxx = r"^nd\s?([0-9]+[.]?[0-9]*)"
+    meas = cd.derived("meas_gbh")
+    match_ndxx = np.vectorize(lambda x: find_pattern(x, pat_ndxx))(meas)
+    meas_c = np.vectorize(lambda x: isvalid(x, "^nd", return_value=True))(meas)
+    msg = "誤って「nd: 測定間違い」となっている可能性あり"
+    errors = []
+    for i, row in enumerate(meas_c):
+        if any(match_ndxx[i]):
+            index_notnull = np.where(~np.isnan(row))[0]
+            if len(index_notnull) == 0:
+                continue
+            gbhdiff = np.diff(row[index_notnull])
+            yrdiff = np.diff(np.vectorize(retrive_year)(cd.col_meas[index_notnull]))
+            in_range = (gbhdiff <= yrdiff * 2.5 + 3.8) & (gbhdiff >= -3.1)
+            for jj in np.where(match_ndxx[i][index_notnull][1:])[0]:
+                j = index_notnull[jj + 1]
+                if (j < (len(cd.col_meas) - 1)) and (jj < (len(in_range) - 1)):
+                    if all(in_range[jj : (jj + 2)]):
+                        errors.append(
+                            ErrDat(cd.plot_id, cd.rec_id[i], cd.col_meas[j], msg)
+                        )
+    return errors
+
+
+def timeit(f, *args, repeat: int = 3):
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = f(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, res
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=50000, help="number of stems")
+    args = parser.parse_args()
+
+    d = synthetic.tree(n_stem=args.n, years=[2004, 2006, 2009, 2014, 2019])
+    # 成長量の異常値・誤ったnd・cd/viを混入
+    rng = np.random.default_rng(1)
+    gbh = d.data[1:, 7:12].astype("<U16")
+    noise = (rng.random(gbh.shape) * 100).astype(int)
+    gbh[noise == 0] = "150"
+    gbh[noise == 1] = "1.0"
+    gbh[noise == 2] = np.char.add("cd", gbh[noise == 2])
+    gbh[noise == 3] = np.char.add("nd", gbh[noise == 3])
+    d.data = d.data.astype("<U16")
+    d.data[1:, 7:12] = gbh
+    print("stems x censuses: {} x {}".format(*gbh.shape))
+
+    cd = CheckDataTree(**d.as_kwargs())
+    cd.derived("meas_gbh")
+    for name, loop in [
+        ("find_anomaly", find_anomaly_loop),
+        ("check_values_nd", check_values_nd_loop),
+    ]:
+        t_loop, res_loop = timeit(loop, cd)
+        t_vec, res_vec = timeit(getattr(cd, name))
+        assert res_loop == res_vec
+        msg = "{:16s}: loop {:8.1f} ms, vectorized {:8.1f} ms ({} errors)"
+        print(msg.format(name, t_loop * 1000, t_vec * 1000, len(res_vec)))
+
+    timings = {}
+    start = time.perf_counter()
+    errors = check_data(d, timings=timings)
+    elapsed = time.perf_counter() - start
+    msg = "check_data      : {:8.1f} ms ({} errors)"
+    print(msg.format(elapsed * 1000, len(errors)))
+    for name, t in sorted(timings.items(), key=lambda x: -x[1])[:5]:
+        print("  {:30s} {:8.1f} ms".format(name, t * 1000))
+
+
+if __name__ == "__main__":
+    main()
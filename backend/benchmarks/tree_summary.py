@@ -0,0 +1,70 @@
+"""
+Benchmark of the chunked mode of the tree summaries.
+
+Runs `TreeSummary` on a synthetic tree file with all stems at once and in blocks
+of stems (`chunk_size`), and reports the time and the peak traced memory of each,
+checking that the summaries are the same.
+
+    cd backend && python -m benchmarks.tree_summary [-n 10000] [--chunk-size 1000]
+"""
+import argparse
+import math
+import time
+import tracemalloc
+
+from app.summarise import TreeSummary
+from benchmarks import synthetic
+
+
+def summaries(d, chunk_size: int):
+    ts = TreeSummary(d, chunk_size=chunk_size)
+    return {
+        "species_summary": list(ts.species_summary()),
+        "species_turnover": list(ts.species_turnover()),
+        "community_summary": list(ts.community_summary()),
+        "community_turnover": list(ts.community_turnover()),
+    }
+
+
+def measure(f, *args):
+    tracemalloc.start()
+    start = time.perf_counter()
+    res = f(*args)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, peak, res
+
+
+def isclose(x, y) -> bool:
+    if isinstance(x, str) or isinstance(y, str):
+        return str(x) == str(y)
+    if math.isnan(x) and math.isnan(y):
+        return True
+    return math.isclose(x, y, rel_tol=1e-9, abs_tol=1e-12)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("-n", type=int, default=10000, help="number of stems")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="block size")
+    args = parser.parse_args()
+
+    years = list(range(2004, 2020, 5))
+    d = synthetic.tree(n_stem=args.n, years=years)
+    print("stems x censuses: {} x {}".format(args.n, len(years)))
+
+    res = {}
+    for name, chunk_size in [("in-memory", 0), ("chunked", args.chunk_size)]:
+        elapsed, peak, res[name] = measure(summaries, d, chunk_size)
+        msg = "{:10s}: {:7.2f} s, peak {:7.1f} MB"
+        print(msg.format(name, elapsed, peak / 2**20))
+
+    for key, records in res["in-memory"].items():
+        assert len(records) == len(res["chunked"][key])
+        for x, y in zip(records, res["chunked"][key]):
+            assert all(isclose(x[k], y[k]) for k in x), key
+
+
+if __name__ == "__main__":
+    main()
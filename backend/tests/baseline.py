@@ -0,0 +1,116 @@
+"""Implementations before vectorization, used as references in the tests."""
+
+from typing import Dict, List
+
+import numpy as np
+
+
+def group_sum_before(x: np.ndarray, group_id: np.ndarray, remove_nan: bool = True):
+    x = np.array(x)
+    unq, idx = np.unique(group_id, return_inverse=True)
+
+    def f(x):
+        if remove_nan:
+            na = np.isnan(x)
+            idx_unq = np.unique(idx)
+            idx_unq_, idx_ = np.unique(idx[~na], return_inverse=True)
+            res = np.repeat(np.nan, len(idx_unq))
+            z = np.bincount(idx_, weights=x[~na])
+            for i, j in zip(idx_unq_, z):
+                res[i] = j
+            return res
+        else:
+            return np.bincount(idx, weights=x)
+
+    if len(x.shape) == 1:
+        return f(x), unq
+    return np.apply_along_axis(f, 0, x), unq
+
+
+def group_mean_before(x: np.ndarray, group_id: np.ndarray, remove_nan: bool = True):
+    x = np.array(x)
+    unq, idx = np.unique(group_id, return_inverse=True)
+
+    def f(x):
+        if remove_nan:
+            na = np.isnan(x)
+            idx_unq = np.unique(idx)
+            idx_unq_, idx_ = np.unique(idx[~na], return_inverse=True)
+            res = np.repeat(np.nan, len(idx_unq))
+            z = np.bincount(idx_, weights=x[~na]) / np.bincount(idx_)
+            for i, j in zip(idx_unq_, z):
+                res[i] = j
+            return res
+        else:
+            return np.bincount(idx, weights=x) / np.bincount(idx)
+
+    if len(x.shape) == 1:
+        return f(x), unq
+    return np.apply_along_axis(f, 0, x), unq
+
+
+def seed_annual_before(
+    each_sampling: List[Dict], exclude_short_inst_period: bool = False
+) -> List[Dict]:
+    """SeedSummary.annual before vectorization (without the species names)."""
+    x = np.array([list(i.values()) for i in each_sampling])
+
+    year = x[:, 0].astype(int)
+    inst_period = x[:, 3].astype(int)
+    sp = x[:, 4]
+    number = x[:, 8].astype("float64")
+    wdry = x[:, 9].astype("float64")
+    prop_viable = x[:, 10].astype("float64")
+
+    sp_year = np.array([i + ":" + str(j) for i, j in zip(sp, year)])
+    inst_period_sum, sp_year_uniq = group_sum_before(inst_period, sp_year)
+    number_sum, _ = group_sum_before(number, sp_year)
+    wdry_sum, _ = group_sum_before(wdry, sp_year)
+    sp_list, year_list = np.array([i.split(":") for i in sp_year_uniq]).T
+    year_list = year_list.astype(int)
+
+    prop_viable_sum = np.array([])
+    for i in sp_year_uniq:
+        n = number[sp_year == i]
+        p = prop_viable[sp_year == i]
+        if any(np.isfinite(n)) and np.any(np.isfinite(p)):
+            p_ = np.nansum(n * p) / np.nansum(n)
+        else:
+            p_ = np.nan
+        prop_viable_sum = np.append(prop_viable_sum, p_)
+
+    if exclude_short_inst_period:
+        short = np.where(
+            inst_period_sum < (np.median(inst_period_sum) * 0.8), True, False
+        )
+        inst_period_sum = inst_period_sum[~short]
+        year_list = year_list[~short]
+        sp_list = sp_list[~short]
+        wdry_sum = wdry_sum[~short]
+        number_sum = number_sum[~short]
+        prop_viable_sum = prop_viable_sum[~short]
+
+    t1 = np.array(
+        [x[year == i, 1].astype("datetime64[D]").min() for i in year_list]
+    ).astype("str")
+    t2 = np.array(
+        [x[year == i, 2].astype("datetime64[D]").max() for i in year_list]
+    ).astype("str")
+
+    # sort by dry mass
+    sp_wdry_sum = {k: v for v, k in zip(*group_sum_before(wdry_sum, sp_list))}
+    order = np.lexsort((-np.array([sp_wdry_sum[i] for i in sp_list]), year_list))
+
+    return [
+        {
+            "year": year_list[i],
+            "t1": t1[i],
+            "t2": t2[i],
+            "inst_period": inst_period_sum[i],
+            "species_jp": sp_list[i],
+            "number": np.round(number_sum[i], 8),
+            "wdry": np.round(wdry_sum[i], 8),
+            "prop_viable": np.round(prop_viable_sum[i], 8),
+        }
+        for i in order
+    ]
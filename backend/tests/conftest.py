@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# backend/ 直下の app, benchmarks を import できるようにする
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
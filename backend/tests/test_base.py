@@ -0,0 +1,87 @@
+import numpy as np
+import pytest
+
+from app.base import SNIFF_SIZE, ParseCache, detect_encoding, read_csv, read_data
+from benchmarks import synthetic
+from benchmarks.read_csv import read_csv_before
+
+
+@pytest.fixture(scope="module")
+def tree_csv() -> str:
+    return synthetic.to_csv(synthetic.tree(n_stem=300)).decode("utf-8")
+
+
+@pytest.mark.parametrize(
+    "encoding, detected",
+    [("utf-8", "utf-8"), ("utf-8-sig", "utf-8-sig"), ("cp932", "cp932")],
+)
+def test_read_csv_encoding(tmp_path, tree_csv, encoding, detected):
+    raw = tree_csv.encode(encoding)
+    assert detect_encoding(raw[:SNIFF_SIZE]) == detected
+    ref = read_csv_before(raw, encoding=encoding)
+    assert np.array_equal(read_csv(raw), ref)
+    path = tmp_path / "tree.csv"
+    path.write_bytes(raw)
+    assert np.array_equal(read_csv(path), ref)
+    assert np.array_equal(read_csv(str(path)), ref)
+
+
+def test_read_csv_cp932_after_ascii_head():
+    # 先頭がASCIIのみで、日本語が判定に読む範囲より後にあるShift_JISのファイル
+    text = "a,b\n" + "1,2\n" * (SNIFF_SIZE // 4) + "3,ブナ\n"
+    raw = text.encode("cp932")
+    assert detect_encoding(raw[:SNIFF_SIZE]) == "utf-8"
+    assert np.array_equal(read_csv(raw), read_csv_before(raw, encoding="cp932"))
+    with pytest.raises(UnicodeDecodeError):
+        read_csv(raw, encoding="utf-8")
+
+
+def test_read_csv_multibyte_cut_at_sniff_size():
+    # 判定に読む範囲の境界でマルチバイト文字が切れても utf-8 と判定
+    text = "a\n" + "x" * (SNIFF_SIZE - 3) + "ブナ\n"
+    raw = text.encode("utf-8")
+    assert detect_encoding(raw[:SNIFF_SIZE]) == "utf-8"
+    assert np.array_equal(read_csv(raw), read_csv_before(raw))
+
+
+def test_read_csv_ragged_rows():
+    raw = "a,b,c\n1,2\n3\n".encode("utf-8")
+    assert read_csv(raw).tolist() == [["a", "b", "c"], ["1", "2", ""], ["3", "", ""]]
+
+
+def test_parse_cache(tmp_path, tree_csv):
+    raw = tree_csv.encode("utf-8")
+    cache = ParseCache(tmp_path / "cache")
+    ref = read_data(raw)
+    for _ in range(2):
+        d = read_data(raw, cache=cache)
+        assert np.array_equal(d.data, ref.data)
+        assert np.array_equal(d.comments, ref.comments)
+        assert (d.plot_id, d.data_type, d.metadata) == (
+            ref.plot_id,
+            ref.data_type,
+            ref.metadata,
+        )
+    assert (cache.misses, cache.hits, len(cache)) == (1, 1, 1)
+
+    # 内容・読み込みオプションが変われば別のエントリ
+    changed = raw.replace(b"AI-BC1", b"AI-BC2")
+    assert read_data(changed, cache=cache).plot_id == "AI-BC2"
+    read_data(raw, cache=cache, skip=1)
+    assert (cache.misses, len(cache)) == (3, 3)
+
+    # 読み込んだデータを変更してもキャッシュは変わらない
+    d = read_data(raw, cache=cache)
+    d.data[1, 0] = "xxx"
+    assert np.array_equal(read_data(raw, cache=cache).data, ref.data)
+
+    cache.clear()
+    assert len(cache) == 0
+
+
+def test_parse_cache_evict(tmp_path, tree_csv):
+    raw = tree_csv.encode("utf-8")
+    cache = ParseCache(tmp_path, max_size=1)
+    read_data(raw, cache=cache)
+    assert len(cache) == 0
+    assert np.array_equal(read_data(raw, cache=cache).data, read_data(raw).data)
@@ -0,0 +1,211 @@
+import csv
+import json
+import re
+from collections import Counter
+from dataclasses import astuple
+
+import numpy as np
+import pytest
+
+from app import datacheck
+from app.base import MonitoringData
+from benchmarks import synthetic
+from benchmarks.tree_anomaly import check_values_nd_loop, find_anomaly_loop
+
+
+def errors(d: MonitoringData, **kwargs) -> Counter:
+    return Counter(
+        astuple(e) for e in datacheck.check_data(d, throughly=True, **kwargs)
+    )
+
+
+def new_version(d: MonitoringData, data: np.ndarray) -> MonitoringData:
+    return MonitoringData(
+        data=data, plot_id=d.plot_id, data_type=d.data_type, metadata=d.metadata
+    )
+
+
+def modify_rows(data: np.ndarray, seed: int = 0) -> np.ndarray:
+    # 調査日以外の一部の値を変更し、最後の行を削除、先頭の2行を追加
+    rng = np.random.default_rng(seed)
+    data = data.copy()
+    cols = [j for j, c in enumerate(data[0]) if not c.startswith("s_date")]
+    for i in rng.choice(np.arange(1, len(data)), 10, replace=False):
+        j = rng.choice(cols)
+        data[i, j] = rng.choice(["", "abc", "-1", "na", "d", "150", data[i, j]])
+    return np.vstack((data[:-1], data[1:3]))
+
+
+DATA = {
+    "tree": lambda: synthetic.tree(n_stem=300, years=[2004, 2009, 2014, 2019]),
+    "litter": lambda: synthetic.litter(n_year=3, n_trap=10),
+    "seed": lambda: synthetic.seed(n_year=3, n_trap=10, n_sp=5),
+}
+
+
+@pytest.mark.parametrize(
+    "kind, scenario",
+    [
+        ("tree", "rows"),
+        ("tree", "census"),
+        ("tree", "census and rows"),
+        ("tree", "columns removed"),
+        ("litter", "rows"),
+        ("litter", "columns added"),
+        ("seed", "rows"),
+    ],
+)
+def test_incremental_same_as_full(kind, scenario):
+    d = DATA[kind]()
+    data = d.data.astype("<U32")
+    cols = data[0].tolist()
+    old, new = data, modify_rows(data)
+    if scenario.startswith("census"):
+        old = data[:, [c not in ("gbh19", "s_date19") for c in cols]]
+        new = new if scenario == "census and rows" else data
+    elif scenario == "columns removed":
+        new = new[:, [c != "note" for c in cols]]
+    elif scenario == "columns added":
+        new = np.c_[new, ["extra"] + [""] * (len(new) - 1)]
+
+    manifest = {}
+    errors(new_version(d, old), manifest=manifest)
+    manifest = json.loads(json.dumps(manifest))
+    d_new = new_version(d, new)
+    assert errors(d_new, previous=manifest) == errors(d_new)
+
+
+def test_incremental_new_census_with_invalid_date():
+    d = synthetic.tree(n_stem=200, years=[2004, 2009, 2014])
+    data = d.data.copy()
+    cols = data[0].tolist()
+    # 変更のない行の追加列 (1列だけの調査日) に不正な日付
+    data[5, cols.index("s_date14")] = "20141332"
+    keep = [j for j, c in enumerate(cols) if c not in ("gbh14", "s_date14")]
+
+    manifest = {}
+    errors(new_version(d, data[:, keep]), manifest=manifest)
+    manifest = json.loads(json.dumps(manifest))
+
+    d_new = new_version(d, data)
+    inc = errors(d_new, previous=manifest)
+    assert inc == errors(d_new)
+    assert any("20141332" in e[3] for e in inc)
+
+
+def test_find_data_files_skips_reports(tmp_path):
+    for name in ["a.csv", "sub/b.xlsx", "sub/~$b.xlsx", "a_errors.csv", "note.txt"]:
+        (tmp_path / name).parent.mkdir(exist_ok=True)
+        (tmp_path / name).write_text("")
+    (tmp_path / "reports").mkdir()
+    (tmp_path / "reports" / "summary.csv").write_text("")
+
+    files = datacheck.find_data_files([str(tmp_path)], exclude=[tmp_path / "reports"])
+    assert files == [
+        (tmp_path / "a.csv").resolve(),
+        (tmp_path / "sub/b.xlsx").resolve(),
+    ]
+
+
+def test_main_outdir_in_input_dir(tmp_path):
+    (tmp_path / "tree.csv").write_bytes(synthetic.to_csv(synthetic.tree(n_stem=50)))
+    outdir = tmp_path / "reports"
+    argv = [str(tmp_path), "-o", str(outdir), "-f", "csv", "-j", "1"]
+    for _ in range(2):
+        datacheck.main(argv)
+        summary = json.loads((outdir / "summary.json").read_text(encoding="utf-8"))
+        assert [x["file"] for x in summary["files"]] == [str(tmp_path / "tree.csv")]
+
+
+def test_ignore_list_literal_asterisk():
+    errors = [
+        datacheck.ErrDat("AI-BC1", "12", "", "gbh04に数値以外の入力値 (*)"),
+        datacheck.ErrDat("AI-BC1", "12", "", "gbh04に数値以外の入力値 (x)"),
+        datacheck.ErrDat("AI-BC1", "13", "", "gbh09に数値以外の入力値 (*)"),
+        datacheck.ErrDat("AI-BC2", "13", "", "gbh09に数値以外の入力値 (*)"),
+    ]
+    rows = [["AI-BC1", "12", "", "gbh04に数値以外の入力値 (*)"]]
+    # 接頭辞のない値は以前の無視リストと同じく完全一致
+    before = [e for e in errors if e not in [datacheck.ErrDat(*x) for x in rows]]
+    assert datacheck.IgnoreList(rows).filter(errors) == before == errors[1:]
+
+    ignore = datacheck.IgnoreList(
+        [
+            ["AI-BC1", "re:1[23]", "", "glob:gbh09*"],
+            ["glob:AI-*", "12", "", "gbh04に数値以外の入力値 (*)"],
+        ]
+    )
+    assert ignore.filter(errors) == [errors[1], errors[3]]
+
+
+def test_ignore_list_same_as_before(tmp_path):
+    d = synthetic.tree(n_stem=300)
+    errs = datacheck.check_data(d, throughly=True)
+    ignore = [astuple(e) for e in errs[::3]]
+    path = tmp_path / "ignore.csv"
+    with path.open("w", encoding="utf-8", newline="") as f:
+        csv.writer(f).writerows(ignore)
+
+    before = [e for e in errs if astuple(e) not in ignore]
+    res = datacheck.check_data(d, throughly=True, path_ignore=str(path))
+    assert res == before
+    assert len(datacheck.load_ignore_list(path)) == len(set(ignore))
+
+
+def test_map_unique():
+    x = np.array([["20040101", "x"], ["20040101", "20041301"]])
+    f = datacheck.isdate
+    assert np.array_equal(datacheck.map_unique(f, x, bool), np.vectorize(f)(x))
+    res = datacheck.as_datetime64(x)
+    assert res.dtype == np.dtype("datetime64[D]")
+    assert res[0, 0] == np.datetime64("2004-01-01")
+    assert np.isnat(res[[0, 1], [1, 1]]).all()
+
+
+def previous_notnull_loop(notnull: np.ndarray) -> np.ndarray:
+    prev = np.full(notnull.shape, -1)
+    for i, row in enumerate(notnull):
+        for j in range(1, len(row)):
+            idx = np.where(row[:j])[0]
+            prev[i, j] = idx[-1] if len(idx) else -1
+    return prev
+
+
+def test_previous_next_notnull():
+    notnull = np.random.default_rng(0).random((50, 6)) < 0.6
+    prev = datacheck.previous_notnull(notnull)
+    assert np.array_equal(prev, previous_notnull_loop(notnull))
+    # 逆順の列で前の値を探すと次の値
+    nxt = 5 - previous_notnull_loop(notnull[:, ::-1])[:, ::-1]
+    assert np.array_equal(datacheck.next_notnull(notnull), np.where(nxt == 6, 6, nxt))
+
+
+def test_growth_from_previous():
+    x = np.array([[10.0, np.nan, 14.0, 15.0], [np.nan, 20.0, np.nan, np.nan]])
+    years = np.array([2004, 2006, 2009, 2014])
+    growth, interval = datacheck.growth_from_previous(x, years)
+    nan = np.nan
+    assert np.allclose(growth[0], [nan, nan, 4.0, 1.0], equal_nan=True)
+    assert np.allclose(interval[0], [nan, nan, 5.0, 5.0], equal_nan=True)
+    assert np.isnan(growth[1]).all()
+    assert np.isnan(interval[1]).all()
+
+
+def test_tree_anomaly_same_as_loop():
+    d = synthetic.tree(n_stem=500, years=[2004, 2006, 2009, 2014, 2019])
+    # 成長量の異常値・誤ったnd・cd/viを混入
+    rng = np.random.default_rng(1)
+    gbh_cols = [bool(re.match("^gbh", c)) for c in d.data[0]]
+    gbh = d.data[1:, gbh_cols].astype("<U16")
+    noise = (rng.random(gbh.shape) * 20).astype(int)
+    gbh[noise == 0] = "150"
+    gbh[noise == 1] = "1.0"
+    gbh[noise == 2] = np.char.add("cd", gbh[noise == 2])
+    gbh[noise == 3] = np.char.add("nd", gbh[noise == 3])
+    d.data = d.data.astype("<U16")
+    d.data[1:, gbh_cols] = gbh
+
+    cd = datacheck.CheckDataTree(**d.as_kwargs())
+    assert cd.find_anomaly() == find_anomaly_loop(cd)
+    assert cd.check_values_nd() == check_values_nd_loop(cd)
+    assert cd.find_anomaly() and cd.check_values_nd()
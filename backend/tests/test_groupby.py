@@ -0,0 +1,98 @@
+import numpy as np
+import pytest
+
+from app.groupby import (
+    GroupBy,
+    factorize,
+    group_count,
+    group_max,
+    group_mean,
+    group_median,
+    group_min,
+    group_sum,
+)
+from tests.baseline import group_mean_before, group_sum_before
+
+
+@pytest.fixture
+def grouped():
+    rng = np.random.default_rng(0)
+    group_id = rng.choice(["b", "a", "d", "c", "e"], 200)
+    x = rng.normal(size=(200, 3))
+    x[rng.random(x.shape) < 0.2] = np.nan
+    # すべて欠測のグループ
+    x[group_id == "e", 1] = np.nan
+    return group_id, x
+
+
+def test_factorize():
+    x = np.array(["b", "a", "c", "a", "b"])
+    codes, uniq = factorize(x)
+    assert uniq.tolist() == ["a", "b", "c"]
+    assert codes.tolist() == [1, 0, 2, 0, 1]
+    assert np.array_equal(uniq[codes], x)
+
+
+@pytest.mark.parametrize("remove_nan", [True, False])
+@pytest.mark.parametrize(
+    "f, f_before", [(group_sum, group_sum_before), (group_mean, group_mean_before)]
+)
+def test_group_reduce_same_as_before(grouped, f, f_before, remove_nan):
+    group_id, x = grouped
+    for y in [x, x[:, 0]]:
+        res, groups = f(y, group_id, remove_nan)
+        ref, groups_ref = f_before(y, group_id, remove_nan)
+        assert np.array_equal(groups, groups_ref)
+        assert np.allclose(res, ref, equal_nan=True)
+
+
+@pytest.mark.parametrize(
+    "f, how",
+    [
+        (group_median, np.nanmedian),
+        (group_min, np.nanmin),
+        (group_max, np.nanmax),
+        (group_count, lambda x, axis: np.isfinite(x).sum(axis=axis)),
+    ],
+)
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_group_reduce_by_loop(grouped, f, how):
+    group_id, x = grouped
+    res, groups = f(x, group_id)
+    ref = np.array([how(x[group_id == g], axis=0) for g in groups])
+    assert np.allclose(res, ref, equal_nan=True)
+
+
+@pytest.mark.filterwarnings("ignore::RuntimeWarning")
+def test_groupby_quantile(grouped):
+    group_id, x = grouped
+    g = GroupBy(group_id)
+    res = g.quantile(x, [0.1, 0.5, 0.9])
+    ref = np.array(
+        [
+            [np.nanpercentile(x[group_id == i], q, axis=0) for i in g.groups]
+            for q in [10, 50, 90]
+        ]
+    )
+    assert np.allclose(res, ref, equal_nan=True)
+
+
+def test_groupby_first_last_indices():
+    group_id = np.array([3, 1, 3, 2, 1, 3])
+    x = np.arange(6) * 10
+    g = GroupBy(group_id)
+    assert g.groups.tolist() == [1, 2, 3]
+    assert g.sizes.tolist() == [2, 1, 3]
+    assert g.first(x).tolist() == [10, 30, 0]
+    assert g.last(x).tolist() == [40, 30, 50]
+    assert [i.tolist() for i in g.indices()] == [[1, 4], [3], [0, 2, 5]]
+
+
+def test_groupby_empty_and_invalid():
+    g = GroupBy(np.array([], dtype=int))
+    assert len(g) == 0
+    assert g.sum(np.empty((0, 2))).shape == (0, 2)
+    with pytest.raises(ValueError):
+        GroupBy(np.zeros((2, 2)))
+    with pytest.raises(ValueError):
+        group_sum(np.arange(3), np.arange(4))
@@ -0,0 +1,120 @@
+import numpy as np
+import pytest
+
+from app.base import MonitoringData
+from app.datacheck import as_datetime64
+from app.summarise import SeedSummary, TreeSummary, split_by_year
+from benchmarks import synthetic
+from benchmarks.litter_annual import annual_loop, annual_vectorized
+from benchmarks.tree_summary import isclose, summaries
+from tests.baseline import seed_annual_before
+
+
+def seed_data(n_year: int = 2) -> MonitoringData:
+    return synthetic.seed(n_year=n_year, n_trap=10, n_sp=5)
+
+
+def to_date(s_date: str) -> np.datetime64:
+    return np.datetime64("{}-{}-{}".format(s_date[:4], s_date[4:6], s_date[6:]))
+
+
+def test_each_sampling_dates_of_overlapping_periods():
+    d = seed_data()
+    col = d.columns.tolist().index("s_date1")
+    dates = np.unique(d.select("s_date1"))
+    # 3回目の回収の設置日を1回目より前に（中間日の順序は変わらない）
+    start = to_date(dates[0]) - np.timedelta64(5, "D")
+    d.values[d.select("s_date1") == dates[2], col] = str(start).replace("-", "")
+
+    s = SeedSummary(d)
+    for x in s.each_sampling():
+        t1, t2 = np.datetime64(x["t1"]), np.datetime64(x["t2"])
+        assert x["inst_period"] == (t2 - t1).astype(int)
+        tm = t1 + (t2 - t1) / 2
+        assert x["year"] == tm.astype("datetime64[Y]").astype(int) + 1970
+        # 行の日付はその回収の集計値に対応する
+        rows = (
+            (s.sp_list == x["species_jp"])
+            & (s.t1 == x["t1"].replace("-", ""))
+            & (s.t2 == x["t2"].replace("-", ""))
+        )
+        n = s.number[rows]
+        # 記録がなければ0、すべて欠測ならnan（トラップ数10）
+        expected = np.nansum(n) / 10 if n.size == 0 or np.isfinite(n).any() else np.nan
+        assert np.isclose(x["number"], expected, equal_nan=True)
+
+
+def test_each_sampling_invalid_date():
+    d = seed_data()
+    row = np.where(d.select("number") != "NA")[0][0]
+    d.values[row, d.columns.tolist().index("s_date2")] = "20041301"
+    with pytest.raises(ValueError, match="20041301"):
+        list(SeedSummary(d).each_sampling())
+
+
+@pytest.mark.parametrize("exclude_short_inst_period", [False, True])
+def test_annual_same_as_before(exclude_short_inst_period):
+    d = seed_data(n_year=4)
+    # トラップごとに回収日をずらし、回収期間を変える
+    trap = d.select("trap_id").astype(int)
+    for col, shift in [("s_date1", trap % 3), ("s_date2", trap % 5 * 4)]:
+        t = as_datetime64(d.select(col))
+        t = (t + shift.astype("timedelta64[D]")).astype(str)
+        d.values[:, d.columns.tolist().index(col)] = np.char.replace(t, "-", "")
+
+    s = SeedSummary(d)
+    res = list(s.annual(exclude_short_inst_period))
+    ref = seed_annual_before(list(s.each_sampling()), exclude_short_inst_period)
+    assert len(res) == len(ref)
+    for x, y in zip(res, ref):
+        for k, v in y.items():
+            if isinstance(v, str):
+                assert x[k] == v, k
+            else:
+                assert np.isclose(x[k], v, equal_nan=True), k
+
+
+def test_split_by_year():
+    t1 = np.array(["2004-12-01", "2005-03-01", "2005-12-20", "2006-05-05"], "M8[D]")
+    t2 = np.array(["2005-01-10", "2005-04-01", "2007-01-05", "2006-05-05"], "M8[D]")
+    row, year, start, end = split_by_year(t1, t2)
+    assert row.tolist() == [0, 0, 1, 2, 2, 2, 3]
+    assert year.tolist() == [2004, 2005, 2005, 2005, 2006, 2007, 2006]
+    assert (end - start).astype(int).tolist() == [30, 10, 31, 11, 365, 5, 0]
+    # 期間の日数は分割しても変わらない
+    days = np.bincount(row, (end - start).astype(int))
+    assert days.tolist() == (t2 - t1).astype(int).tolist()
+
+
+def test_litter_annual_same_as_loop():
+    d = synthetic.litter(n_year=5, n_trap=5)
+    t = as_datetime64(d.select(["s_date1", "s_date2"]))
+    wdry = np.random.default_rng(0).lognormal(size=(len(t), 3))
+    wdry_daily = wdry / np.diff(t).astype(int)
+    for x, y in zip(annual_loop(t, wdry_daily), annual_vectorized(t, wdry_daily)):
+        assert np.allclose(x, y)
+
+
+def tree_data(name: str) -> MonitoringData:
+    d = synthetic.tree(n_stem=1500, years=[2004, 2009, 2014, 2019], seed=1)
+    if name == "GR-DB1":
+        d.plot_id = "GR-DB1"
+    elif name == "no date":
+        data = d.data[:, d.data[0] != "s_date09"]
+        d = MonitoringData(data, plot_id=d.plot_id, metadata=d.metadata)
+    elif name == "null date":
+        d.values[:, d.columns == "s_date14"] = "NA"
+    return d
+
+
+@pytest.mark.parametrize("name", ["plain", "GR-DB1", "no date", "null date"])
+def test_tree_summary_chunked(name):
+    d = tree_data(name)
+    ref = summaries(d, 0)
+    for chunk_size in [97, 500]:
+        res = summaries(d, chunk_size)
+        for key, records in ref.items():
+            assert len(res[key]) == len(records), key
+            for x, y in zip(records, res[key]):
+                assert x.keys() == y.keys()
+                assert all(isclose(x[k], y[k]) for k in x), key